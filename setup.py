@@ -10,6 +10,10 @@ setup(
     py_modules=[
         "src/log",
         "src/astro_db",
+        "src/batch",
+        "src/db_service",
+        "src/export",
+        "src/pipeline",
         "src/progress",
         "src/theme"],
 
@@ -18,10 +22,18 @@ setup(
         "python-dotenv>=1.0.1",
         "google-api-python-client>=2.146.0",
         "nltk>=3.9.1",
-        "pandas>=2.2.3"],
+        "pandas>=2.2.3",
+        "requests>=2.32.3",
+        "tzdata>=2024.2"],
 
     # Packages required to test/develop the app
     extras_require={
+        "async": [
+            "aiohttp>=3.9.0"
+        ],
+        "export": [
+            "pyarrow>=14.0.0"
+        ],
         "dev": [
             "pytest>=8.3.3",
             "coverage>=7.6.1",
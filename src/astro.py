@@ -1,19 +1,40 @@
 """
 Main entry point for Astro data collection. This program will
 leverage the YouTube Data API to gather data from YouTube videos.
+
+Modules pulling in pandas, nltk or googleapiclient are imported by the
+functions that need them, so that `--help`, the subcommands and early exits
+don't pay for loading them.
 """
 import os
+import sys
 import argparse
 import logging
 
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
-from data_collection.yt_data_api import YouTubeDataAPI
-from data_collection.sentiment import SentimentAnalysis
-from log import AstroLogger
-from astro_db import AstroDB
+from log import AstroLogger, SNIPPET_HIGHLIGHT
 from theme import AstroTheme
 from rich_argparse import ArgumentDefaultsRichHelpFormatter
 
+if TYPE_CHECKING:
+    from astro_db import AstroDB
+    from db_service import DatabaseService
+    from data_collection.sentiment import SentimentAnalysis
+
+
+def rate_limit(value: str):
+    """
+    Argument type of --rate-limit: requests per second, or 'auto'.
+    """
+    if value == 'auto':
+        return value
+
+    try:
+        return float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid rate limit: '{value}'") from None
+
 
 def parse_args(astro_theme):
     """
@@ -24,67 +45,574 @@ def parse_args(astro_theme):
     parser = argparse.ArgumentParser(description=description,
                                      formatter_class=ArgumentDefaultsRichHelpFormatter)
 
-    parser.add_argument('youtube_url', type=str, help='youtube video URL')
+    parser.add_argument('youtube_url', type=str, nargs='?', help='youtube video URL')
+    parser.add_argument('-b', '--batch', type=str, metavar='FILE',
+                        help="collect every video URL/ID listed in FILE, one per line ('-' reads stdin)")
+    parser.add_argument('-w', '--workers', type=int, help='number of videos fetched concurrently in batch mode',
+                        default=4)
+    parser.add_argument('--sentiment-workers', type=int, default=1,
+                        help='number of processes used for sentiment scoring (0 uses every core)')
+    parser.add_argument('--sentiment-chunk-size', type=int, default=1000,
+                        help='number of comments scored per task when scoring in parallel')
+    parser.add_argument('--sentiment-cache', type=str, metavar='FILE',
+                        help='persist the word sentiment cache to FILE between runs')
+    parser.add_argument('--sentiment-cache-size', type=int, default=100000,
+                        help='maximum number of word sentiment scores kept in memory')
+    parser.add_argument('--sentiment-lexicon', type=str, metavar='FILE',
+                        help='read word sentiment scores from a precompiled lexicon FILE')
+    parser.add_argument('--offline', type=bool, default=False, action=argparse.BooleanOptionalAction,
+                        help="never download nltk data; fail if it is missing (see 'astro setup')")
+    parser.add_argument('--nltk-data-dir', type=str, metavar='DIR', help='directory holding the nltk data')
+    parser.add_argument('-i', '--incremental', type=bool, default=False, action=argparse.BooleanOptionalAction,
+                        help='only collect comments newer than those already stored')
+    parser.add_argument('--resume', type=bool, default=False, action=argparse.BooleanOptionalAction,
+                        help='continue an interrupted collection of the video from its last checkpoint')
+    parser.add_argument('--checkpoint-pages', type=int, default=1,
+                        help='number of comment pages scored and stored per batch')
+    parser.add_argument('--normalized', type=bool, default=False, action=argparse.BooleanOptionalAction,
+                        help="store comments of every video in a single 'Comments' table")
+    parser.add_argument('--migrate', type=bool, default=False, action=argparse.BooleanOptionalAction,
+                        help="move all per-video comment tables into the 'Comments' table")
+    parser.add_argument('--discovery-cache', type=str, metavar='FILE',
+                        help='cache the YouTube API discovery document in FILE')
+    parser.add_argument('--rate-limit', type=rate_limit, default=5.0,
+                        help="maximum API requests per second (0 disables the limit; 'auto' spreads the quota " +
+                        "left today over the rest of the day)")
+    parser.add_argument('--daily-quota', type=int, default=10000,
+                        help='API quota units available per day (Pacific time), shared by every run using the same database')
+    parser.add_argument('--max-attempts', type=int, default=5,
+                        help='attempts made for each API request before giving up')
+    parser.add_argument('--http-transport', type=str, choices=['pooled', 'httplib2'], default='pooled',
+                        help='HTTP transport used for API requests')
+    parser.add_argument('--expand-replies', type=bool, default=True, action=argparse.BooleanOptionalAction,
+                        help='request every reply of threads with more replies than the API returns inline')
+    parser.add_argument('--reply-workers', type=int, default=4,
+                        help='threads whose replies are requested concurrently, per video')
+    parser.add_argument('--fetcher', type=str, choices=['threads', 'async'], default='threads',
+                        help='how batch mode fetches comments: on worker threads, or asynchronously (needs aiohttp)')
+    parser.add_argument('--max-concurrency', type=int, default=20,
+                        help='maximum API requests in flight with the async fetcher')
+    parser.add_argument('--video-concurrency', type=int, default=2,
+                        help='maximum API requests in flight per video with the async fetcher')
     parser.add_argument('-l', '--log', type=str, choices=['debug', 'info', 'warn', 'error'],
                         help='Set the logging level', default='info')
     parser.add_argument('--api-key', type=str, help='YouTube Data API key')
     parser.add_argument('--db-file', type=str, help='database filename', default='astro.db')
+    parser.add_argument('--storage-profile', type=str, choices=['default', 'durable', 'fast'],
+                        help="database connection settings (default: 'fast', or $STORAGE_PROFILE)")
+    parser.add_argument('--db-pragma', type=str, metavar='NAME=VALUE', action='append', default=[],
+                        help='override a setting of the storage profile, e.g. cache_size=-16384')
     parser.add_argument('--log-file', type=str, help='log output to specified file', default='astro_log.txt')
     parser.add_argument('-j', '--log-json', type=bool, help='log json API responses',
                         default=False, action=argparse.BooleanOptionalAction)
     args = parser.parse_args()
 
+    if not args.youtube_url and not args.batch and not args.migrate:
+        parser.error('either a youtube_url or --batch FILE is required')
+
+    if args.workers < 1:
+        parser.error('--workers must be at least 1')
+
+    if args.checkpoint_pages < 1:
+        parser.error('--checkpoint-pages must be at least 1')
+
+    if (args.rate_limit != 'auto' and args.rate_limit < 0) or args.daily_quota < 1 or args.max_attempts < 1:
+        parser.error('invalid API request configuration')
+
+    if args.max_concurrency < 1 or args.video_concurrency < 1 or args.reply_workers < 1:
+        parser.error('invalid async fetcher configuration')
+
+    if args.sentiment_workers < 0 or args.sentiment_chunk_size < 1 or args.sentiment_cache_size < 1:
+        parser.error('invalid sentiment worker configuration')
+
+    if any('=' not in pragma for pragma in args.db_pragma):
+        parser.error('--db-pragma must be given as NAME=VALUE')
+
+    if args.sentiment_workers == 0:
+        args.sentiment_workers = os.cpu_count() or 1
+
     return args
 
 
-def main():
-    # load astro color scheme
-    astro_theme = AstroTheme()
+def parse_setup_args(argv):
+    """
+    Argument parsing logic for the 'setup' command.
+    """
+    description = "Download everything Astro needs to run offline."
 
-    # parse arguments
-    args = parse_args(astro_theme)
+    parser = argparse.ArgumentParser(prog='astro setup', description=description,
+                                     formatter_class=ArgumentDefaultsRichHelpFormatter)
 
-    # load environment variables
+    parser.add_argument('--nltk-data-dir', type=str, metavar='DIR',
+                        help='download nltk data into DIR rather than the default nltk location')
+    parser.add_argument('--lexicon', type=str, metavar='FILE',
+                        help='also compile a sentiment lexicon into FILE (see --sentiment-lexicon)')
+    parser.add_argument('-l', '--log', type=str, choices=['debug', 'info', 'warn', 'error'],
+                        help='Set the logging level', default='info')
+
+    return parser.parse_args(argv)
+
+
+def parse_export_args(argv):
+    """
+    Argument parsing logic for the 'export' command.
+    """
+    description = "Export the collected comments to Parquet or Arrow files for analysis."
+
+    parser = argparse.ArgumentParser(prog='astro export', description=description,
+                                     formatter_class=ArgumentDefaultsRichHelpFormatter)
+
+    parser.add_argument('export_dir', type=str, help='directory the export is written to')
+    parser.add_argument('--db-file', type=str, help='database filename', default='astro.db')
+    parser.add_argument('--format', type=str, choices=['parquet', 'arrow'], default='parquet',
+                        help='file format: compressed Parquet, or uncompressed, memory-mappable Arrow IPC')
+    parser.add_argument('--video', type=str, metavar='VIDEO_ID', action='append', dest='video_ids',
+                        help='only export the comments of this video (repeatable)')
+    parser.add_argument('--full', action='store_true',
+                        help='replace the export instead of appending the comments stored since the last one')
+    parser.add_argument('-l', '--log', type=str, choices=['debug', 'info', 'warn', 'error'],
+                        help='Set the logging level', default='info')
+
+    args = parser.parse_args(argv)
+    if args.full and args.video_ids:
+        parser.error('--full always exports every video')
+
+    return args
+
+
+def export(astro_theme, argv):
+    """
+    Export the comments in the database to a columnar archive, appending only
+    the comments stored since the previous export.
+    """
+    from astro_db import AstroDB
+    from export import CommentExporter
+
+    args = parse_export_args(argv)
     load_dotenv()
 
-    # prioritize log level provided on CLI, fallback to env variable
-    log_level = args.log if args.log else os.getenv("LOG_LEVEL")
-    api_key = args.api_key if args.api_key else os.getenv("API_KEY")
-    db_file = args.db_file if args.db_file else os.getenv("DB_FILE")
-    log_file = args.log_file if args.log_file else os.getenv("LOG_FILE")
-    log_json = args.log_json if args.log_json else os.getenv("LOG_JSON")
+    logging.setLoggerClass(AstroLogger)
+    logger = logging.getLogger(__name__)
+    logger.astro_config(args.log, astro_theme, log_file=os.getenv("LOG_FILE", 'astro_log.txt'))
+
+    db = AstroDB(logger, args.db_file, profile=os.getenv('STORAGE_PROFILE', 'fast'), read_only=True)
+    exporter = CommentExporter(logger, db, args.export_dir, export_format=args.format)
+    exporter.export(video_ids=args.video_ids, full=args.full)
+
+
+def parse_search_args(argv):
+    """
+    Argument parsing logic for the 'search' command.
+    """
+    description = "Search the text and authors of the collected comments."
+
+    parser = argparse.ArgumentParser(prog='astro search', description=description,
+                                     formatter_class=ArgumentDefaultsRichHelpFormatter)
+
+    parser.add_argument('query', type=str, help='words to search for; every word must match')
+    parser.add_argument('--db-file', type=str, help='database filename', default='astro.db')
+    parser.add_argument('--channel', type=str, metavar='CHANNEL_ID', action='append', dest='channel_ids',
+                        help='only search the comments of this channel (repeatable)')
+    parser.add_argument('--since', type=str, metavar='DATE', help='only comments published on or after DATE')
+    parser.add_argument('--before', type=str, metavar='DATE', help='only comments published before DATE')
+    parser.add_argument('--visibility', type=str, choices=['all', 'visible', 'hidden'], default='all',
+                        help='only search the comments which are still visible, or those which were hidden')
+    parser.add_argument('-n', '--limit', type=int, default=20, help='maximum number of results')
+    parser.add_argument('--fts-syntax', action='store_true',
+                        help='pass the query to SQLite as is, to use FTS5 operators (OR, NOT, prefix*, NEAR)')
+    parser.add_argument('-l', '--log', type=str, choices=['debug', 'info', 'warn', 'error'],
+                        help='Set the logging level', default='info')
+
+    args = parser.parse_args(argv)
+    if args.limit < 1:
+        parser.error('--limit must be at least 1')
+
+    return args
+
+
+def search_query(text: str) -> str:
+    """
+    Quote every word of a plain-text query as an FTS5 string, so that
+    punctuation matches literally rather than as query syntax.
+    """
+    return ' '.join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+
+def search(astro_theme, argv):
+    """
+    Search the comments in the database, building the search index first if it
+    doesn't exist yet.
+    """
+    from astro_db import AstroDB
+
+    args = parse_search_args(argv)
+    load_dotenv()
 
-    # set up logging
     logging.setLoggerClass(AstroLogger)
     logger = logging.getLogger(__name__)
-    logger.astro_config(log_level, astro_theme, log_file=log_file)
+    logger.astro_config(args.log, astro_theme, log_file=os.getenv("LOG_FILE", 'astro_log.txt'))
+
+    db = AstroDB(logger, args.db_file, profile=os.getenv('STORAGE_PROFILE', 'fast'))
+    if not db.searchable:
+        indexed = db.create_search_index()
+        logger.info(f'Indexed {indexed} comments')
+
+    visible = {'all': None, 'visible': True, 'hidden': False}[args.visibility]
+    query = args.query if args.fts_syntax else search_query(args.query)
+    matches = db.search_comments(query, channel_ids=args.channel_ids, since=args.since, before=args.before,
+                                 visible=visible, limit=args.limit, highlight=SNIPPET_HIGHLIGHT)
+
+    logger.print_comment_matches(matches, title=f'{len(matches)} comments matching {args.query!r}')
+
+
+def get_nltk_data_dir(nltk_data_dir):
+    """
+    Prefer the directory given on the CLI, falling back to the first entry of
+    the NLTK_DATA env variable.
+    """
+    if nltk_data_dir:
+        return nltk_data_dir
+
+    env_dirs = os.getenv("NLTK_DATA")
+    return env_dirs.split(os.pathsep)[0] if env_dirs else None
+
+
+def setup(astro_theme, argv):
+    """
+    Prefetch the nltk data, and optionally compile the sentiment lexicon, so
+    that later runs never need network access for anything but the API.
+    """
+    from data_collection.sentiment import NLTK_RESOURCES
+    from data_collection.sentiment import find_missing_nltk_packages, download_nltk_packages, use_nltk_data_dir
+
+    args = parse_setup_args(argv)
+    load_dotenv()
+
+    logging.setLoggerClass(AstroLogger)
+    logger = logging.getLogger(__name__)
+    logger.astro_config(args.log, astro_theme, log_file=os.getenv("LOG_FILE", 'astro_log.txt'))
+
+    nltk_data_dir = get_nltk_data_dir(args.nltk_data_dir)
+    use_nltk_data_dir(nltk_data_dir)
+
+    missing = find_missing_nltk_packages(list(NLTK_RESOURCES))
+    if missing:
+        logger.info(f"Downloading nltk data: {', '.join(missing)}")
+        download_nltk_packages(missing, nltk_data_dir)
+    else:
+        logger.info('All nltk data is already installed')
+
+    if args.lexicon:
+        from data_collection.lexicon import build_lexicon
+
+        entry_count = build_lexicon(args.lexicon)
+        logger.info(f'Compiled {entry_count} lexicon entries into {args.lexicon}')
+
+
+def create_client_factory(args, api_key):
+    """
+    Create the factory for the API clients of this run. With the pooled
+    transport, every client shares one pool of keep-alive connections.
+    """
+    from data_collection.youtube_client import get_client_factory
+    from data_collection.http_transport import PooledHttp
+
+    discovery_cache = args.discovery_cache if args.discovery_cache else os.getenv("DISCOVERY_CACHE")
+    # every video worker can have a request in flight for each of its reply workers too
+    pool_size = args.workers * (args.reply_workers + 1) if args.expand_replies else args.workers
+    http = PooledHttp(pool_size=pool_size) if args.http_transport == 'pooled' else None
+
+    return get_client_factory(api_key, discovery_cache, http=http)
+
+
+def create_request_executor(logger, args, quota_spent: int):
+    """
+    Create the executor shared by every API request of this run, given the
+    quota units already spent today. With '--rate-limit auto', requests are
+    paced so that the rest of the daily quota lasts until the end of the day.
+    """
+    from data_collection.request_executor import RequestExecutor, TokenBucket, DEFAULT_BURST, daily_rate
+
+    if args.rate_limit == 'auto':
+        rate_limiter = TokenBucket(daily_rate(args.daily_quota - quota_spent), capacity=DEFAULT_BURST)
+    else:
+        rate_limiter = TokenBucket(args.rate_limit) if args.rate_limit else None
+
+    logger.debug(f'Quota spent today: {quota_spent}/{args.daily_quota} units')
+
+    return RequestExecutor(logger, max_attempts=args.max_attempts, rate_limiter=rate_limiter,
+                           daily_quota=args.daily_quota, quota_spent=quota_spent)
+
+
+def create_async_api(logger, args, api_key, log_json, executor):
+    """
+    Create the asynchronous API used to fetch comments in batch mode, if the
+    async fetcher was selected.
+    """
+    if args.fetcher != 'async':
+        return None
 
+    from data_collection.async_api import AsyncYouTubeDataAPI
+
+    return AsyncYouTubeDataAPI(logger, api_key, max_concurrency=args.max_concurrency,
+                               video_concurrency=args.video_concurrency, log_json=log_json, executor=executor,
+                               expand_replies=args.expand_replies)
+
+
+def log_transport_stats(logger, client_factory):
+    if client_factory.http is None:
+        return
+
+    stats = client_factory.http.stats()
+    logger.debug(f"HTTP: {stats['requests']} requests over {stats['connections']} connections, " +
+                 f"mean latency {stats['mean_latency'] * 1000:.0f}ms, max {stats['max_latency'] * 1000:.0f}ms")
+
+
+def load_batch_file(path: str) -> list:
+    """
+    Read the list of videos to collect from `path`, or from stdin if `path` is '-'.
+    """
+    from batch import read_video_list
+
+    if path == '-':
+        return read_video_list(sys.stdin)
+
+    with open(path) as batch_file:
+        return read_video_list(batch_file)
+
+
+def get_storage_settings(args) -> tuple:
+    """
+    Return the storage profile and pragma overrides selected for the database.
+    """
+    profile = args.storage_profile if args.storage_profile else os.getenv('STORAGE_PROFILE', 'fast')
+    pragmas = dict(pragma.split('=', 1) for pragma in args.db_pragma)
+
+    return profile, pragmas
+
+
+def open_database(logger, args, db_file) -> 'AstroDB':
+    """
+    Connect to the local database with the selected storage profile, migrating
+    it to the normalized schema first if requested.
+    """
+    from astro_db import AstroDB
+
+    profile, pragmas = get_storage_settings(args)
+    db = AstroDB(logger, db_file, normalized=args.normalized, profile=profile, pragmas=pragmas)
+
+    if args.migrate:
+        migrated = db.migrate_to_normalized()
+        logger.info(f'Migrated {migrated} videos to the normalized schema')
+
+    return db
+
+
+def open_database_service(logger, args, db_file) -> 'DatabaseService':
+    """
+    Start the database service batch mode stores its results through, migrating
+    the database to the normalized schema first if requested.
+    """
+    from db_service import DatabaseService
+
+    profile, pragmas = get_storage_settings(args)
+    service = DatabaseService(logger, db_file, normalized=args.normalized, profile=profile, pragmas=pragmas)
+
+    if args.migrate:
+        migrated = service.write(lambda db: db.migrate_to_normalized())
+        logger.info(f'Migrated {migrated} videos to the normalized schema')
+
+    return service
+
+
+def create_sentiment_analyzer(logger, args) -> 'SentimentAnalysis':
+    from data_collection.sentiment import SentimentAnalysis
+
+    cache_file = args.sentiment_cache if args.sentiment_cache else os.getenv("SENTIMENT_CACHE")
+    lexicon_file = args.sentiment_lexicon if args.sentiment_lexicon else os.getenv("SENTIMENT_LEXICON")
+    offline = args.offline or os.getenv("ASTRO_OFFLINE", '').lower() in ['1', 'true', 'yes']
+
+    return SentimentAnalysis(logger,
+                             workers=args.sentiment_workers,
+                             chunk_size=args.sentiment_chunk_size,
+                             cache_size=args.sentiment_cache_size,
+                             cache_file=cache_file,
+                             lexicon_file=lexicon_file,
+                             offline=offline,
+                             nltk_data_dir=get_nltk_data_dir(args.nltk_data_dir))
+
+
+def collect_batch(logger, args, api_key, db_file, log_json):
+    """
+    Collect data for every video listed in the batch file.
+    """
+    from astro_db import AstroDB
+    from batch import BatchCollector
+    from data_collection.request_executor import quota_day
+
+    urls = load_batch_file(args.batch)
+    if not urls:
+        logger.warning('No videos found in batch input')
+        return
+
+    db = open_database_service(logger, args, db_file)
+    sa = create_sentiment_analyzer(logger, args)
+
+    day = quota_day()
+    client_factory = create_client_factory(args, api_key)
+    executor = create_request_executor(logger, args, db.read(AstroDB.get_quota_used, day))
+    collector = BatchCollector(logger, api_key, db, sa, workers=args.workers, log_json=log_json,
+                               incremental=args.incremental, client_factory=client_factory, executor=executor,
+                               expand_replies=args.expand_replies, reply_workers=args.reply_workers,
+                               async_api=create_async_api(logger, args, api_key, log_json, executor))
+    try:
+        summary = collector.collect(urls)
+    finally:
+        sa.close()
+        db.write(AstroDB.add_quota_used, day, executor.quota_used)
+        db.close()
+
+    log_transport_stats(logger, client_factory)
+
+    collector.log_summary(summary)
+
+
+def get_start_page(logger, args, db, video_id) -> tuple:
+    """
+    Return the (page token, page count) a collection of the video starts from:
+    the checkpoint of an unfinished collection when resuming, otherwise the
+    first page.
+    """
+    checkpoint = db.get_checkpoint(video_id) if args.resume else None
+    if checkpoint:
+        page_token, page_count, comment_count = checkpoint
+        logger.info(f'Resuming collection after page {page_count} ({comment_count} comments already stored)')
+        return page_token, page_count
+
+    if args.resume:
+        logger.info('No checkpoint found, collecting from the first page')
+
+    db.clear_checkpoint(video_id)
+    return '', 0
+
+
+def collect_comments(logger, args, youtube, db, db_file, video_data, high_water_mark) -> tuple:
+    """
+    Stream the comments of the video from the API through sentiment analysis
+    into the database, in batches of `--checkpoint-pages` pages. Each batch is
+    stored along with a checkpoint of the page to continue from, so an
+    interrupted collection can be picked up again with --resume. Only new and
+    edited comments are scored, the others keep their stored sentiment.
+    Returns the number of comments collected and the first batch, for
+    previewing.
+    """
+    from astro_db import AstroDB, HASH_COLUMN
+    from pipeline import CommentPipeline
+
+    page_token, page_count = get_start_page(logger, args, db, video_data.video_id)
+    resumed = page_count > 0
+    preview = []
+
+    def store(comments_df, next_page_token, batch_pages):
+        nonlocal page_count
+        page_count += batch_pages
+        db.store_comment_batch(video_data, comments_df, next_page_token, page_count)
+        if not preview:
+            preview.append(comments_df.drop(columns=HASH_COLUMN, errors='ignore'))
+
+    # the scoring stage looks stored sentiment up on a connection of its own
+    profile, pragmas = get_storage_settings(args)
+    reader = AstroDB(logger, db_file, profile=profile, pragmas=pragmas, read_only=True)
+
+    def score(comments_df):
+        unscored = reader.copy_stored_sentiment(video_data.video_id, comments_df)
+        sa.add_sentiment_to_dataframe(comments_df, show_progress=False, rows=unscored)
+
+    sa = create_sentiment_analyzer(logger, args)
+    pipeline = CommentPipeline(logger, score, store)
+    try:
+        stats = pipeline.run(youtube.get_comment_batches(video_data, high_water_mark, page_token, args.checkpoint_pages))
+        logger.debug(f'Stored {stats.batch_count} batches in {stats.elapsed:.1f}s, ' +
+                     f'{stats.store_wait:.1f}s spent waiting for data')
+
+    except KeyboardInterrupt:
+        logger.warning('Collection interrupted, run again with --resume to continue where it stopped')
+        raise
+
+    finally:
+        sa.close()
+        reader.get_db_conn().close()
+
+    # hidden comments can only be detected when every page was collected by this run
+    comment_count = db.finish_comment_collection(video_data, detect_hidden=not resumed and high_water_mark is None)
+
+    # get filtered comment count by subtracting our collected count from our expected count
+    filtered_comments = video_data.comment_count - comment_count
+    if high_water_mark is None and 0 < filtered_comments:
+        video_data.filtered_comment_count = filtered_comments
+
+    return comment_count, preview[0] if preview else None
+
+
+def collect_video_data(logger, args, youtube, db, db_file) -> tuple:
+    """
+    Collect the metadata and comments of the video provided on the command
+    line. Returns the video data, the number of comments collected and a
+    preview of them.
+    """
     # collect metadata for provided video
-    youtube = YouTubeDataAPI(logger, api_key, log_json)
     video_data = youtube.get_video_metadata(args.youtube_url)
 
     logger.print_video_data(video_data)
 
-    # connect to local database
-    db = AstroDB(logger, db_file)
-
     if video_data.comments_disabled:
         logger.info('Comments have been disabled for the provided video')
         db.update_video_data(video_data)
-        return
+        return video_data, 0, None
+
+    # in incremental mode, only collect comments newer than those already stored
+    high_water_mark = db.get_high_water_mark(video_data.video_id) if args.incremental else None
+    if high_water_mark:
+        logger.info(f'Collecting comments published since {high_water_mark[0]}')
 
     # collect comments from the provided video
-    comments_df = youtube.get_comments(video_data)
+    comment_count, preview_df = collect_comments(logger, args, youtube, db, db_file, video_data, high_water_mark)
 
     # update the video data in the local database
     db.update_video_data(video_data)
 
-    # gather sentiment data on the comments, adding data to the dataframe
-    sa = SentimentAnalysis(logger)
-    sa.add_sentiment_to_dataframe(comments_df)
+    return video_data, comment_count, preview_df
 
-    # commit dataframe to database
-    db.insert_comment_dataframe(video_data, comments_df)
+
+def collect_video(logger, args, api_key, db_file, log_json):
+    """
+    Collect data for the single video provided on the command line.
+    """
+    from data_collection.yt_data_api import YouTubeDataAPI
+    from data_collection.request_executor import quota_day
+
+    # connect to local database, which also records the quota spent today
+    db = open_database(logger, args, db_file)
+    day = quota_day()
+
+    client_factory = create_client_factory(args, api_key)
+    youtube = YouTubeDataAPI(logger, api_key, log_json, client_factory=client_factory,
+                             executor=create_request_executor(logger, args, db.get_quota_used(day)),
+                             expand_replies=args.expand_replies, reply_workers=args.reply_workers)
+
+    try:
+        video_data, comment_count, preview_df = collect_video_data(logger, args, youtube, db, db_file)
+    finally:
+        log_transport_stats(logger, client_factory)
+        logger.debug(f'Quota used: {youtube.executor.quota_used} units')
+        db.add_quota_used(day, youtube.executor.quota_used)
+
+    if video_data.comments_disabled:
+        return
+
+    if not comment_count:
+        logger.info('No new comments to collect')
+        return
 
     # print filtered comment information
     db_video_data = db.get_video_data(video_data.video_id)
@@ -92,9 +620,55 @@ def main():
                 f'{db_video_data.filtered_comment_count/db_video_data.comment_count*100:.2f}% ' +
                 'of comments')
 
-    logger.print_dataframe(comments_df, title='Comment data preview')
+    logger.print_dataframe(preview_df, title='Comment data preview')
     logger.info('Data collection complete.')
 
 
+def main():
+    # load astro color scheme
+    astro_theme = AstroTheme()
+
+    # subcommands are dispatched before the collection arguments are parsed
+    if len(sys.argv) > 1 and sys.argv[1] == 'setup':
+        setup(astro_theme, sys.argv[2:])
+        return
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'export':
+        export(astro_theme, sys.argv[2:])
+        return
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'search':
+        search(astro_theme, sys.argv[2:])
+        return
+
+    # parse arguments
+    args = parse_args(astro_theme)
+
+    # load environment variables
+    load_dotenv()
+
+    # prioritize log level provided on CLI, fallback to env variable
+    log_level = args.log if args.log else os.getenv("LOG_LEVEL")
+    api_key = args.api_key if args.api_key else os.getenv("API_KEY")
+    db_file = args.db_file if args.db_file else os.getenv("DB_FILE")
+    log_file = args.log_file if args.log_file else os.getenv("LOG_FILE")
+    log_json = args.log_json if args.log_json else os.getenv("LOG_JSON")
+
+    # set up logging
+    logging.setLoggerClass(AstroLogger)
+    logger = logging.getLogger(__name__)
+    logger.astro_config(log_level, astro_theme, log_file=log_file)
+
+    if args.batch:
+        collect_batch(logger, args, api_key, db_file, log_json)
+        return
+
+    if not args.youtube_url:  # nothing to collect, only migrate the database
+        open_database(logger, args, db_file)
+        return
+
+    collect_video(logger, args, api_key, db_file, log_json)
+
+
 if __name__ == "__main__":
     main()
@@ -2,51 +2,406 @@
 Class for managing comment/video database.
 """
 import sqlite3
+import hashlib
+import json
+import pathlib
+import re
 
-import pandas as pd
-from src.data_collection.data_structures import VideoData
+from typing import TYPE_CHECKING
+from src.data_collection.data_structures import CommentMatch, VideoData
+
+if TYPE_CHECKING:
+    import numpy as np
+    import pandas as pd
+
+
+# name of the shared comment table used by the normalized schema
+COMMENTS_TABLE = 'Comments'
+
+# full-text index over the text and author of every comment, and the table
+# mapping its rows to comments, which also holds the columns searches filter on
+SEARCH_TABLE = 'CommentSearch'
+SEARCH_ROWS_TABLE = 'SearchComments'
+
+# columns of a comment row, excluding the video id
+COMMENT_COLUMNS = ['comment_id', 'comment', 'user', 'date', 'visible', 'PSentiment', 'NSentiment']
+
+# column holding a digest of the text of each stored comment, which merges
+# compare to find edited comments without comparing (or loading) their text
+HASH_COLUMN = 'content_hash'
+
+# previous versions of edited comments
+EDITS_TABLE = 'CommentEdits'
+
+# comments whose content hashes are passed to SQLite per statement, which
+# bounds the size of the JSON built for a merge
+HASH_CHUNK_SIZE = 20000
+
+# number of compiled statements kept per connection. Every statement is
+# parameterized, so its SQL text (and compiled plan) is reused across calls.
+STATEMENT_CACHE_SIZE = 256
+
+# connection settings applied by each storage profile
+STORAGE_PROFILES = {
+        # SQLite's own defaults: rollback journal, synchronous=FULL
+        'default': {},
+        # write-ahead log, so readers never block the writer (or vice versa),
+        # with every commit still synced to disk
+        'durable': {
+            'journal_mode': 'WAL',
+            'synchronous': 'FULL',
+            'busy_timeout': 5000},
+        # as durable, but only syncing at checkpoints: a power loss may roll
+        # back the latest commits, but can't corrupt the database
+        'fast': {
+            'journal_mode': 'WAL',
+            'synchronous': 'NORMAL',
+            'cache_size': -65536,  # KiB, i.e. 64 MiB
+            'mmap_size': 268435456,
+            'temp_store': 'MEMORY',
+            'busy_timeout': 5000}}
+
+# pragmas which may be set through a profile or overridden individually
+STORAGE_PRAGMAS = ['journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store', 'busy_timeout']
+
+
+def comment_hash(text) -> int:
+    """
+    Digest the text of a comment into a signed 64-bit integer, the size of a
+    SQLite integer. 64 bits are plenty to tell the versions of a comment apart.
+    """
+    return int.from_bytes(hashlib.blake2b(str(text).encode(), digest_size=8).digest(), 'big', signed=True)
+
+
+def comment_hashes(dataframe: 'pd.DataFrame') -> 'np.ndarray':
+    import numpy as np
+
+    return np.fromiter((comment_hash(text) for text in dataframe['comment']), np.int64, len(dataframe.index))
+
+
+def comment_hashes_json(dataframe: 'pd.DataFrame'):
+    """
+    Yield the content hashes of a dataframe with 'comment_id' and
+    'content_hash' columns as JSON objects keyed by comment id, of at most
+    HASH_CHUNK_SIZE comments each. `json_each` unpacks them into (key, value)
+    rows without extracting anything.
+    """
+    for start in range(0, len(dataframe.index), HASH_CHUNK_SIZE):
+        chunk = dataframe.iloc[start:start + HASH_CHUNK_SIZE]
+        hashes = chunk[HASH_COLUMN].set_axis(chunk['comment_id'])
+        yield hashes[~hashes.index.duplicated()].to_json()
 
 
 class AstroDB:
     conn = None
     cursor = None
     logger = None
+    normalized = False
+    read_only = False
+    searchable = False
 
-    def __init__(self, logger, db_file: str):
-        self.conn = sqlite3.connect(db_file)
-        self.cursor = self.conn.cursor()
+    def __init__(self, logger, db_file: str, normalized=False, profile='default', pragmas=None, read_only=False):
+        """
+        Open the database. By default, the comments of each video are stored in
+        a table of their own. With `normalized` set, the comments of every video
+        are stored in the shared 'Comments' table instead. Databases which
+        already contain the 'Comments' table always use the normalized schema.
+
+        The connection is configured by the named storage `profile` (see
+        STORAGE_PROFILES), with any `pragmas` overriding its settings.
+
+        A `read_only` connection opens an existing database for queries only.
+        It may be used from any thread, though by one thread at a time.
+        """
         self.logger = logger
+        self.read_only = read_only
+
+        if read_only:
+            uri = pathlib.Path(db_file).absolute().as_uri() + '?mode=ro'
+            self.conn = sqlite3.connect(uri, uri=True, cached_statements=STATEMENT_CACHE_SIZE, check_same_thread=False)
+        else:
+            self.conn = sqlite3.connect(db_file, cached_statements=STATEMENT_CACHE_SIZE)
+
+        self.cursor = self.conn.cursor()
+        self.configure(profile, pragmas)
+
+        # hashes the comments of tables created before edits were tracked
+        self.conn.create_function('comment_hash', 1, comment_hash, deterministic=True)
+
+        self.searchable = self.__table_exists(SEARCH_TABLE)
+
+        if read_only:
+            self.normalized = self.__table_exists(COMMENTS_TABLE)
+            return
+
         self.create_videos_table()
+        self.create_sync_state_table()
+        self.create_checkpoints_table()
+        self.create_edits_table()
+        self.create_quota_table()
+
+        self.normalized = normalized or self.__table_exists(COMMENTS_TABLE)
+        if self.normalized:
+            self.create_comments_table()
 
         self.logger.debug('Initializing database...')
 
-    def __merge_comment_data(self, comment_table: str, new_dataframe: pd.DataFrame):
+    def configure(self, profile: str, pragmas=None):
+        """
+        Apply a storage profile to the connection. Pragma values can't be
+        passed as parameters, so names and values are validated instead.
+        """
+        if profile not in STORAGE_PROFILES:
+            raise ValueError(f'Unknown storage profile: {profile}')
+
+        settings = dict(STORAGE_PROFILES[profile])
+        settings.update(pragmas if pragmas else {})
+
+        for name, value in settings.items():
+            if name not in STORAGE_PRAGMAS or not re.fullmatch(r'-?\w+', str(value)):
+                raise ValueError(f'Invalid storage setting: {name}={value}')
+
+            # the journal mode is stored in the database file, only its writers set it
+            if self.read_only and name == 'journal_mode':
+                continue
+
+            self.cursor.execute(f"PRAGMA {name}={value}")
+
+        self.logger.debug(f'Using the {profile} storage profile')
+
+    def __table_exists(self, table_name: str) -> bool:
+        self.cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table_name,))
+        return self.cursor.fetchone() is not None
+
+    def __video_scope(self, comment_table: str, video_id: str, prefix='') -> tuple:
+        """
+        Return the SQL condition (and its parameters) selecting the comments of
+        the given video within `comment_table`. Per-video tables only ever hold
+        the comments of one video, so no condition is needed for them. The
+        column is qualified with `prefix`, e.g. a table alias like 'c.', or '+c.'
+        to also keep SQLite from using an index on it.
+        """
+        if comment_table == COMMENTS_TABLE:
+            return f'{prefix}video_id=?', (video_id,)
+
+        return '1', ()
+
+    def __with_content_hashes(self, dataframe: 'pd.DataFrame') -> 'pd.DataFrame':
+        """
+        Return the dataframe with the content hash of every comment: as is if
+        `copy_stored_sentiment` already hashed them, otherwise a shallow copy
+        with the hashes added.
+        """
+        if HASH_COLUMN in dataframe.columns:
+            return dataframe
+
+        hashed = dataframe.copy(deep=False)
+        hashed[HASH_COLUMN] = comment_hashes(dataframe)
+        return hashed
+
+    def __table_columns(self, table_name: str) -> list:
+        self.cursor.execute("SELECT name FROM pragma_table_info(?)", (table_name,))
+        return [row[0] for row in self.cursor.fetchall()]
+
+    def __load_fresh_comment_ids(self, dataframe: 'pd.DataFrame'):
+        """
+        Load the ids and content hashes of the comments returned by the API
+        into the temporary 'fresh_comments' table, so that they can be compared
+        against the stored comments with set-based statements. The rows are
+        passed as JSON objects which SQLite unpacks itself, avoiding a python
+        round trip per row. The first version of a duplicated comment wins, as
+        it does when comments are stored.
+        """
+        self.cursor.execute("DROP TABLE IF EXISTS temp.fresh_comments")
+        self.cursor.execute(f"CREATE TEMP TABLE fresh_comments (comment_id TEXT PRIMARY KEY, {HASH_COLUMN} INT)")
+        self.cursor.executemany("INSERT OR IGNORE INTO temp.fresh_comments SELECT key, value FROM json_each(?)",
+                                ((chunk,) for chunk in comment_hashes_json(dataframe)))
+
+    def __mark_hidden_comments(self, comment_table: str, video_id: str, seen_table: str, seen_params=()):
+        """
+        Flag the stored comments of the video which are not listed in the
+        `seen_table` query as nonvisible.
+        """
+        scope, scope_params = self.__video_scope(comment_table, video_id)
+
+        self.cursor.execute(f"UPDATE {comment_table} SET visible=FALSE \
+                WHERE {scope} AND visible IS NOT FALSE \
+                AND comment_id NOT IN ({seen_table})", scope_params + seen_params)
+        self.logger.debug(f'Identified {self.cursor.rowcount} nonvisible comments')
+
+        if self.searchable:
+            self.cursor.execute(f"UPDATE {SEARCH_ROWS_TABLE} SET visible=FALSE \
+                    WHERE video_id=? AND visible IS NOT FALSE \
+                    AND comment_id NOT IN ({seen_table})", (video_id,) + seen_params)
+
+    def __index_comment_ids(self, comment_table: str):
+        """
+        Make sure a per-video comment table is indexed by comment id. Tables
+        created before the index was introduced get it on their next merge.
+        The shared table is indexed by its primary key.
+        """
+        if comment_table != COMMENTS_TABLE:
+            self.cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{comment_table}_comment_id \
+                    ON {comment_table} (comment_id)")
+
+    def __add_content_hashes(self, comment_table: str):
+        """
+        Add the content hash column to a comment table created before edits
+        were tracked, hashing the comments it already holds.
+        """
+        if HASH_COLUMN in self.__table_columns(comment_table):
+            return
+
+        self.cursor.execute(f"ALTER TABLE {comment_table} ADD COLUMN {HASH_COLUMN} INT")
+        self.cursor.execute(f"UPDATE {comment_table} SET {HASH_COLUMN}=comment_hash(comment)")
+
+    def __find_changed_comments(self, comment_table: str, video_id: str) -> tuple:
+        """
+        Return the ids of the comments loaded into 'fresh_comments' which are
+        not stored yet, and of those whose stored content hash differs.
+        """
+        scope, scope_params = self.__video_scope(comment_table, video_id, prefix='stored.')
+
+        # one index lookup per fresh comment, rather than a scan of every stored one
+        self.cursor.execute(f"SELECT fresh.comment_id, stored.comment_id IS NULL FROM temp.fresh_comments AS fresh \
+                LEFT JOIN {comment_table} AS stored \
+                ON {scope} AND stored.comment_id=fresh.comment_id \
+                WHERE stored.{HASH_COLUMN} IS NOT fresh.{HASH_COLUMN}", scope_params)
+        changed = dict(self.cursor.fetchall())
+
+        return [key for key, new in changed.items() if new], [key for key, new in changed.items() if not new]
+
+    def __update_edited_comments(self, comment_table: str, video_id: str, new_dataframe: 'pd.DataFrame',
+                                 edited_ids: list):
+        """
+        Rewrite the edited comments, after copying their previous version to
+        the edit history. Only the edited rows are read or written.
+        """
+        if not edited_ids:
+            return
+
+        scope, scope_params = self.__video_scope(comment_table, video_id)
+
+        # older per-video tables may lack the sentiment columns
+        table_columns = self.__table_columns(comment_table)
+        sentiment = [col if col in table_columns else 'NULL' for col in ['PSentiment', 'NSentiment']]
+
+        self.cursor.execute(f"INSERT INTO {EDITS_TABLE} \
+                (video_id, comment_id, comment, {HASH_COLUMN}, PSentiment, NSentiment, replaced_at) \
+                SELECT ?, comment_id, comment, {HASH_COLUMN}, {', '.join(sentiment)}, datetime('now') \
+                FROM {comment_table} WHERE {scope} AND comment_id IN (SELECT value FROM json_each(?))",
+                            (video_id,) + scope_params + (json.dumps(edited_ids),))
+
+        # edited text gets the sentiment it was scored with, or none if it wasn't
+        columns = [col for col in ['comment', HASH_COLUMN, 'PSentiment', 'NSentiment'] if col in table_columns]
+        edited = new_dataframe[new_dataframe['comment_id'].isin(edited_ids)].drop_duplicates('comment_id')
+        edited = edited.reindex(columns=columns + ['comment_id']).astype(object)
+        edited = edited.where(edited.notna(), None)
+
+        assignments = ', '.join(f'{col}=?' for col in columns)
+        self.cursor.executemany(f"UPDATE {comment_table} SET {assignments} WHERE {scope} AND comment_id=?",
+                                (row[:-1] + scope_params + row[-1:] for row in edited.itertuples(index=False, name=None)))
+
+        if self.searchable:
+            self.cursor.executemany(f"UPDATE {SEARCH_TABLE} SET comment=? WHERE rowid=(SELECT id \
+                    FROM {SEARCH_ROWS_TABLE} WHERE video_id=? AND comment_id=?)",
+                                    ((comment, video_id, comment_id) for comment, comment_id
+                                     in edited[['comment', 'comment_id']].itertuples(index=False, name=None)))
+
+        self.logger.debug(f'Updated {len(edited_ids)} edited comments')
+
+    def __store_changed_comments(self, comment_table: str, video_id: str, new_dataframe: 'pd.DataFrame'):
+        """
+        Rewrite the edited comments among those loaded into 'fresh_comments',
+        and append the ones which are not stored yet.
+        """
+        self.__index_comment_ids(comment_table)
+        self.__add_content_hashes(comment_table)
+
+        new_ids, edited_ids = self.__find_changed_comments(comment_table, video_id)
+        self.__update_edited_comments(comment_table, video_id, new_dataframe, edited_ids)
+
+        new_comments = new_dataframe[new_dataframe['comment_id'].isin(new_ids)]
+        self.__append_comments(comment_table, video_id, new_comments.drop_duplicates('comment_id'))
+        self.logger.debug(f'Appended {len(new_ids)} new comments to local database')
+
+    def __merge_comment_data(self, comment_table: str, video_id: str, new_dataframe: 'pd.DataFrame',
+                             incremental=False):
         """
         Merge new comment data with existing data in local database. This logic
-        will detect hidden comments and update their visibility status and then
-        append any new comments to the comment table.
+        will detect hidden comments and update their visibility status, rewrite
+        edited comments and then append any new comments to the comment table.
+
+        The comparison runs entirely inside SQLite: the ids and content hashes
+        returned by the API are loaded into a temporary table, hidden comments
+        are flagged with a single UPDATE and new and edited comments are found
+        with a single SELECT, all in one transaction. Stored comments are
+        never pulled into memory, and unchanged ones are never rewritten.
+
+        An incremental merge only contains the newest comments of the video, so
+        comments missing from it can't be assumed hidden and visibility
+        detection is skipped.
         """
-        # pull comments from local database
-        db_dataframe = pd.read_sql(f'SELECT * FROM {comment_table}', self.conn)
-        if db_dataframe is None:
-            raise LookupError(f'Failed to pull data from comment table: {comment_table}')
+        with self.conn:
+            self.__load_fresh_comment_ids(new_dataframe)
 
-        # check for comments made nonvisible since our last check
-        nonvisible_comments = self.__get_nonvisible_comments(old=db_dataframe, new=new_dataframe)
-        nonvisible_ids = nonvisible_comments['comment_id'].tolist()
-        for nonvisible_id in nonvisible_ids:
-            # update database entry to reflect visible status
-            self.cursor.execute(f"UPDATE {comment_table} SET \
-                    visible=FALSE WHERE comment_id='{nonvisible_id}'")
+            if not incremental:
+                self.__mark_hidden_comments(comment_table, video_id, "SELECT comment_id FROM temp.fresh_comments")
 
-        self.logger.debug(f'Identified {len(nonvisible_comments.index)} nonvisible comments')
+            self.__store_changed_comments(comment_table, video_id, new_dataframe)
 
-        # check for new comments returned by the API, append to local database
-        new_comments = self.__get_new_comments(old=db_dataframe, new=new_dataframe)
-        self.logger.debug(f'Appending {len(new_comments.index)} new comments to local database')
-        new_comments.to_sql(comment_table, self.conn, index=False, if_exists='append')
+            self.cursor.execute("DROP TABLE temp.fresh_comments")
 
-        self.conn.commit()
+    def __append_comments(self, comment_table: str, video_id: str, dataframe: 'pd.DataFrame'):
+        """
+        Insert the rows of the dataframe into the comment table.
+        """
+        if dataframe.empty:
+            return
+
+        # older per-video tables may lack some columns, e.g. the sentiment data
+        table_columns = self.__table_columns(comment_table)
+        columns = [col for col in COMMENT_COLUMNS + [HASH_COLUMN] if col in dataframe.columns and col in table_columns]
+        rows = dataframe[columns].itertuples(index=False, name=None)
+
+        if comment_table == COMMENTS_TABLE:
+            columns = ['video_id'] + columns
+            rows = ((video_id,) + row for row in rows)
+
+        if self.searchable:
+            self.cursor.execute(f"SELECT COALESCE(MAX(rowid), 0) FROM {comment_table}")
+            last_rowid = self.cursor.fetchone()[0]
+
+        placeholders = ', '.join('?' * len(columns))
+        self.cursor.executemany(f"INSERT INTO {comment_table} ({', '.join(columns)}) VALUES ({placeholders})", rows)
+
+        if self.searchable:
+            self.__index_comments(comment_table, video_id, last_rowid)
+
+    def __index_comments(self, comment_table: str, video_id: str, after_rowid=0):
+        """
+        Add the comments of the video stored after row `after_rowid` of the
+        comment table to the search index.
+        """
+        scope, scope_params = self.__video_scope(comment_table, video_id)
+
+        self.cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {SEARCH_ROWS_TABLE}")
+        last_id = self.cursor.fetchone()[0]
+
+        self.cursor.execute(f"INSERT OR IGNORE INTO {SEARCH_ROWS_TABLE} (video_id, comment_id, date, visible) \
+                SELECT ?, comment_id, date, visible FROM {comment_table} WHERE {scope} AND rowid > ?",
+                            (video_id,) + scope_params + (after_rowid,))
+
+        # index the text of the rows added above, once per comment even if an
+        # older version stored it twice. The new rows are found by rowid (the
+        # unary + keeps SQLite from scanning the video's rows instead), and
+        # CROSS JOIN makes them the outer loop.
+        scope, scope_params = self.__video_scope(comment_table, video_id, prefix='+c.')
+        self.cursor.execute(f"INSERT INTO {SEARCH_TABLE} (rowid, comment, user) \
+                SELECT s.id, c.comment, c.user FROM {comment_table} AS c \
+                CROSS JOIN {SEARCH_ROWS_TABLE} AS s ON s.video_id=? AND s.comment_id=c.comment_id \
+                WHERE {scope} AND c.rowid > ? AND s.id > ? GROUP BY s.id",
+                            (video_id,) + scope_params + (after_rowid, last_id))
 
     def __get_next_table_name(self, last_table_name: str) -> str:
         """
@@ -92,7 +447,8 @@ class AstroDB:
         we'll be tracking over one hundred YouTube videos, let alone over 17k.
         """
         # Get most recent comment table name by grabbing latest entry in the Videos table
-        self.cursor.execute("SELECT comment_table FROM Videos ORDER BY id DESC LIMIT 1")
+        self.cursor.execute("SELECT comment_table FROM Videos WHERE comment_table != ? ORDER BY id DESC LIMIT 1",
+                            (COMMENTS_TABLE,))
 
         last_table_name = self.cursor.fetchone()
         if not last_table_name:  # this is the first comment table we're creating
@@ -110,7 +466,9 @@ class AstroDB:
 
     def __create_comment_table_for_video(self, video_data) -> str:
         """
-        Create a new comment table for a specific video id.
+        Create a new comment table for a specific video id. With the normalized
+        schema, the video is registered against the shared 'Comments' table
+        instead.
         """
         self.logger.debug('Creating comment table for new video...')
 
@@ -123,24 +481,30 @@ class AstroDB:
             # Missing the channel title is not critical, but should be investigated
             self.logger.warning('Missing channel title')
 
-        table_name = self.__create_unique_table_name()
+        if self.normalized:
+            table_name = COMMENTS_TABLE
+        else:
+            table_name = self.__create_unique_table_name()
         assert table_name, "Failed to create unique comment table in database"
 
-        query = f"INSERT INTO Videos \
+        self.cursor.execute("INSERT INTO Videos \
                 (channel_title, channel_id, video_id, \
                 views, likes, comment_count, filtered_comment_count, \
                 comment_table) \
-                VALUES ( \
-                '{video_data.channel_title}', \
-                '{video_data.channel_id}', \
-                '{video_data.video_id}', \
-                '{video_data.view_count}', \
-                '{video_data.like_count}', \
-                '{video_data.comment_count}', \
-                '{video_data.filtered_comment_count}', \
-                '{table_name}')"
-
-        self.cursor.execute(query)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            (video_data.channel_title,
+                             video_data.channel_id,
+                             video_data.video_id,
+                             video_data.view_count,
+                             video_data.like_count,
+                             video_data.comment_count,
+                             video_data.filtered_comment_count,
+                             table_name))
+
+        if self.normalized:
+            self.conn.commit()
+            self.logger.debug(f'Video id {video_data.video_id} registered in table {table_name}')
+            return table_name
 
         self.cursor.execute("CREATE TABLE {} ( \
             id INTEGER PRIMARY KEY AUTOINCREMENT, \
@@ -150,7 +514,9 @@ class AstroDB:
             date TEXT, \
             visible INT, \
             PSentiment, \
-            NSentiment)".format(table_name))
+            NSentiment, \
+            {} INT)".format(table_name, HASH_COLUMN))
+        self.__index_comment_ids(table_name)
 
         self.conn.commit()
 
@@ -164,7 +530,7 @@ class AstroDB:
         """
         self.logger.debug(f'Searching for comment table for video ID: {video_id}')
 
-        self.cursor.execute(f"SELECT comment_table FROM Videos WHERE video_id='{video_id}'")
+        self.cursor.execute("SELECT comment_table FROM Videos WHERE video_id=?", (video_id,))
         table = self.cursor.fetchone()
 
         if table:
@@ -172,23 +538,6 @@ class AstroDB:
         else:
             return ''
 
-    def __get_nonvisible_comments(self, old=None, new=None) -> pd.DataFrame:
-        """
-        Return a new dataframe containing only rows which are present in `old`
-        but not in `new`. This is used to determine which comments stored in the
-        local database were not returned in the latest API response, indicating
-        that the comment is no longer visible.
-        """
-        return old[~old.comment_id.isin(new.comment_id)]
-
-    def __get_new_comments(self, old=None, new=None) -> pd.DataFrame:
-        """
-        Return a new dataframe ontaining only rows with are present in `new`
-        but not in `old`. This is used to determine which comments in the API
-        response are not currently stored in the local database.
-        """
-        return new[~new.comment_id.isin(old.comment_id)]
-
     def get_db_conn(self):
         return self.conn
 
@@ -209,11 +558,385 @@ class AstroDB:
             filtered_comment_count INT, \
             comment_table TEXT)")
 
+        # every collection looks its video up by id, several times per batch
+        self.cursor.execute("CREATE INDEX IF NOT EXISTS idx_videos_video_id ON Videos (video_id)")
+
+        self.conn.commit()
+
+    def create_comments_table(self):
+        """
+        Create the 'Comments' table of the normalized schema, which holds the
+        comments of every video keyed by (video_id, comment_id). The primary key
+        doubles as the index for per-video lookups, with additional indexes
+        supporting date and user queries across videos.
+        """
+        self.cursor.execute(f"CREATE TABLE IF NOT EXISTS {COMMENTS_TABLE} ( \
+            video_id TEXT NOT NULL, \
+            comment_id TEXT NOT NULL, \
+            comment TEXT, \
+            user TEXT, \
+            date TEXT, \
+            visible INT, \
+            PSentiment REAL, \
+            NSentiment REAL, \
+            {HASH_COLUMN} INT, \
+            PRIMARY KEY (video_id, comment_id))")
+
+        self.cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_comments_video_date ON {COMMENTS_TABLE} (video_id, date)")
+        self.cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_comments_date ON {COMMENTS_TABLE} (date)")
+        self.cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_comments_user ON {COMMENTS_TABLE} (user)")
+
+        self.conn.commit()
+
+    def migrate_to_normalized(self) -> int:
+        """
+        One-shot migration of every per-video comment table into the shared
+        'Comments' table. Each per-video table is dropped once its rows have been
+        copied, and the whole migration runs in a single transaction. Returns the
+        number of migrated videos.
+        """
+        self.create_comments_table()
+        self.__add_content_hashes(COMMENTS_TABLE)
+
+        self.cursor.execute("SELECT video_id, comment_table FROM Videos WHERE comment_table != ?", (COMMENTS_TABLE,))
+        legacy_tables = self.cursor.fetchall()
+
+        self.logger.info(f'Migrating {len(legacy_tables)} comment tables to the normalized schema...')
+
+        with self.conn:
+            for video_id, comment_table in legacy_tables:
+                if self.__table_exists(comment_table):
+                    # older tables may lack some columns, e.g. the sentiment data
+                    table_columns = self.__table_columns(comment_table)
+                    select_columns = [col if col in table_columns else 'NULL' for col in COMMENT_COLUMNS]
+                    select_columns.append(HASH_COLUMN if HASH_COLUMN in table_columns else 'comment_hash(comment)')
+
+                    self.cursor.execute(f"INSERT OR IGNORE INTO {COMMENTS_TABLE} \
+                            (video_id, {', '.join(COMMENT_COLUMNS)}, {HASH_COLUMN}) \
+                            SELECT ?, {', '.join(select_columns)} FROM {comment_table}", (video_id,))
+                    self.cursor.execute(f"DROP TABLE {comment_table}")
+
+                self.cursor.execute("UPDATE Videos SET comment_table=? WHERE video_id=?", (COMMENTS_TABLE, video_id))
+
+        self.normalized = True
+
+        return len(legacy_tables)
+
+    def create_search_index(self) -> int:
+        """
+        Create the full-text search index and index every stored comment. From
+        then on, the comments this class stores are indexed as they are stored,
+        and hiding a comment hides it in the index too. Returns the number of
+        indexed comments.
+        """
+        if self.searchable:
+            return 0
+
+        self.logger.info('Building the comment search index...')
+
+        with self.conn:
+            self.cursor.execute(f"CREATE TABLE {SEARCH_ROWS_TABLE} ( \
+                id INTEGER PRIMARY KEY, \
+                video_id TEXT NOT NULL, \
+                comment_id TEXT NOT NULL, \
+                date TEXT, \
+                visible INT, \
+                UNIQUE (video_id, comment_id))")
+            self.cursor.execute(f"CREATE INDEX idx_search_date ON {SEARCH_ROWS_TABLE} (date)")
+            self.cursor.execute(f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5 ( \
+                comment, \
+                user, \
+                tokenize='unicode61 remove_diacritics 2')")
+
+            self.cursor.execute("SELECT video_id, comment_table FROM Videos")
+            for video_id, comment_table in self.cursor.fetchall():
+                if self.__table_exists(comment_table):
+                    self.__index_comments(comment_table, video_id)
+
+            self.cursor.execute(f"SELECT COUNT(*) FROM {SEARCH_ROWS_TABLE}")
+            indexed = self.cursor.fetchone()[0]
+
+        self.searchable = True
+
+        return indexed
+
+    def search_comments(self, query: str, channel_ids=None, since=None, before=None, visible=None,
+                        limit=20, highlight=('[', ']')) -> list:
+        """
+        Return the comments matching an FTS5 `query` as CommentMatch objects,
+        best match first. Results can be limited to some channels, to comments
+        published on or after `since` and before `before` (ISO 8601 dates),
+        and to visible (`visible=True`) or hidden (`visible=False`) comments.
+        The matched words in each snippet are wrapped in the `highlight` pair.
+        """
+        if not self.searchable:
+            raise ValueError('The search index has not been created')
+
+        conditions = [f'{SEARCH_TABLE} MATCH ?']
+        params = [query]
+
+        if channel_ids is not None:
+            conditions.append(f"v.channel_id IN ({', '.join('?' * len(channel_ids))})")
+            params.extend(channel_ids)
+
+        for condition, value in [('s.date >= ?', since), ('s.date < ?', before)]:
+            if value is not None:
+                conditions.append(condition)
+                params.append(value)
+
+        if visible is not None:
+            conditions.append('s.visible IS NOT FALSE' if visible else 's.visible IS FALSE')
+
+        self.cursor.execute(f"SELECT s.video_id, v.channel_id, s.comment_id, f.user, s.date, s.visible, \
+                f.comment, snippet({SEARCH_TABLE}, 0, ?, ?, '...', 16), f.rank \
+                FROM {SEARCH_TABLE} AS f \
+                JOIN {SEARCH_ROWS_TABLE} AS s ON s.id=f.rowid \
+                LEFT JOIN Videos AS v ON v.video_id=s.video_id \
+                WHERE {' AND '.join(conditions)} \
+                ORDER BY f.rank LIMIT ?", list(highlight) + params + [limit])
+
+        return [CommentMatch(*row) for row in self.cursor.fetchall()]
+
+    def create_edits_table(self):
+        """
+        Create the edit history, 'CommentEdits', which keeps the previous text
+        (and sentiment) of every comment a merge found edited, along with when
+        it was replaced.
+        """
+        self.cursor.execute(f"CREATE TABLE IF NOT EXISTS {EDITS_TABLE} ( \
+            id INTEGER PRIMARY KEY AUTOINCREMENT, \
+            video_id TEXT NOT NULL, \
+            comment_id TEXT NOT NULL, \
+            comment TEXT, \
+            {HASH_COLUMN} INT, \
+            PSentiment REAL, \
+            NSentiment REAL, \
+            replaced_at TEXT)")
+
+        self.cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_edits_comment ON {EDITS_TABLE} (video_id, comment_id)")
+
+        self.conn.commit()
+
+    def get_comment_edits(self, video_id: str, comment_id=None) -> list:
+        """
+        Return the previous versions of the edited comments of a video (or of
+        one of its comments) as (comment id, comment, replaced at) tuples,
+        oldest first.
+        """
+        if not video_id:
+            raise ValueError('Invalid video id')
+
+        condition, params = ('AND comment_id=?', (comment_id,)) if comment_id else ('', ())
+        self.cursor.execute(f"SELECT comment_id, comment, replaced_at FROM {EDITS_TABLE} \
+                WHERE video_id=? {condition} ORDER BY id", (video_id,) + params)
+        return self.cursor.fetchall()
+
+    def copy_stored_sentiment(self, video_id: str, dataframe: 'pd.DataFrame') -> 'pd.Series':
+        """
+        Copy the stored sentiment of the comments in the dataframe whose text
+        hasn't changed since they were stored, matching them by content hash.
+        The hashes are left in the dataframe's 'content_hash' column, so that
+        storing it doesn't hash every comment again. Returns a mask of the rows
+        which still need scoring: new and edited comments. Works on read-only
+        connections.
+        """
+        import pandas as pd
+
+        stored = []
+        dataframe[HASH_COLUMN] = comment_hashes(dataframe)
+
+        comment_table = self.__get_comment_table_for(video_id)
+        if comment_table and {HASH_COLUMN, 'PSentiment', 'NSentiment'} <= set(self.__table_columns(comment_table)):
+            scope, scope_params = self.__video_scope(comment_table, video_id)
+
+            # one index lookup per fresh comment
+            for chunk in comment_hashes_json(dataframe):
+                self.cursor.execute(f"SELECT comment_id, PSentiment, NSentiment FROM json_each(?) AS fresh \
+                        CROSS JOIN {comment_table} ON comment_id=fresh.key \
+                        WHERE {scope} AND {HASH_COLUMN}=fresh.value AND PSentiment IS NOT NULL",
+                                    (chunk,) + scope_params)
+                stored.extend(self.cursor.fetchall())
+
+        columns = ['PSentiment', 'NSentiment']
+        scores = pd.DataFrame(stored, columns=['comment_id'] + columns).drop_duplicates('comment_id')
+        scores = scores.set_index('comment_id').reindex(dataframe['comment_id']).to_numpy()
+
+        known = ~pd.isna(scores[:, 0])
+        if known.any():
+            dataframe.loc[known, columns] = scores[known]
+
+        self.logger.debug(f'Reused the stored sentiment of {known.sum()} unchanged comments')
+
+        return pd.Series(~known, index=dataframe.index)
+
+    def create_sync_state_table(self):
+        """
+        Create the 'SyncState' table, which records the newest comment stored for
+        each video. Incremental collection stops paging once it reaches this
+        high-water mark.
+        """
+        self.cursor.execute("CREATE TABLE IF NOT EXISTS SyncState ( \
+            video_id TEXT PRIMARY KEY, \
+            last_published_at TEXT, \
+            last_comment_id TEXT)")
+
+        self.conn.commit()
+
+    def get_high_water_mark(self, video_id: str) -> tuple:
+        """
+        Return the (publishedAt, comment ID) of the newest comment stored for the
+        given video, or None if no comments have been stored yet.
+        """
+        if not video_id:
+            raise ValueError('Invalid video id')
+
+        self.cursor.execute("SELECT last_published_at, last_comment_id FROM SyncState WHERE video_id=?",
+                            (video_id,))
+        return self.cursor.fetchone()
+
+    def update_high_water_mark(self, video_id: str, dataframe: 'pd.DataFrame'):
+        """
+        Advance the high-water mark of the given video to the newest top level
+        comment in the dataframe. The mark never moves backwards.
+        """
+        if not video_id:
+            raise ValueError('Invalid video id')
+
+        if dataframe is None or dataframe.empty:
+            return
+
+        # incremental collection compares the mark with the top level comment
+        # of each thread, so a newer reply must not move it past older threads
+        threads = dataframe[~dataframe['comment_id'].str.contains('.', regex=False)]
+        if threads.empty:
+            return
+
+        newest = threads.loc[threads['date'].idxmax()]
+
+        with self.conn:
+            self.__advance_high_water_mark(video_id, newest['date'], newest['comment_id'])
+
+    def __advance_high_water_mark(self, video_id: str, published_at: str, comment_id: str):
+        self.cursor.execute("INSERT INTO SyncState (video_id, last_published_at, last_comment_id) \
+                VALUES (?, ?, ?) \
+                ON CONFLICT(video_id) DO UPDATE SET \
+                last_published_at=excluded.last_published_at, \
+                last_comment_id=excluded.last_comment_id \
+                WHERE excluded.last_published_at > SyncState.last_published_at",
+                            (video_id, published_at, comment_id))
+
+    def create_checkpoints_table(self):
+        """
+        Create the 'Checkpoints' table, which records how far an interrupted
+        comment collection got: the page token to resume from, and the number
+        of pages and comments stored so far.
+        """
+        self.cursor.execute("CREATE TABLE IF NOT EXISTS Checkpoints ( \
+            video_id TEXT PRIMARY KEY, \
+            page_token TEXT, \
+            page_count INT, \
+            comment_count INT, \
+            updated_at TEXT)")
+
+        # comments stored by the collections in progress on this connection
+        self.cursor.execute("CREATE TEMP TABLE IF NOT EXISTS seen_comments ( \
+            video_id TEXT, \
+            comment_id TEXT, \
+            PRIMARY KEY (video_id, comment_id))")
+
         self.conn.commit()
 
-    def insert_comment_dataframe(self, video_data, dataframe: pd.DataFrame):
+    def get_checkpoint(self, video_id: str) -> tuple:
+        """
+        Return the (page token, page count, comment count) checkpoint of an
+        unfinished collection of the given video, or None.
+        """
+        if not video_id:
+            raise ValueError('Invalid video id')
+
+        self.cursor.execute("SELECT page_token, page_count, comment_count FROM Checkpoints WHERE video_id=?",
+                            (video_id,))
+        return self.cursor.fetchone()
+
+    def clear_checkpoint(self, video_id: str):
+        with self.conn:
+            self.cursor.execute("DELETE FROM Checkpoints WHERE video_id=?", (video_id,))
+            self.cursor.execute("DELETE FROM temp.seen_comments WHERE video_id=?", (video_id,))
+
+    def store_comment_batch(self, video_data, dataframe: 'pd.DataFrame', next_page_token: str, page_count: int):
+        """
+        Store one batch of pages of a collection in progress, and checkpoint
+        `next_page_token` as the point to resume from, in a single transaction.
+        Only comments which aren't stored yet are appended and only edited ones
+        are rewritten, so re-storing a batch after a crash is harmless. Hidden
+        comments are detected once the collection is finished, see
+        `finish_comment_collection`.
+        """
+        if not video_data or not video_data.video_id:
+            raise ValueError('Invalid video data')
+
+        video_id = video_data.video_id
+        comment_table = self.__get_comment_table_for(video_id) or self.__create_comment_table_for_video(video_data)
+
+        dataframe = self.__with_content_hashes(dataframe)
+
+        with self.conn:
+            self.__load_fresh_comment_ids(dataframe)
+            self.__store_changed_comments(comment_table, video_id, dataframe)
+
+            self.cursor.execute("INSERT OR IGNORE INTO temp.seen_comments \
+                    SELECT ?, comment_id FROM temp.fresh_comments", (video_id,))
+            self.cursor.execute("DROP TABLE temp.fresh_comments")
+
+            self.cursor.execute("INSERT INTO Checkpoints \
+                    (video_id, page_token, page_count, comment_count, updated_at) \
+                    VALUES (?, ?, ?, ?, datetime('now')) \
+                    ON CONFLICT(video_id) DO UPDATE SET \
+                    page_token=excluded.page_token, \
+                    page_count=excluded.page_count, \
+                    comment_count=Checkpoints.comment_count + excluded.comment_count, \
+                    updated_at=excluded.updated_at",
+                                (video_id, next_page_token, page_count, len(dataframe.index)))
+
+    def finish_comment_collection(self, video_data, detect_hidden=False) -> int:
+        """
+        Complete a collection stored with `store_comment_batch`: advance the
+        high-water mark to the newest stored top level comment (reply IDs are
+        those of their thread, a dot and their own) and drop the checkpoint.
+        Returns the number of comments the collection stored.
+
+        Set `detect_hidden` if every page of the video was collected on this
+        connection (i.e. the collection was neither incremental nor resumed), in
+        which case stored comments which weren't seen are flagged as nonvisible.
+        """
+        video_id = video_data.video_id
+        checkpoint = self.get_checkpoint(video_id)
+        comment_table = self.__get_comment_table_for(video_id)
+
+        if comment_table:
+            scope, scope_params = self.__video_scope(comment_table, video_id)
+
+            with self.conn:
+                if detect_hidden:
+                    self.__mark_hidden_comments(comment_table, video_id,
+                                                "SELECT comment_id FROM temp.seen_comments WHERE video_id=?",
+                                                (video_id,))
+
+                self.cursor.execute(f"SELECT date, comment_id FROM {comment_table} \
+                        WHERE {scope} AND comment_id NOT LIKE '%.%' ORDER BY date DESC LIMIT 1", scope_params)
+                newest = self.cursor.fetchone()
+                if newest:
+                    self.__advance_high_water_mark(video_id, *newest)
+
+        self.clear_checkpoint(video_id)
+
+        return checkpoint[2] if checkpoint else 0
+
+    def insert_comment_dataframe(self, video_data, dataframe: 'pd.DataFrame', incremental=False):
         """
         Given a video ID and a dataframe, commit the dataframe to the database.
+        Set `incremental` when the dataframe only holds the newest comments of
+        the video rather than every visible comment.
         """
         self.logger.debug('Inserting new comment dataframe...')
 
@@ -223,17 +946,57 @@ class AstroDB:
         if dataframe is None:
             raise ValueError('Cannot insert NULL dataframe')
 
+        dataframe = self.__with_content_hashes(dataframe)
+
         comment_table = self.__get_comment_table_for(video_data.video_id)
         if comment_table:
             self.logger.debug('Merging new comment data with local database...')
-            return self.__merge_comment_data(comment_table, dataframe)
+            return self.__merge_comment_data(comment_table, video_data.video_id, dataframe, incremental)
         else:
             self.logger.debug(f'Comment table for video id {video_data.video_id} did not exist - creating it now')
             comment_table = self.__create_comment_table_for_video(video_data)
 
-        dataframe.to_sql(comment_table, self.conn, index=False, if_exists='replace')
+        if comment_table == COMMENTS_TABLE:
+            # the shared table may hold comments of the video already, merge into it
+            return self.__merge_comment_data(comment_table, video_data.video_id, dataframe)
 
-        self.conn.commit()
+        with self.conn:
+            self.__append_comments(comment_table, video_data.video_id, dataframe.drop_duplicates('comment_id'))
+
+    def get_videos(self) -> list:
+        """
+        Return the (video id, channel id, channel title, comment table) of every
+        video in the database.
+        """
+        self.cursor.execute("SELECT video_id, channel_id, channel_title, comment_table FROM Videos ORDER BY id")
+        return self.cursor.fetchall()
+
+    def get_comment_rows(self, video_id: str, after_rowid=0, batch_size=100000):
+        """
+        Yield the comments of a video stored after row `after_rowid`, as lists
+        of at most `batch_size` (rowid, *COMMENT_COLUMNS) tuples in storage
+        order. Columns missing from older per-video tables are None.
+        """
+        if not video_id:
+            raise ValueError('Invalid video id')
+
+        comment_table = self.__get_comment_table_for(video_id)
+        if not comment_table or not self.__table_exists(comment_table):
+            return
+
+        scope, scope_params = self.__video_scope(comment_table, video_id)
+        table_columns = self.__table_columns(comment_table)
+        select_columns = [col if col in table_columns else 'NULL' for col in COMMENT_COLUMNS]
+
+        # a cursor of its own, so the connection can be used between batches
+        cursor = self.conn.cursor()
+        cursor.execute(f"SELECT rowid, {', '.join(select_columns)} FROM {comment_table} \
+                WHERE {scope} AND rowid > ? ORDER BY rowid", scope_params + (after_rowid,))
+
+        rows = cursor.fetchmany(batch_size)
+        while rows:
+            yield rows
+            rows = cursor.fetchmany(batch_size)
 
     def get_video_data(self, video_id: str) -> VideoData:
         """
@@ -244,7 +1007,7 @@ class AstroDB:
         if not video_id:
             raise ValueError('Invalid video id')
 
-        self.cursor.execute(f"SELECT * FROM Videos WHERE video_id='{video_id}'")
+        self.cursor.execute("SELECT * FROM Videos WHERE video_id=?", (video_id,))
         db_record = self.cursor.fetchone()
 
         if not db_record:
@@ -268,11 +1031,47 @@ class AstroDB:
         """
         self.logger.debug('Updating video metadata...')
 
-        self.cursor.execute(f"UPDATE Videos SET \
-                comment_count={video_data.comment_count}, \
-                filtered_comment_count={video_data.filtered_comment_count}, \
-                likes={video_data.like_count}, \
-                views={video_data.view_count} \
-                WHERE video_id='{video_data.video_id}'")
+        self.cursor.execute("UPDATE Videos SET \
+                comment_count=?, \
+                filtered_comment_count=?, \
+                likes=?, \
+                views=? \
+                WHERE video_id=?",
+                            (video_data.comment_count,
+                             video_data.filtered_comment_count,
+                             video_data.like_count,
+                             video_data.view_count,
+                             video_data.video_id))
+
+        self.conn.commit()
+
+    def create_quota_table(self):
+        """
+        Create the 'QuotaUsage' table, which records the API quota units spent
+        on each day, so that the daily quota is shared by every run.
+        """
+        self.cursor.execute("CREATE TABLE IF NOT EXISTS QuotaUsage ( \
+            day TEXT PRIMARY KEY, \
+            units INT)")
 
         self.conn.commit()
+
+    def get_quota_used(self, day: str) -> int:
+        """
+        Return the quota units spent on the given day (YYYY-MM-DD, Pacific time).
+        """
+        self.cursor.execute("SELECT units FROM QuotaUsage WHERE day=?", (day,))
+        row = self.cursor.fetchone()
+
+        return row[0] if row else 0
+
+    def add_quota_used(self, day: str, units: int):
+        """
+        Add quota units spent on the given day (YYYY-MM-DD, Pacific time).
+        """
+        if not units:
+            return
+
+        with self.conn:
+            self.cursor.execute("INSERT INTO QuotaUsage (day, units) VALUES (?, ?) \
+                    ON CONFLICT(day) DO UPDATE SET units=units + excluded.units", (day, units))
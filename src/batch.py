@@ -0,0 +1,322 @@
+"""
+Batch collection of several YouTube videos in a single Astro run.
+
+Video metadata is requested in bulk up front, then comment pages are fetched
+concurrently on a bounded pool of worker threads, or on an event loop when an
+`AsyncYouTubeDataAPI` is provided. Results are funneled back to the calling
+thread, which owns the sentiment analyzer and hands each scored result to the
+writer thread of a `DatabaseService`, so the next result is scored while the
+previous one is stored.
+"""
+import threading
+import time
+import traceback
+
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from src.astro_db import AstroDB
+from src.data_collection.yt_data_api import YouTubeDataAPI, extract_video_id
+from src.data_collection.request_executor import RequestExecutor
+from src.data_collection.async_api import AsyncRunner
+
+
+def read_video_list(lines) -> list:
+    """
+    Parse a list of video URLs/IDs, one per line. Blank lines and lines
+    starting with '#' are ignored.
+    """
+    videos = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            videos.append(line)
+
+    return videos
+
+
+class BatchResult:
+    url: str
+    video_data: object
+    comments: object
+    high_water_mark: tuple
+    error: str
+    fetch_time: float
+
+    def __init__(self, url, video_data=None, comments=None, high_water_mark=None, error='', fetch_time=0.0):
+        self.url = url
+        self.video_data = video_data
+        self.comments = comments
+        self.high_water_mark = high_water_mark
+        self.error = error
+        self.fetch_time = fetch_time
+
+
+class BatchSummary:
+    video_count: int
+    failed_count: int
+    comment_count: int
+    quota_used: int
+    elapsed: float
+
+    def __init__(self):
+        self.video_count = 0
+        self.failed_count = 0
+        self.comment_count = 0
+        self.quota_used = 0
+        self.elapsed = 0.0
+
+    def comments_per_second(self) -> float:
+        return self.comment_count / self.elapsed if self.elapsed else 0.0
+
+    def videos_per_minute(self) -> float:
+        return self.video_count / self.elapsed * 60 if self.elapsed else 0.0
+
+
+class BatchCollector:
+    logger = None
+    api_key = None
+    log_json = False
+    workers = 4
+    incremental = False
+    client_factory = None
+    expand_replies = True
+    reply_workers = 4
+    async_api = None
+
+    def __init__(self, logger, api_key, db, sentiment, workers=4, log_json=False, incremental=False,
+                 client_factory=None, executor=None, expand_replies=True, reply_workers=4, async_api=None):
+        """
+        `db` is the DatabaseService collected data is stored through.
+
+        With an `async_api`, comments are fetched by it rather than by worker
+        threads, and up to its `max_concurrency` videos are collected at once.
+        It should share `executor`, so that the quota budget covers both.
+        """
+        if workers < 1:
+            raise ValueError(f'Invalid worker count: {workers}')
+
+        self.logger = logger
+        self.api_key = api_key
+        self.db = db
+        self.sentiment = sentiment
+        self.workers = workers
+        self.log_json = log_json
+        self.incremental = incremental
+        self.client_factory = client_factory
+        self.expand_replies = expand_replies
+        self.reply_workers = reply_workers
+        self.async_api = async_api
+
+        # one executor for every worker, so the rate limit and quota budget apply
+        # to the batch as a whole
+        self.executor = executor if executor else RequestExecutor(logger)
+
+        self.__thread_data = threading.local()
+
+    def __get_api(self) -> YouTubeDataAPI:
+        """
+        Return the YouTubeDataAPI instance owned by the calling worker thread.
+        """
+        api = getattr(self.__thread_data, 'api', None)
+        if api is None:
+            api = YouTubeDataAPI(self.logger, self.api_key, self.log_json, show_progress=False,
+                                 client_factory=self.client_factory, executor=self.executor,
+                                 expand_replies=self.expand_replies, reply_workers=self.reply_workers)
+            self.__thread_data.api = api
+
+        return api
+
+    def __fetch(self, video_data, high_water_mark) -> BatchResult:
+        """
+        Worker task: collect the comments of a single video.
+        """
+        start = time.perf_counter()
+        try:
+            comments = None
+            if not video_data.comments_disabled:
+                comments = self.__get_api().get_comments(video_data, high_water_mark=high_water_mark)
+
+            return BatchResult(video_data.video_id, video_data, comments, high_water_mark,
+                               fetch_time=time.perf_counter() - start)
+
+        except Exception as e:
+            self.logger.debug(traceback.format_exc())
+            return BatchResult(video_data.video_id, error=str(e))
+
+    async def __fetch_async(self, video_data, high_water_mark) -> BatchResult:
+        """
+        Event loop task: collect the comments of a single video.
+        """
+        start = time.perf_counter()
+        try:
+            comments = None
+            if not video_data.comments_disabled:
+                comments = await self.async_api.get_comments(video_data, high_water_mark=high_water_mark)
+
+            return BatchResult(video_data.video_id, video_data, comments, high_water_mark,
+                               fetch_time=time.perf_counter() - start)
+
+        except Exception as e:
+            self.logger.debug(traceback.format_exc())
+            return BatchResult(video_data.video_id, error=str(e))
+
+    def __submit(self, pool, runner, video_data):
+        """
+        Start fetching the comments of a video, returning a future of its
+        BatchResult.
+        """
+        high_water_mark = self.__get_high_water_mark(video_data)
+        if runner:
+            return runner.submit(self.__fetch_async(video_data, high_water_mark))
+
+        return pool.submit(self.__fetch, video_data, high_water_mark)
+
+    def __get_metadata(self, urls: list) -> tuple:
+        """
+        Resolve the video list to VideoData objects with as few videos.list
+        requests as possible. Returns the results for videos that could not be
+        collected, with the error of the request if their metadata request
+        failed, alongside the metadata of those that can.
+        """
+        failed = []
+        video_ids = []
+        for url in urls:
+            try:
+                video_ids.append(extract_video_id(url))
+            except ValueError as e:
+                failed.append(BatchResult(url, error=str(e)))
+
+        errors = {}
+        metadata = self.__get_api().get_video_metadata_batch(video_ids, errors=errors)
+        for video_id, video_data in metadata.items():
+            if video_data is None:
+                failed.append(BatchResult(video_id, error=errors.get(video_id, 'video metadata unavailable')))
+
+        return failed, [video_data for video_data in metadata.values() if video_data]
+
+    def __get_high_water_mark(self, video_data) -> tuple:
+        """
+        Look up where an incremental collection of the video should stop.
+        """
+        if not self.incremental:
+            return None
+
+        return self.db.read(AstroDB.get_high_water_mark, video_data.video_id)
+
+    @staticmethod
+    def __store(db: AstroDB, result: BatchResult) -> int:
+        """
+        Persist the collected data of a video. Runs on the database writer
+        thread.
+        """
+        video_data = result.video_data
+        db.update_video_data(video_data)
+
+        if result.comments is None or result.comments.empty:
+            return 0
+
+        db.insert_comment_dataframe(video_data, result.comments, incremental=result.high_water_mark is not None)
+        db.update_high_water_mark(video_data.video_id, result.comments)
+
+        return len(result.comments.index)
+
+    def __handle_result(self, result: BatchResult, summary: BatchSummary, total: int, stores: dict):
+        """
+        Score the new and edited comments of a fetched result and submit it to
+        the database writer, recording the future of the write in `stores`.
+        """
+        if result.error:
+            self.__log_failure(result, summary, total, result.error)
+            return
+
+        try:
+            if result.comments is not None and not result.comments.empty:
+                unscored = self.db.read(AstroDB.copy_stored_sentiment, result.video_data.video_id, result.comments)
+                self.sentiment.add_sentiment_to_dataframe(result.comments, rows=unscored)
+
+            stores[self.db.submit(self.__store, result)] = result
+
+        except Exception as e:
+            self.__log_failure(result, summary, total, f'failed to store data: {e}')
+            self.logger.debug(traceback.format_exc())
+
+    def __log_failure(self, result: BatchResult, summary: BatchSummary, total: int, error: str):
+        done = summary.video_count + summary.failed_count + 1
+        summary.failed_count += 1
+        self.logger.error(f'[{done}/{total}] {result.url}: {error}')
+
+    def __handle_stored(self, future, result: BatchResult, summary: BatchSummary, total: int):
+        """
+        Account for a result once the database writer is done with it.
+        """
+        try:
+            comment_count = future.result()
+        except Exception as e:
+            self.__log_failure(result, summary, total, f'failed to store data: {e}')
+            return
+
+        done = summary.video_count + summary.failed_count + 1
+        prefix = f'[{done}/{total}]'
+        summary.video_count += 1
+        summary.comment_count += comment_count
+
+        status = 'comments disabled' if result.video_data.comments_disabled else f'{comment_count} comments'
+        self.logger.info(f'{prefix} {result.video_data.video_id}: {status} in {result.fetch_time:.1f}s')
+
+    def collect(self, urls: list) -> BatchSummary:
+        """
+        Collect data for every video in `urls`. At most `workers` videos (or
+        the async API's `max_concurrency`) are fetched at once, and fetched
+        results are never allowed to pile up beyond the pool size and the
+        database service's queue while the database writer catches up.
+        """
+        summary = BatchSummary()
+        start = time.perf_counter()
+        in_flight = set()
+        stores = {}
+
+        self.logger.info(f'Collecting {len(urls)} videos with {self.workers} workers')
+
+        failed, pending = self.__get_metadata(urls)
+        total = len(failed) + len(pending)
+        for result in failed:
+            self.__log_failure(result, summary, total, result.error)
+
+        pending.reverse()
+        max_in_flight = self.async_api.max_concurrency if self.async_api else self.workers
+        runner = AsyncRunner() if self.async_api else None
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                while pending or in_flight or stores:
+                    while pending and len(in_flight) < max_in_flight and not self.executor.quota_exhausted:
+                        in_flight.add(self.__submit(pool, runner, pending.pop()))
+
+                    # once the quota is gone, every remaining video would fail too
+                    if self.executor.quota_exhausted and not in_flight:
+                        for video_data in reversed(pending):
+                            self.__log_failure(BatchResult(video_data.video_id), summary, total, 'API quota exhausted')
+                        pending = []
+
+                    done, _ = wait(in_flight | stores.keys(), return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if future in stores:
+                            self.__handle_stored(future, stores.pop(future), summary, total)
+                        else:
+                            in_flight.remove(future)
+                            self.__handle_result(future.result(), summary, total, stores)
+
+        finally:
+            if runner:
+                runner.close(self.async_api)
+
+        summary.elapsed = time.perf_counter() - start
+        summary.quota_used = self.executor.quota_used
+
+        return summary
+
+    def log_summary(self, summary: BatchSummary):
+        self.logger.info(f'Collected {summary.video_count} videos ({summary.failed_count} failed) ' +
+                         f'in {summary.elapsed:.1f}s')
+        self.logger.info(f'Throughput: {summary.comments_per_second():.1f} comments/s, ' +
+                         f'{summary.videos_per_minute():.1f} videos/min')
+        self.logger.info(f'Quota used: {summary.quota_used} units ({self.executor.retry_count} retried requests)')
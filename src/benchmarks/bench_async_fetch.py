@@ -0,0 +1,78 @@
+"""
+Benchmark for the asynchronous comment fetcher. Collects `videos` videos of
+`pages` comment pages each from a local mock API server, which answers every
+request after `latency_ms`. Compares the blocking client on `workers` threads
+(sharing a pooled session) against the async fetcher with `workers` requests
+in flight, reporting the wall time and the peak number of concurrent requests
+the server saw. Needs aiohttp.
+
+Usage: python -m src.benchmarks.bench_async_fetch [videos] [pages] [workers] [latency_ms]
+"""
+import asyncio
+import sys
+
+from concurrent.futures import ThreadPoolExecutor
+
+from src.benchmarks.common import bench_logger, synthetic_comment_pages, timed
+from src.data_collection.async_api import AsyncYouTubeDataAPI
+from src.data_collection.data_structures import VideoData
+from src.data_collection.http_transport import PooledHttp
+from src.data_collection.youtube_client import YouTubeClientFactory
+from src.data_collection.yt_data_api import YouTubeDataAPI
+from src.tests.astro_mocks import MockAPIServer
+
+
+def video_list(videos: int, pages: int) -> list:
+    return [VideoData(video_id=f'video{i}', comment_count=pages * 200) for i in range(videos)]
+
+
+def fetch_threads(logger, server, videos: list, workers: int):
+    http = PooledHttp(pool_size=workers)
+    factory = YouTubeClientFactory('benchmark', http=http, api_endpoint=server.url)
+
+    def fetch(video_data):
+        youtube = YouTubeDataAPI(logger, 'benchmark', show_progress=False, client_factory=factory)
+        return youtube.get_comments(video_data)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(fetch, videos))
+
+    http.close()
+    return results
+
+
+def fetch_async(logger, server, videos: list, workers: int):
+    api = AsyncYouTubeDataAPI(logger, 'benchmark', max_concurrency=workers, api_endpoint=server.url)
+
+    async def fetch_all():
+        try:
+            return await asyncio.gather(*[api.get_comments(video_data) for video_data in videos])
+        finally:
+            await api.close()
+
+    return asyncio.run(fetch_all())
+
+
+def run(video_count, page_count, workers, latency_ms):
+    logger = bench_logger()
+    server = MockAPIServer({'commentThreads': synthetic_comment_pages(page_count)}, latency=latency_ms / 1000)
+    server.start()
+
+    print(f'{video_count} videos of {page_count} pages, {workers} workers, {latency_ms}ms per request')
+    print(f'{"fetcher":<10} {"requests":>10} {"concurrent":>12} {"seconds":>10} {"comments/s":>12}')
+    for name, fetch in [('threads', fetch_threads), ('async', fetch_async)]:
+        server.request_count = 0
+        server.max_active_requests = 0
+
+        results, elapsed = timed(fetch, logger, server, video_list(video_count, page_count), workers)
+        comment_count = sum(len(df.index) for df in results)
+        print(f'{name:<10} {server.request_count:>10} {server.max_active_requests:>12} {elapsed:>10.3f} ' +
+              f'{comment_count / elapsed:>12.0f}')
+
+    server.stop()
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    defaults = [50, 5, 20, 50]
+    run(*(args + defaults[len(args):]))
@@ -0,0 +1,37 @@
+"""
+Benchmark for comment collection. Runs `YouTubeDataAPI.get_comments` against
+synthetic `commentThreads` pages of increasing length and reports the time spent
+per page. With the columnar comment accumulator the per-page cost should stay
+flat as the page count grows, i.e. collection scales linearly.
+
+Usage: python -m src.benchmarks.bench_comment_parsing [page counts...]
+"""
+import sys
+
+import googleapiclient.http
+from unittest.mock import MagicMock
+
+from src.benchmarks.common import bench_logger, synthetic_comment_pages, timed
+from src.data_collection.data_structures import VideoData
+from src.data_collection.yt_data_api import YouTubeDataAPI
+
+
+def run(page_counts):
+    logger = bench_logger()
+    youtube = YouTubeDataAPI(logger, 'bench_apikey')
+
+    print(f'{"pages":>8} {"comments":>10} {"seconds":>10} {"ms/page":>10}')
+    for page_count in page_counts:
+        pages = synthetic_comment_pages(page_count)
+        googleapiclient.http.HttpRequest.execute = MagicMock(side_effect=pages)
+
+        # each synthetic thread carries one inline reply
+        video_data = VideoData(video_id='benchmark', comment_count=page_count * 200)
+        df, elapsed = timed(youtube.get_comments, video_data)
+
+        print(f'{page_count:>8} {len(df.index):>10} {elapsed:>10.3f} {elapsed / page_count * 1000:>10.2f}')
+
+
+if __name__ == '__main__':
+    counts = [int(arg) for arg in sys.argv[1:]] or [10, 50, 100, 200, 400]
+    run(counts)
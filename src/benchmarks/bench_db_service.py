@@ -0,0 +1,127 @@
+"""
+Benchmark for the database service. Stores `videos` videos of `comments`
+comments each, with `score_ms` of simulated sentiment scoring per video:
+
+- scored and stored one after another on a single AstroDB connection (the
+  previous batch mode), against scored on the calling thread while the
+  service's writer stores the previous video;
+- from `threads` collector threads at once, each with a connection of its own,
+  against all of them submitting to the service, while the threads also look
+  up video metadata. Reports the collections which failed, with 'database is
+  locked' or by racing another connection to create the same comment table.
+
+Usage: python -m src.benchmarks.bench_db_service [videos] [comments] [score_ms] [threads]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+from src.astro_db import AstroDB
+from src.benchmarks.bench_merge import comment_dataframe
+from src.benchmarks.common import bench_logger, timed
+from src.data_collection.data_structures import VideoData
+from src.db_service import DatabaseService
+
+PROFILE = 'fast'
+
+
+def video_list(count: int) -> list:
+    return [VideoData(video_id=f'video{i}', channel_id='channel', channel_title='channel') for i in range(count)]
+
+
+def store_serial(logger, db_file, videos, df, score_ms):
+    db = AstroDB(logger, db_file, profile=PROFILE)
+    for video_data in videos:
+        time.sleep(score_ms / 1000)
+        db.insert_comment_dataframe(video_data, df)
+        db.update_video_data(video_data)
+
+    db.get_db_conn().close()
+
+
+def store_service(logger, db_file, videos, df, score_ms):
+    service = DatabaseService(logger, db_file, profile=PROFILE)
+    for video_data in videos:
+        time.sleep(score_ms / 1000)
+        service.submit(AstroDB.insert_comment_dataframe, video_data, df)
+        service.submit(AstroDB.update_video_data, video_data)
+
+    service.close()
+
+
+def run_collectors(videos, thread_count, collect) -> int:
+    """
+    Split the videos across `thread_count` threads running `collect(video)`,
+    returning the number of collections which failed.
+    """
+    failures = []
+
+    def worker(assigned):
+        for video_data in assigned:
+            try:
+                collect(video_data)
+            except sqlite3.OperationalError as e:
+                failures.append(e)
+
+    threads = [threading.Thread(target=worker, args=(videos[i::thread_count],)) for i in range(thread_count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return len(failures)
+
+
+def parallel_connections(logger, db_file, videos, df, thread_count) -> int:
+    AstroDB(logger, db_file, profile=PROFILE).get_db_conn().close()
+    local = threading.local()
+
+    def collect(video_data):
+        if not hasattr(local, 'db'):
+            # a short lock timeout, as a collector shouldn't stall for long
+            local.db = AstroDB(logger, db_file, profile=PROFILE, pragmas={'busy_timeout': 100})
+
+        local.db.get_video_data(video_data.video_id)
+        local.db.insert_comment_dataframe(video_data, df)
+
+    return run_collectors(videos, thread_count, collect)
+
+
+def parallel_service(logger, db_file, videos, df, thread_count) -> int:
+    service = DatabaseService(logger, db_file, profile=PROFILE, readers=thread_count)
+
+    def collect(video_data):
+        service.read(AstroDB.get_video_data, video_data.video_id)
+        service.write(AstroDB.insert_comment_dataframe, video_data, df)
+
+    failures = run_collectors(videos, thread_count, collect)
+    service.close()
+    return failures
+
+
+def run(video_count, comment_count, score_ms, thread_count):
+    logger = bench_logger()
+    df = comment_dataframe(0, comment_count)
+    videos = video_list(video_count)
+
+    print(f'{video_count} videos of {comment_count} comments, {score_ms}ms scoring per video')
+    print(f'{"writer":<26} {"seconds":>10} {"failed":>8}')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, store in [('serial', store_serial), ('service', store_service)]:
+            _, elapsed = timed(store, logger, os.path.join(tmp_dir, f'{name}.db'), videos, df, score_ms)
+            print(f'{name:<26} {elapsed:>10.3f} {"":>8}')
+
+        for name, store in [(f'{thread_count} connections', parallel_connections),
+                            (f'{thread_count} threads, service', parallel_service)]:
+            db_file = os.path.join(tmp_dir, f'{name}.db')
+            failures, elapsed = timed(store, logger, db_file, videos, df, thread_count)
+            print(f'{name:<26} {elapsed:>10.3f} {failures:>8}')
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    defaults = [50, 2000, 20, 8]
+    run(*(args + defaults[len(args):]))
@@ -0,0 +1,79 @@
+"""
+Benchmark for database writes. Reports the throughput, in rows per second, of
+storing the comments of a new video with pandas' `to_sql` (the previous path)
+and with AstroDB's parameterized `executemany` inserts for both schemas. Also
+compares updating video metadata with literal SQL, which SQLite compiles anew
+for every video, against a parameterized statement compiled once.
+
+Usage: python -m src.benchmarks.bench_db_write [comment counts...]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+
+from src.astro_db import AstroDB
+from src.benchmarks.bench_merge import comment_dataframe
+from src.benchmarks.common import bench_logger, timed
+from src.data_collection.data_structures import VideoData
+
+METADATA_UPDATES = 20000
+
+
+def write_to_sql(logger, tmp_dir, df) -> float:
+    conn = sqlite3.connect(os.path.join(tmp_dir, 'to_sql.db'))
+    _, elapsed = timed(lambda: (df.to_sql('AAA', conn, index=False, if_exists='replace'), conn.commit()))
+    conn.close()
+    return elapsed
+
+
+def write_astro_db(logger, tmp_dir, df, normalized: bool) -> float:
+    db = AstroDB(logger, os.path.join(tmp_dir, f'astro_{normalized}.db'), normalized=normalized)
+    video_data = VideoData(video_id='benchmark', channel_id='channel', channel_title='channel')
+
+    _, elapsed = timed(db.insert_comment_dataframe, video_data, df)
+    db.get_db_conn().close()
+    return elapsed
+
+
+def update_metadata(conn, parameterized: bool):
+    cursor = conn.cursor()
+    with conn:
+        for i in range(METADATA_UPDATES):
+            video_id = f'video{i % 1000}'
+            if parameterized:
+                cursor.execute("UPDATE Videos SET views=?, likes=? WHERE video_id=?", (i, i // 10, video_id))
+            else:
+                cursor.execute(f"UPDATE Videos SET views={i}, likes={i // 10} WHERE video_id='{video_id}'")
+
+
+def run(comment_counts):
+    logger = bench_logger()
+
+    print(f'{"writer":<24} {"comments":>10} {"seconds":>10} {"rows/s":>12}')
+    for count in comment_counts:
+        df = comment_dataframe(0, count)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            for name, write in [('to_sql', lambda: write_to_sql(logger, tmp_dir, df)),
+                                ('executemany, per-video', lambda: write_astro_db(logger, tmp_dir, df, False)),
+                                ('executemany, normalized', lambda: write_astro_db(logger, tmp_dir, df, True))]:
+                elapsed = write()
+                print(f'{name:<24} {count:>10} {elapsed:>10.3f} {count / elapsed:>12.0f}')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = AstroDB(logger, os.path.join(tmp_dir, 'metadata.db'))
+        for i in range(1000):
+            db.cursor.execute("INSERT INTO Videos (video_id, comment_table) VALUES (?, ?)", (f'video{i}', 'AAA'))
+        db.conn.commit()
+
+        print(f'\n{"metadata update":<24} {"updates":>10} {"seconds":>10} {"updates/s":>12}')
+        for name, parameterized in [('literal SQL', False), ('parameterized', True)]:
+            _, elapsed = timed(update_metadata, db.conn, parameterized)
+            print(f'{name:<24} {METADATA_UPDATES:>10} {elapsed:>10.3f} {METADATA_UPDATES / elapsed:>12.0f}')
+
+        db.conn.close()
+
+
+if __name__ == '__main__':
+    counts = [int(arg) for arg in sys.argv[1:]] or [10000, 100000]
+    run(counts)
@@ -0,0 +1,60 @@
+"""
+Benchmark for re-collecting a video whose comments mostly haven't changed. A
+video with N stored comments is re-collected with 1% of its comments edited
+and 1% new ones, for both database schemas. Reports the time to copy the
+stored sentiment of the unchanged comments and how many comments are left to
+score, then the time of the merge and the number of rows it rewrote.
+
+Usage: python -m src.benchmarks.bench_edits [comment counts...]
+"""
+import os
+import sys
+import tempfile
+
+from src.astro_db import AstroDB
+from src.benchmarks.bench_merge import comment_dataframe
+from src.benchmarks.common import bench_logger, timed
+from src.data_collection.data_structures import VideoData
+
+
+def recollect(logger, normalized: bool, count: int) -> tuple:
+    """
+    Store `count` comments, then re-collect them with 1% edited and 1% new.
+    Returns the sentiment lookup time, the comments left to score, the merge
+    time and the number of rewritten comments.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = AstroDB(logger, os.path.join(tmp_dir, 'bench.db'), normalized=normalized, profile='fast')
+        video_data = VideoData(video_id='benchmark', channel_id='channel', channel_title='channel')
+        db.insert_comment_dataframe(video_data, comment_dataframe(0, count))
+
+        churn = max(1, count // 100)
+        fresh = comment_dataframe(0, count + churn).drop(columns=['PSentiment', 'NSentiment'])
+        fresh.loc[fresh.index % 100 == 1, 'comment'] += ' (edited)'
+
+        unscored, lookup_time = timed(db.copy_stored_sentiment, video_data.video_id, fresh)
+        fresh.loc[unscored, ['PSentiment', 'NSentiment']] = 0.5
+
+        _, merge_time = timed(db.insert_comment_dataframe, video_data, fresh)
+        rewritten = len(db.get_comment_edits(video_data.video_id))
+
+        db.get_db_conn().close()
+
+    return lookup_time, unscored.sum(), merge_time, rewritten
+
+
+def run(comment_counts):
+    logger = bench_logger()
+
+    print(f'{"schema":>10} {"comments":>10} {"lookup s":>10} {"to score":>10} {"merge s":>10} {"rewritten":>10}')
+    for normalized in [False, True]:
+        for count in comment_counts:
+            lookup_time, unscored, merge_time, rewritten = recollect(logger, normalized, count)
+
+            schema = 'normalized' if normalized else 'per-video'
+            print(f'{schema:>10} {count:>10} {lookup_time:>10.3f} {unscored:>10} {merge_time:>10.3f} {rewritten:>10}')
+
+
+if __name__ == '__main__':
+    counts = [int(arg) for arg in sys.argv[1:]] or [10000, 100000]
+    run(counts)
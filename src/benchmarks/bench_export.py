@@ -0,0 +1,88 @@
+"""
+Benchmark for the columnar export. Stores `comments` comments spread over
+`videos` videos of 10 channels in a normalized database, exports them to
+Parquet and to Arrow, then times two analytic scans against each store:
+loading two columns of every comment into a dataframe, and averaging the
+sentiment of every video. SQLite is queried with `pd.read_sql`, as analysts
+did before. Needs pyarrow.
+
+Usage: python -m src.benchmarks.bench_export [comments] [videos]
+"""
+import os
+import sys
+import tempfile
+
+import pandas as pd
+
+from src.astro_db import AstroDB
+from src.benchmarks.bench_merge import comment_dataframe
+from src.benchmarks.common import bench_logger, timed
+from src.data_collection.data_structures import VideoData
+from src.export import CommentExporter, read_export
+
+SCAN_COLUMNS = ['user', 'PSentiment']
+
+
+def build_database(logger, db_file, comment_count: int, video_count: int) -> AstroDB:
+    db = AstroDB(logger, db_file, normalized=True, profile='fast')
+    per_video = comment_count // video_count
+    for i in range(video_count):
+        video_data = VideoData(video_id=f'video{i}', channel_id=f'channel{i % 10}', channel_title=f'channel {i % 10}')
+        db.insert_comment_dataframe(video_data, comment_dataframe(i * per_video, (i + 1) * per_video))
+
+    return db
+
+
+def scan_sqlite(db):
+    return pd.read_sql(f"SELECT {', '.join(SCAN_COLUMNS)} FROM Comments", db.get_db_conn())
+
+
+def aggregate_sqlite(db):
+    return pd.read_sql("SELECT video_id, AVG(PSentiment) FROM Comments GROUP BY video_id", db.get_db_conn())
+
+
+def scan_export(export_dir):
+    return read_export(export_dir, columns=SCAN_COLUMNS).to_pandas()
+
+
+def aggregate_export(export_dir):
+    return read_export(export_dir, columns=['video_id', 'PSentiment']).group_by('video_id').aggregate(
+        [('PSentiment', 'mean')])
+
+
+def directory_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def run(comment_count, video_count):
+    logger = bench_logger()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = os.path.join(tmp_dir, 'bench.db')
+        db = build_database(logger, db_file, comment_count, video_count)
+
+        print(f'{comment_count} comments of {video_count} videos')
+        print(f'{"store":<10} {"export s":>10} {"MiB":>8} {"scan s":>10} {"aggregate s":>12}')
+
+        _, scan_time = timed(scan_sqlite, db)
+        _, aggregate_time = timed(aggregate_sqlite, db)
+        print(f'{"sqlite":<10} {"":>10} {os.path.getsize(db_file) / 2**20:>8.1f} {scan_time:>10.3f} ' +
+              f'{aggregate_time:>12.3f}')
+
+        for export_format in ['parquet', 'arrow']:
+            export_dir = os.path.join(tmp_dir, export_format)
+            exporter = CommentExporter(logger, db, export_dir, export_format, batch_size=1000000)
+            _, export_time = timed(exporter.export)
+
+            _, scan_time = timed(scan_export, export_dir)
+            _, aggregate_time = timed(aggregate_export, export_dir)
+            print(f'{export_format:<10} {export_time:>10.3f} {directory_size(export_dir) / 2**20:>8.1f} ' +
+                  f'{scan_time:>10.3f} {aggregate_time:>12.3f}')
+
+        db.get_db_conn().close()
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    defaults = [1000000, 100]
+    run(*(args + defaults[len(args):]))
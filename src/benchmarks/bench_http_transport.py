@@ -0,0 +1,74 @@
+"""
+Benchmark for the HTTP transport. Fetches `pages` API responses for each of
+`videos` videos on `workers` threads from a local mock API server, which spends
+`handshake_ms` on every new connection to emulate a TLS handshake. Compares
+httplib2 with a new connection object per video or per thread against a single
+pooled session shared by every thread, reporting the wall time and the number
+of connections the server accepted.
+
+Usage: python -m src.benchmarks.bench_http_transport [videos] [pages] [workers] [handshake_ms]
+"""
+import sys
+import threading
+import time
+
+import httplib2
+
+from concurrent.futures import ThreadPoolExecutor
+
+from src.benchmarks.common import synthetic_comment_pages
+from src.data_collection.http_transport import PooledHttp
+from src.tests.astro_mocks import MockAPIServer
+
+
+def fetch_video(get_http, url: str, pages: int):
+    http = get_http()
+    for _ in range(pages):
+        response, _ = http.request(url)
+        assert response.status == 200
+
+
+def run_transport(name: str, get_http, server: MockAPIServer, videos: int, pages: int, workers: int):
+    server.connection_count = 0
+    url = server.url + 'youtube/v3/commentThreads'
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in [executor.submit(fetch_video, get_http, url, pages) for _ in range(videos)]:
+            future.result()
+    elapsed = time.perf_counter() - start
+
+    print(f'{name:<28} {videos * pages:>10} {server.connection_count:>12} {elapsed:>10.3f}')
+
+
+def run(videos, pages, workers, handshake_ms):
+    page = synthetic_comment_pages(1)[0]
+    server = MockAPIServer({'commentThreads': page}, handshake_delay=handshake_ms / 1000)
+    server.start()
+
+    thread_data = threading.local()
+
+    def http_per_thread():
+        if not hasattr(thread_data, 'http'):
+            thread_data.http = httplib2.Http()
+        return thread_data.http
+
+    pooled = PooledHttp(pool_size=workers)
+
+    print(f'{"transport":<28} {"requests":>10} {"connections":>12} {"seconds":>10}')
+    run_transport('httplib2, Http per video', httplib2.Http, server, videos, pages, workers)
+    run_transport('httplib2, Http per thread', http_per_thread, server, videos, pages, workers)
+    run_transport('pooled, shared session', lambda: pooled, server, videos, pages, workers)
+
+    stats = pooled.stats()
+    print(f'pooled: {stats["reused"]} reused connections, mean latency {stats["mean_latency"] * 1000:.2f}ms, ' +
+          f'max {stats["max_latency"] * 1000:.2f}ms')
+
+    pooled.close()
+    server.stop()
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    defaults = [40, 5, 4, 20]
+    run(*(args + defaults[len(args):]))
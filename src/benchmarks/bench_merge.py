@@ -0,0 +1,75 @@
+"""
+Benchmark for merging freshly collected comments into the local database.
+A video with N stored comments is re-collected with 1% of its comments hidden
+and 1% new ones added, and the time and peak python memory of the merge are
+reported for both database schemas.
+
+Usage: python -m src.benchmarks.bench_merge [comment counts...]
+"""
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from src.astro_db import AstroDB
+from src.benchmarks.common import bench_logger, timed
+from src.data_collection.data_structures import CommentAccumulator, VideoData
+
+
+def comment_dataframe(first: int, last: int):
+    comments = CommentAccumulator()
+    for i in range(first, last):
+        comments.append(f'comment{i:09d}', f'synthetic comment {i}', f'@user{i % 1000}',
+                        f'2024-01-01T00:00:{i % 60:02d}Z')
+
+    df = comments.to_dataframe()
+    df['PSentiment'] = 0.25
+    df['NSentiment'] = 0.125
+    return df
+
+
+def merge(logger, normalized: bool, count: int, trace_memory=False) -> tuple:
+    """
+    Store `count` comments, then time the merge of a re-collection. Returns the
+    merge time and, if requested, the peak python memory of the merge.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = AstroDB(logger, os.path.join(tmp_dir, 'bench.db'), normalized=normalized)
+        video_data = VideoData(video_id='benchmark', channel_id='channel', channel_title='channel')
+        db.insert_comment_dataframe(video_data, comment_dataframe(0, count))
+
+        # 1% of the stored comments disappear, 1% new comments show up
+        churn = max(1, count // 100)
+        fresh = comment_dataframe(churn, count + churn)
+
+        if trace_memory:
+            tracemalloc.start()
+
+        _, elapsed = timed(db.insert_comment_dataframe, video_data, fresh)
+
+        peak = 0
+        if trace_memory:
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        db.get_db_conn().close()
+
+    return elapsed, peak
+
+
+def run(comment_counts):
+    logger = bench_logger()
+
+    print(f'{"schema":>10} {"comments":>10} {"seconds":>10} {"peak MiB":>10}')
+    for normalized in [False, True]:
+        for count in comment_counts:
+            elapsed, _ = merge(logger, normalized, count)
+            _, peak = merge(logger, normalized, count, trace_memory=True)  # tracing slows the merge down
+
+            schema = 'normalized' if normalized else 'per-video'
+            print(f'{schema:>10} {count:>10} {elapsed:>10.3f} {peak / 2**20:>10.1f}')
+
+
+if __name__ == '__main__':
+    counts = [int(arg) for arg in sys.argv[1:]] or [10000, 100000]
+    run(counts)
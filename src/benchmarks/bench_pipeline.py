@@ -0,0 +1,96 @@
+"""
+Benchmark for the streaming comment pipeline. Collects a synthetic video of
+`pages` comment pages, where every API request takes `latency_ms` and scoring
+costs `score_us` of CPU time per comment, into a fresh database. Compares the
+phased collection (download everything, score everything, then store
+everything) against the streaming pipeline, reporting the wall time and the
+peak python memory of each.
+
+Usage: python -m src.benchmarks.bench_pipeline [pages] [latency_ms] [score_us]
+"""
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import googleapiclient.http
+
+from src.astro_db import AstroDB
+from src.benchmarks.common import bench_logger, synthetic_comment_pages, timed
+from src.data_collection.data_structures import VideoData
+from src.data_collection.yt_data_api import YouTubeDataAPI
+from src.pipeline import CommentPipeline
+
+
+def slow_responses(pages: list, latency: float):
+    responses = iter(pages)
+
+    def execute(request, *args, **kwargs):
+        time.sleep(latency)
+        return next(responses)
+
+    return execute
+
+
+def synthetic_scorer(cost: float):
+    def score(df):
+        # busy loop standing in for tokenizing and tagging the comments
+        deadline = time.perf_counter() + cost * len(df.index)
+        while time.perf_counter() < deadline:
+            pass
+
+        df['PSentiment'] = 0.25
+        df['NSentiment'] = 0.125
+
+    return score
+
+
+def collect_phased(youtube, db, score, video_data):
+    df = youtube.get_comments(video_data)
+    score(df)
+    db.insert_comment_dataframe(video_data, df)
+
+
+def collect_streaming(youtube, db, score, video_data):
+    def store(df, next_page_token, page_count):
+        db.store_comment_batch(video_data, df, next_page_token, page_count)
+
+    CommentPipeline(youtube.logger, score, store).run(youtube.get_comment_batches(video_data, pages_per_batch=1))
+    db.finish_comment_collection(video_data, detect_hidden=True)
+
+
+def run_collection(name, collect, logger, pages, latency, score_cost):
+    video_data = VideoData(video_id='benchmark', channel_id='channel', channel_title='channel',
+                           comment_count=len(pages) * 200)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = AstroDB(logger, os.path.join(tmp_dir, 'bench.db'))
+        youtube = YouTubeDataAPI(logger, 'benchmark', show_progress=False)
+        googleapiclient.http.HttpRequest.execute = slow_responses(pages, latency)
+
+        tracemalloc.start()
+        _, elapsed = timed(collect, youtube, db, synthetic_scorer(score_cost), video_data)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        db.get_db_conn().close()
+
+    print(f'{name:<12} {elapsed:>10.3f} {peak / 2**20:>10.1f}')
+
+
+def run(page_count, latency_ms, score_us):
+    logger = bench_logger()
+    pages = synthetic_comment_pages(page_count)
+
+    print(f'{page_count} pages of {len(pages[0]["items"]) * 2} comments, {latency_ms}ms per request, ' +
+          f'{score_us}us scoring per comment')
+    print(f'{"collection":<12} {"seconds":>10} {"peak MiB":>10}')
+    for name, collect in [('phased', collect_phased), ('streaming', collect_streaming)]:
+        run_collection(name, collect, logger, pages, latency_ms / 1000, score_us / 10**6)
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    defaults = [200, 50, 200]
+    run(*(args + defaults[len(args):]))
@@ -0,0 +1,53 @@
+"""
+Benchmark for reply expansion. Collects a video of `pages` comment pages whose
+threads each have `replies` replies, of which the API only returns 5 inline,
+from a local mock API server answering every request after `latency_ms`.
+Compares collection without expansion, with the replies of each page's threads
+requested one at a time, and with them requested on several threads at once.
+
+Usage: python -m src.benchmarks.bench_reply_expansion [pages] [replies] [latency_ms]
+"""
+import sys
+
+from src.benchmarks.common import bench_logger, synthetic_comment_pages, synthetic_reply_pages, timed
+from src.data_collection.data_structures import VideoData
+from src.data_collection.http_transport import PooledHttp
+from src.data_collection.youtube_client import YouTubeClientFactory
+from src.data_collection.yt_data_api import YouTubeDataAPI
+from src.tests.astro_mocks import MockAPIServer
+
+
+def run(page_count, reply_count, latency_ms):
+    logger = bench_logger()
+
+    pages = synthetic_comment_pages(page_count, threads_per_page=20, reply_count=reply_count, inline_reply_limit=5)
+    responses = {'commentThreads': pages}
+    for page in pages:
+        for item in page['items']:
+            responses[f'comments/{item["id"]}'] = synthetic_reply_pages(item['id'], reply_count)
+
+    server = MockAPIServer(responses, latency=latency_ms / 1000)
+    server.start()
+    http = PooledHttp(pool_size=16)
+    factory = YouTubeClientFactory('benchmark', http=http, api_endpoint=server.url)
+
+    print(f'{page_count} pages of 20 threads with {reply_count} replies, {latency_ms}ms per request')
+    print(f'{"expansion":<22} {"comments":>10} {"requests":>10} {"seconds":>10}')
+    for name, expand_replies, reply_workers in [('none', False, 1), ('sequential', True, 1), ('parallel, 4 workers', True, 4),
+                                                ('parallel, 16 workers', True, 16)]:
+        server.request_count = 0
+        youtube = YouTubeDataAPI(logger, 'benchmark', show_progress=False, client_factory=factory,
+                                 expand_replies=expand_replies, reply_workers=reply_workers)
+
+        video_data = VideoData(video_id='benchmark', comment_count=page_count * 20 * (reply_count + 1))
+        df, elapsed = timed(youtube.get_comments, video_data)
+        print(f'{name:<22} {len(df.index):>10} {server.request_count:>10} {elapsed:>10.3f}')
+
+    http.close()
+    server.stop()
+
+
+if __name__ == '__main__':
+    args = [int(arg) for arg in sys.argv[1:]]
+    defaults = [3, 30, 30]
+    run(*(args + defaults[len(args):]))
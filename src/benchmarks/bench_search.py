@@ -0,0 +1,90 @@
+"""
+Benchmark for comment search. Stores `comments` comments spread over 100
+videos in per-video tables, then reports the time to build the search index,
+the cost it adds to storing the comments of another video, and the latency of
+queries through the index against a `LIKE` scan of every comment table.
+
+Queries look for a word used by one comment, a word used by 1% of them, and a
+word used by every comment: ranking has to score every match, so the last one
+is the slowest.
+
+Usage: python -m src.benchmarks.bench_search [comments]
+"""
+import os
+import sys
+import tempfile
+
+from src.astro_db import AstroDB
+from src.benchmarks.bench_merge import comment_dataframe
+from src.benchmarks.common import bench_logger, timed
+from src.data_collection.data_structures import VideoData
+
+VIDEO_COUNT = 100
+
+# query: the comments it matches, as a function of the comment count
+QUERIES = {'rare': lambda count: 1, 'uncommon': lambda count: count // 100, 'synthetic': lambda count: count}
+
+
+def video(i: int) -> VideoData:
+    return VideoData(video_id=f'video{i}', channel_id=f'channel{i % 10}', channel_title=f'channel {i % 10}')
+
+
+def comments(first: int, last: int):
+    df = comment_dataframe(first, last)
+    df.loc[df.index % 100 == 0, 'comment'] += ' uncommon'
+    if first == 0:
+        df.loc[0, 'comment'] += ' rare'
+
+    return df
+
+
+def build_database(logger, db_file: str, count: int) -> AstroDB:
+    db = AstroDB(logger, db_file, profile='fast')
+    per_video = count // VIDEO_COUNT
+    for i in range(VIDEO_COUNT):
+        db.insert_comment_dataframe(video(i), comments(i * per_video, (i + 1) * per_video))
+
+    return db
+
+
+def like_scan(db, word: str) -> list:
+    db.cursor.execute("SELECT comment_table FROM Videos")
+    matches = []
+    for (comment_table,) in db.cursor.fetchall():
+        db.cursor.execute(f"SELECT comment_id FROM {comment_table} WHERE comment LIKE ?", (f'%{word}%',))
+        matches.extend(db.cursor.fetchall())
+
+    return matches[:20]
+
+
+def store_video(db, i: int, count: int):
+    """
+    Store the comments of an extra video, the `i`th past the initial ones.
+    """
+    first = count + i * (count // VIDEO_COUNT)
+    db.insert_comment_dataframe(video(VIDEO_COUNT + i), comments(first, first + count // VIDEO_COUNT))
+
+
+def run(count):
+    logger = bench_logger()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = build_database(logger, os.path.join(tmp_dir, 'bench.db'), count)
+        _, store_time = timed(store_video, db, 0, count)
+        indexed, index_time = timed(db.create_search_index)
+        _, indexed_store_time = timed(store_video, db, 1, count)
+
+        print(f'{count} comments of {VIDEO_COUNT} videos: index built in {index_time:.2f}s ({indexed} comments)')
+        print(f'storing {count // VIDEO_COUNT} comments: {store_time * 1000:.1f}ms without the index, ' +
+              f'{indexed_store_time * 1000:.1f}ms with it')
+        print(f'{"query":<12} {"matches":>10} {"LIKE ms":>10} {"index ms":>10}')
+        for word, matches in QUERIES.items():
+            _, like_time = timed(like_scan, db, word)
+            _, search_time = timed(db.search_comments, f'"{word}"')
+            print(f'{word:<12} {matches(count):>10} {like_time * 1000:>10.1f} {search_time * 1000:>10.1f}')
+
+        db.get_db_conn().close()
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
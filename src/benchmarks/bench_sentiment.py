@@ -0,0 +1,57 @@
+"""
+Benchmark for adding sentiment scores to a comment dataframe. Compares the
+previous row-by-row approach (`df.iterrows()` with two `df.loc` writes per
+comment) against the batch scoring API on synthetic comments.
+
+With --overhead-only, `get_sentiment` is replaced by a constant function so
+that only the dataframe handling is measured. This mode does not need the nltk
+data packages.
+
+Usage: python -m src.benchmarks.bench_sentiment [--overhead-only] [comment count]
+"""
+import sys
+
+from src.benchmarks.common import bench_logger, timed
+from src.benchmarks.bench_merge import comment_dataframe
+from src.data_collection.sentiment import SentimentAnalysis
+
+
+def add_sentiment_row_by_row(sa, df):
+    """
+    The per-row implementation which `add_sentiment_to_dataframe` replaced.
+    """
+    df['PSentiment'] = ''
+    df['NSentiment'] = ''
+
+    for index, row in df.iterrows():
+        sentiment = sa.get_sentiment(row['comment'])
+        df.loc[index, 'PSentiment'] = sentiment[0]
+        df.loc[index, 'NSentiment'] = sentiment[1]
+
+
+def run(comment_count: int, overhead_only: bool):
+    logger = bench_logger()
+
+    if overhead_only:
+        SentimentAnalysis.nltk_init = lambda self: None
+        SentimentAnalysis.get_sentiment = lambda self, comment: (0.25, 0.125, 0.625)
+
+    sa = SentimentAnalysis(logger)
+
+    row_df = comment_dataframe(0, comment_count).drop(columns=['PSentiment', 'NSentiment'])
+    batch_df = row_df.copy()
+
+    _, row_elapsed = timed(add_sentiment_row_by_row, sa, row_df)
+    _, batch_elapsed = timed(sa.add_sentiment_to_dataframe, batch_df)
+
+    assert row_df['PSentiment'].astype(float).equals(batch_df['PSentiment'])
+    assert row_df['NSentiment'].astype(float).equals(batch_df['NSentiment'])
+
+    print(f'{"method":>12} {"comments":>10} {"seconds":>10} {"comments/s":>12}')
+    for method, elapsed in [('row-by-row', row_elapsed), ('batch', batch_elapsed)]:
+        print(f'{method:>12} {comment_count:>10} {elapsed:>10.3f} {comment_count / elapsed:>12.0f}')
+
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if arg != '--overhead-only']
+    run(int(args[0]) if args else 100000, '--overhead-only' in sys.argv)
@@ -0,0 +1,72 @@
+"""
+Benchmark for CLI cold start. Each scenario runs in a fresh interpreter under
+`python -X importtime`, reporting the median wall time and the slowest imports
+by cumulative time. Scenarios which never collect comments (e.g. `--help`)
+should not import pandas, nltk or googleapiclient at all.
+
+Usage: python -m src.benchmarks.bench_startup [runs]
+"""
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    # CLI help output
+    'help': ['astro.py', '--help'],
+    # modules loaded before the first API request of a single video collection
+    'collect_video': ['-c', 'import astro; from data_collection.yt_data_api import YouTubeDataAPI; '
+                            'from astro_db import AstroDB; YouTubeDataAPI(None, "bench_apikey")'],
+    # modules loaded before the first API request of a batch collection
+    'collect_batch': ['-c', 'import astro; import batch; from astro_db import AstroDB'],
+}
+
+HEAVY_MODULES = ['pandas', 'nltk', 'googleapiclient.discovery', 'numpy']
+
+
+def parse_importtime(output: str) -> dict:
+    """
+    Map each imported module to its cumulative import time in microseconds.
+    """
+    imports = {}
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        _, cumulative, module = line[len('import time:'):].split('|')
+        imports[module.strip()] = int(cumulative)
+
+    return imports
+
+
+def run_scenario(args: list, runs: int) -> tuple:
+    """
+    Run a scenario `runs` times, returning the median wall time and the
+    import times of the last run.
+    """
+    wall_times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime'] + args, cwd=SRC_DIR,
+                                capture_output=True, text=True, check=True)
+        wall_times.append(time.perf_counter() - start)
+
+    return statistics.median(wall_times), parse_importtime(result.stderr)
+
+
+def run(runs):
+    for name, args in SCENARIOS.items():
+        wall_time, imports = run_scenario(args, runs)
+        heavy = [module for module in HEAVY_MODULES if module in imports]
+
+        print(f'{name}: {wall_time * 1000:.0f} ms median wall time over {runs} runs')
+        print(f'  heavy modules imported: {", ".join(heavy) if heavy else "none"}')
+        for module, cumulative in sorted(imports.items(), key=lambda item: item[1], reverse=True)[:5]:
+            print(f'  {cumulative / 1000:>8.1f} ms  {module}')
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,58 @@
+"""
+Benchmark for the database storage profiles. For each profile, times three
+workloads on a fresh database file: inserting the comments of a new video in
+one transaction, merging a re-collection of it with 1% of its comments hidden
+and 1% new, and storing a collection page by page (one transaction per page of
+100 comments, as streamed collections do).
+
+Usage: python -m src.benchmarks.bench_storage [comment count]
+"""
+import os
+import sys
+import tempfile
+
+from src.astro_db import AstroDB, STORAGE_PROFILES
+from src.benchmarks.bench_merge import comment_dataframe
+from src.benchmarks.common import bench_logger, timed
+from src.data_collection.data_structures import VideoData
+
+PAGE_SIZE = 100
+
+
+def store_pages(db, video_data, df):
+    for first in range(0, len(df.index), PAGE_SIZE):
+        db.store_comment_batch(video_data, df.iloc[first:first + PAGE_SIZE], f'page{first}', first // PAGE_SIZE)
+
+    db.finish_comment_collection(video_data, detect_hidden=True)
+
+
+def run_profile(logger, profile: str, count: int):
+    churn = max(1, count // 100)
+    collected = comment_dataframe(0, count)
+    recollected = comment_dataframe(churn, count + churn)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = AstroDB(logger, os.path.join(tmp_dir, 'bench.db'), profile=profile)
+        video_data = VideoData(video_id='benchmark', channel_id='channel', channel_title='channel')
+        paged_video_data = VideoData(video_id='paged', channel_id='channel', channel_title='channel')
+
+        _, insert_time = timed(db.insert_comment_dataframe, video_data, collected)
+        _, merge_time = timed(db.insert_comment_dataframe, video_data, recollected)
+        _, paged_time = timed(store_pages, db, paged_video_data, collected)
+
+        db.get_db_conn().close()
+
+    print(f'{profile:<10} {count / insert_time:>14.0f} {count / merge_time:>14.0f} {count / paged_time:>14.0f}')
+
+
+def run(count):
+    logger = bench_logger()
+
+    print(f'{count} comments, rows/s per workload')
+    print(f'{"profile":<10} {"insert":>14} {"merge":>14} {"paged":>14}')
+    for profile in STORAGE_PROFILES:
+        run_profile(logger, profile, count)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 50000)
@@ -0,0 +1,106 @@
+"""
+Shared helpers for Astro benchmarks. The benchmarks are standalone scripts
+(run with `python -m src.benchmarks.<name>` from the project root) and are not
+collected by pytest.
+"""
+import logging
+import time
+
+from src.log import AstroLogger
+from src.theme import AstroTheme
+
+
+def bench_logger(log_level='error', log_file='astro_bench_log.txt'):
+    """
+    Create an AstroLogger which keeps benchmark output off the console.
+    """
+    logging.setLoggerClass(AstroLogger)
+    logger = logging.getLogger('astro_bench')
+    logger.astro_config(log_level, AstroTheme(), log_file=log_file)
+    return logger
+
+
+def synthetic_reply(thread_id: str, reply_index: int, published: str) -> dict:
+    return {
+        'id': f'{thread_id}.Reply{reply_index:04d}',
+        'snippet': {
+            'textDisplay': f'reply {reply_index} to comment {thread_id}',
+            'authorDisplayName': f'@replier{reply_index}',
+            'parentId': thread_id,
+            'publishedAt': published}}
+
+
+def synthetic_comment_thread(thread_index: int, reply_count=1, inline_reply_limit=None) -> dict:
+    """
+    Build a single `commentThreads` item with the given number of replies. Like
+    the API, only the first `inline_reply_limit` replies are included inline.
+    """
+    thread_id = f'UgThread{thread_index:012d}'
+    published = f'2024-01-01T00:{(thread_index // 60) % 60:02d}:{thread_index % 60:02d}Z'
+
+    inline_count = reply_count if inline_reply_limit is None else min(reply_count, inline_reply_limit)
+    replies = [synthetic_reply(thread_id, reply_index, published) for reply_index in range(inline_count)]
+
+    item = {
+        'id': thread_id,
+        'snippet': {
+            'totalReplyCount': reply_count,
+            'topLevelComment': {
+                'id': thread_id,
+                'snippet': {
+                    'textDisplay': f'this is synthetic comment number {thread_index}',
+                    'authorDisplayName': f'@user{thread_index % 1000}',
+                    'publishedAt': published}}}}
+
+    if replies:
+        item['replies'] = {'comments': replies}
+
+    return item
+
+
+def synthetic_comment_pages(page_count: int, threads_per_page=100, reply_count=1, inline_reply_limit=None) -> list:
+    """
+    Build a list of `commentThreads` API responses chained by `nextPageToken`.
+    """
+    pages = []
+    for page_index in range(page_count):
+        first_thread = page_index * threads_per_page
+        page = {
+            'kind': 'youtube#commentThreadListResponse',
+            'items': [synthetic_comment_thread(first_thread + i, reply_count, inline_reply_limit)
+                      for i in range(threads_per_page)]}
+
+        if page_index < page_count - 1:
+            page['nextPageToken'] = f'page{page_index + 1}'
+
+        pages.append(page)
+
+    return pages
+
+
+def synthetic_reply_pages(thread_id: str, reply_count: int, replies_per_page=100) -> list:
+    """
+    Build the list of `comments` API responses holding every reply of a thread.
+    """
+    pages = []
+    for first_reply in range(0, max(reply_count, 1), replies_per_page):
+        last_reply = min(first_reply + replies_per_page, reply_count)
+        page = {
+            'kind': 'youtube#commentListResponse',
+            'items': [synthetic_reply(thread_id, i, '2024-01-01T00:00:00Z') for i in range(first_reply, last_reply)]}
+
+        if last_reply < reply_count:
+            page['nextPageToken'] = f'{thread_id}.page{last_reply // replies_per_page}'
+
+        pages.append(page)
+
+    return pages
+
+
+def timed(func, *args, **kwargs):
+    """
+    Run `func` once, returning a tuple of (result, elapsed seconds).
+    """
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
@@ -0,0 +1,268 @@
+"""
+Asynchronous comment collection from the YouTube Data API.
+
+`YouTubeDataAPI` sends one blocking request at a time per thread, so collecting
+many videos is bound by request latency. `AsyncYouTubeDataAPI` requests the
+same Data API endpoints over aiohttp, keeping the requests of many videos in
+flight on a single event loop. The number of requests in flight is limited per
+video and across the whole run. Responses are parsed by the same functions as
+`YouTubeDataAPI`, and requests go through the same `RequestExecutor`, so
+retries, rate limiting and the quota budget behave the same way.
+
+aiohttp is an optional dependency, installed with `pip install .[async]`.
+"""
+import asyncio
+import json
+import threading
+import traceback
+import urllib.parse
+
+from typing import TYPE_CHECKING
+from src.data_collection.data_structures import CommentAccumulator
+from src.data_collection.request_executor import RequestExecutor
+from src.data_collection.yt_data_api import (parse_comment_thread_page, parse_replies, reached_high_water_mark,
+                                             truncated_threads)
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+API_ENDPOINT = 'https://youtube.googleapis.com/'
+
+
+def import_aiohttp():
+    try:
+        import aiohttp
+    except ImportError:
+        raise ImportError("The async fetcher requires aiohttp, install it with 'pip install .[async]'") from None
+
+    return aiohttp
+
+
+class AsyncRequest:
+    """
+    A single Data API GET request, with the `methodId` and `execute` interface
+    of googleapiclient requests that `RequestExecutor` relies on.
+    """
+    def __init__(self, session, url: str, params: dict, method_id: str, limits: list):
+        self.session = session
+        self.url = url
+        self.params = params
+        self.methodId = method_id
+        self.limits = limits
+
+    async def execute(self) -> dict:
+        """
+        Send the request, holding every semaphore in `limits` while it is in
+        flight. Error responses raise googleapiclient's HttpError, and
+        connection failures raise ConnectionError, so the executor classifies
+        them exactly like failures of the blocking client.
+        """
+        import httplib2
+        from googleapiclient.errors import HttpError
+
+        aiohttp = import_aiohttp()
+
+        for limit in self.limits:
+            await limit.acquire()
+
+        try:
+            async with self.session.get(self.url, params=self.params) as response:
+                content = await response.read()
+                headers = {key.lower(): value for key, value in response.headers.items()}
+
+        except aiohttp.ClientError as e:
+            raise ConnectionError(f'{type(e).__name__}: {e}') from e
+
+        finally:
+            for limit in reversed(self.limits):
+                limit.release()
+
+        if response.status >= 400:
+            headers['status'] = str(response.status)
+            raise HttpError(httplib2.Response(headers), content, uri=self.url)
+
+        return json.loads(content)
+
+
+class AsyncYouTubeDataAPI:
+    logger = None
+    api_key = None
+    log_json = False
+    max_concurrency = 20
+    video_concurrency = 2
+    expand_replies = True
+
+    def __init__(self, logger, api_key, max_concurrency=20, video_concurrency=2, log_json=False, executor=None,
+                 api_endpoint=API_ENDPOINT, timeout=60, expand_replies=True):
+        """
+        At most `max_concurrency` requests are in flight at once, and at most
+        `video_concurrency` of them for any single video. The session and the
+        limits belong to the event loop the first request is made on. See
+        `YouTubeDataAPI` for `expand_replies`.
+        """
+        if max_concurrency < 1 or video_concurrency < 1:
+            raise ValueError(f'Invalid concurrency limits: {max_concurrency} overall, {video_concurrency} per video')
+
+        import_aiohttp()
+
+        self.logger = logger
+        self.api_key = api_key
+        self.max_concurrency = max_concurrency
+        self.video_concurrency = video_concurrency
+        self.log_json = log_json
+        self.executor = executor if executor else RequestExecutor(logger)
+        self.api_endpoint = api_endpoint
+        self.timeout = timeout
+        self.expand_replies = expand_replies
+        self.__session = None
+        self.__global_limit = None
+        self.__video_limits = {}
+
+    def __get_session(self):
+        if self.__session is None:
+            aiohttp = import_aiohttp()
+
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self.__session = aiohttp.ClientSession(connector=connector,
+                                                   timeout=aiohttp.ClientTimeout(total=self.timeout))
+            self.__global_limit = asyncio.Semaphore(self.max_concurrency)
+
+        return self.__session
+
+    def __get_video_limit(self, video_id: str) -> asyncio.Semaphore:
+        limit = self.__video_limits.get(video_id)
+        if limit is None:
+            limit = asyncio.Semaphore(self.video_concurrency)
+            self.__video_limits[video_id] = limit
+
+        return limit
+
+    async def request(self, resource: str, method_id: str, video_id: str, **params) -> dict:
+        """
+        Request a Data API resource (e.g. 'commentThreads') on behalf of the
+        given video, counting against both concurrency limits.
+        """
+        session = self.__get_session()
+        url = urllib.parse.urljoin(self.api_endpoint, f'youtube/v3/{resource}')
+        params = {key: value for key, value in params.items() if value not in (None, '')}
+        params['key'] = self.api_key
+
+        request = AsyncRequest(session, url, params, method_id, [self.__global_limit, self.__get_video_limit(video_id)])
+        response = await self.executor.execute_async(request)
+
+        if self.log_json:
+            with self.logger.log_file_only():
+                self.logger.info(json.dumps(response, indent=4))
+
+        return response
+
+    async def get_replies(self, video_id: str, thread_id: str) -> list:
+        """
+        Request every reply of a comment thread of the given video, returning
+        the list of reply comment resources.
+        """
+        replies = []
+        page_token = ''
+
+        while page_token is not None:
+            response = await self.request('comments', 'youtube.comments.list', video_id,
+                                          part='snippet',
+                                          parentId=thread_id,
+                                          pageToken=page_token,
+                                          maxResults=100,  # API limit is 100
+                                          textFormat='plainText')
+
+            replies.extend(response['items'])
+            page_token = response.get('nextPageToken')
+
+        return replies
+
+    async def __parse_page(self, video_id: str, response, comments: CommentAccumulator):
+        """
+        Parse a page of comment threads, requesting the replies of every thread
+        the API truncated concurrently.
+        """
+        thread_ids = truncated_threads(response) if self.expand_replies else []
+        parse_comment_thread_page(response, comments, skip_replies=set(thread_ids))
+
+        for replies in await asyncio.gather(*[self.get_replies(video_id, thread_id) for thread_id in thread_ids]):
+            parse_replies(replies, comments)
+
+    async def get_comments(self, video_data, high_water_mark=None) -> 'pd.DataFrame':
+        """
+        Coroutine version of `YouTubeDataAPI.get_comments`: collect the comments
+        of a video into a dataframe, stopping at the `high_water_mark` if one is
+        provided.
+        """
+        if 0 >= video_data.comment_count:
+            self.logger.error(f'Received bad comment count: {video_data.comment_count}')
+            return None
+
+        comments = CommentAccumulator()
+        page_token = ''
+
+        try:
+            while page_token is not None:
+                response = await self.request('commentThreads', 'youtube.commentThreads.list', video_data.video_id,
+                                              part='snippet,replies',
+                                              videoId=video_data.video_id,
+                                              pageToken=page_token,
+                                              maxResults=100,  # API limit is 100
+                                              order='time',
+                                              textFormat='plainText')
+
+                await self.__parse_page(video_data.video_id, response, comments)
+                if 'nextPageToken' in response and not reached_high_water_mark(response, high_water_mark):
+                    page_token = response['nextPageToken']
+                else:
+                    page_token = None
+
+        except Exception as e:
+            self.logger.error(f'Failed to collect comments for {video_data.video_id}: {e}')
+            self.logger.debug(traceback.format_exc())
+            raise
+
+        finally:
+            self.__video_limits.pop(video_data.video_id, None)
+
+        comments_df = comments.to_dataframe()
+
+        # get filtered comment count by subtracting our collected count from our expected count
+        filtered_comments = video_data.comment_count - len(comments_df.index)
+        if high_water_mark is None and 0 < filtered_comments:
+            video_data.filtered_comment_count = filtered_comments
+
+        return comments_df
+
+    async def close(self):
+        if self.__session is not None:
+            await self.__session.close()
+            self.__session = None
+
+
+class AsyncRunner:
+    """
+    Event loop running on a background thread, so that coroutines can be
+    submitted from synchronous code and waited on as concurrent futures.
+    """
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.__thread = threading.Thread(target=self.loop.run_forever, name='astro-async', daemon=True)
+        self.__thread.start()
+
+    def submit(self, coroutine):
+        """
+        Schedule `coroutine` on the loop, returning a concurrent.futures.Future.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def close(self, api=None):
+        """
+        Close `api`'s session if given, then stop the loop and its thread.
+        """
+        if api is not None:
+            self.submit(api.close()).result()
+
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.__thread.join()
+        self.loop.close()
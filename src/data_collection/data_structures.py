@@ -35,3 +35,77 @@ class VideoData:
         self.comment_count = comment_count
         self.comments_disabled = comments_disabled
         self.filtered_comment_count = filtered_comment_count
+
+
+class CommentAccumulator:
+    """
+    Column-oriented buffer for comment data. Rows are appended to plain python
+    lists as API pages are parsed, and a dataframe is only built once all pages
+    have been collected. Growing a dataframe one row at a time with `df.loc`
+    copies the frame on every append, which makes collection quadratic.
+    """
+    columns = ['comment_id', 'comment', 'user', 'date', 'visible']
+
+    comment_ids: list
+    comments: list
+    users: list
+    dates: list
+    visible: list
+
+    def __init__(self):
+        self.comment_ids = []
+        self.comments = []
+        self.users = []
+        self.dates = []
+        self.visible = []
+
+    def __len__(self):
+        return len(self.comment_ids)
+
+    def append(self, comment_id: str, comment: str, user: str, date: str, visible=True):
+        """
+        Append a single comment row.
+        """
+        self.comment_ids.append(comment_id)
+        self.comments.append(comment)
+        self.users.append(user)
+        self.dates.append(date)
+        self.visible.append(visible)
+
+    def to_dataframe(self):
+        """
+        Build a dataframe from the accumulated columns. The column layout and
+        dtypes match those of the dataframe previously built row by row.
+        """
+        import pandas as pd
+
+        return pd.DataFrame({
+            'comment_id': pd.Series(self.comment_ids, dtype=object),
+            'comment': pd.Series(self.comments, dtype=object),
+            'user': pd.Series(self.users, dtype=object),
+            'date': pd.Series(self.dates, dtype=object),
+            'visible': pd.Series(self.visible, dtype=bool)},
+            columns=self.columns)
+
+
+class CommentMatch:
+    video_id: str
+    channel_id: str
+    comment_id: str
+    user: str
+    date: str
+    visible: bool
+    comment: str
+    snippet: str
+    rank: float
+
+    def __init__(self, video_id, channel_id, comment_id, user, date, visible, comment, snippet, rank):
+        self.video_id = video_id
+        self.channel_id = channel_id
+        self.comment_id = comment_id
+        self.user = user
+        self.date = date
+        self.visible = bool(visible)
+        self.comment = comment
+        self.snippet = snippet
+        self.rank = rank
@@ -0,0 +1,134 @@
+"""
+Pooled HTTP transport for googleapiclient.
+
+By default every googleapiclient client talks through its own httplib2.Http
+object, so clients never share connections and each worker thread pays for its
+own TLS handshakes. `PooledHttp` implements the part of the httplib2.Http
+interface used by googleapiclient on top of a single requests.Session, whose
+thread safe connection pool keeps connections alive across requests, clients
+and threads.
+"""
+import os
+import threading
+import time
+import urllib.parse
+
+import httplib2
+import requests
+
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+
+def counting_pool_class(pool_class, on_new_connection):
+    """
+    Subclass a urllib3 connection pool to report every connection it opens.
+    """
+    class CountingConnectionPool(pool_class):
+        def _new_conn(self):
+            on_new_connection()
+            return super()._new_conn()
+
+    return CountingConnectionPool
+
+
+class CountingAdapter(HTTPAdapter):
+    def __init__(self, on_new_connection, **kwargs):
+        self.on_new_connection = on_new_connection
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': counting_pool_class(HTTPConnectionPool, self.on_new_connection),
+            'https': counting_pool_class(HTTPSConnectionPool, self.on_new_connection)}
+
+
+class PooledHttp:
+    """
+    httplib2.Http compatible transport backed by a pooled requests.Session. A
+    single instance can be shared by every client in the process.
+    """
+    pool_size = 10
+    timeout = 60
+    request_count = 0
+    connection_count = 0
+    total_latency = 0.0
+    max_latency = 0.0
+
+    def __init__(self, pool_size=10, timeout=60):
+        """
+        `pool_size` is the number of idle connections kept alive per host, which
+        should be at least the number of threads making requests.
+        """
+        if pool_size < 1:
+            raise ValueError(f'Invalid HTTP pool size: {pool_size}')
+
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.request_count = 0
+        self.connection_count = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        self.__lock = threading.Lock()
+
+        adapter = CountingAdapter(self.__count_connection, pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        # requests re-reads proxy settings from the environment on every request,
+        # which costs more than the request itself on a warm connection. The
+        # environment is read once per host instead.
+        self.session.trust_env = False
+        self.session.verify = os.environ.get('REQUESTS_CA_BUNDLE') or os.environ.get('CURL_CA_BUNDLE') or True
+        self.__proxies = {}
+
+    def __count_connection(self):
+        with self.__lock:
+            self.connection_count += 1
+
+    def __get_proxies(self, uri: str) -> dict:
+        parsed_uri = urllib.parse.urlsplit(uri)
+        origin = f'{parsed_uri.scheme}://{parsed_uri.netloc}'
+
+        proxies = self.__proxies.get(origin)
+        if proxies is None:
+            proxies = requests.utils.get_environ_proxies(origin)
+            self.__proxies[origin] = proxies
+
+        return proxies
+
+    def request(self, uri, method='GET', body=None, headers=None, redirections=5, connection_type=None):
+        """
+        Perform a request, returning an (httplib2.Response, content) tuple like
+        httplib2.Http.request.
+        """
+        start = time.perf_counter()
+        response = self.session.request(method, uri, data=body, headers=headers, timeout=self.timeout,
+                                        allow_redirects=redirections > 0, proxies=self.__get_proxies(uri))
+        latency = time.perf_counter() - start
+
+        with self.__lock:
+            self.request_count += 1
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+        info = {key.lower(): value for key, value in response.headers.items()}
+        info['status'] = str(response.status_code)
+
+        http_response = httplib2.Response(info)
+        http_response.reason = response.reason
+
+        return http_response, response.content
+
+    def stats(self) -> dict:
+        with self.__lock:
+            return {'requests': self.request_count,
+                    'connections': self.connection_count,
+                    'reused': max(self.request_count - self.connection_count, 0),
+                    'mean_latency': self.total_latency / self.request_count if self.request_count else 0.0,
+                    'max_latency': self.max_latency}
+
+    def close(self):
+        self.session.close()
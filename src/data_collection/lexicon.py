@@ -0,0 +1,199 @@
+"""
+Precompiled SentiWordNet lexicon.
+
+Sentiment scoring only ever uses the scores of the first synset WordNet returns
+for a (word, part of speech) pair. This module compiles that mapping once into
+a compact binary file. At runtime the file is memory mapped, so startup takes
+milliseconds, no corpus readers are loaded, and worker processes share a
+single copy of the table through the page cache.
+
+File layout (all integers little endian):
+
+    magic       8 bytes, b'ASTROLEX'
+    header_len  uint32
+    header      JSON, padded with spaces to an 8 byte boundary
+    entries     array of `entry_dtype` records, sorted by key
+
+Keys are b'<pos>:<form>'. WordNet reduces inflected words to their base form
+(e.g. 'giants' -> 'giant') before looking them up. The lexicon stores every
+lemma and every irregular form from WordNet's exception lists, and the suffix
+substitution rules are kept in the header. Lookups apply them the way nltk's
+WordNet reader does since nltk 3.9: a single round of substitutions, without
+re-applying the rules to their results. Older nltk versions kept re-applying
+them, so a few inflected forms resolve differently with those.
+
+Build a lexicon with:
+
+    python -m src.data_collection.lexicon <output file>
+"""
+import json
+import math
+import struct
+import sys
+
+import numpy as np
+
+MAGIC = b'ASTROLEX'
+VERSION = 1
+
+# parts of speech scored by SentimentAnalysis: adjectives, adverbs and nouns
+LEXICON_POS = ['a', 'r', 'n']
+
+FLAG_LEMMA = 1  # the form is a WordNet lemma, rather than only an irregular form
+
+
+def entry_dtype(key_width: int) -> np.dtype:
+    return np.dtype([('key', f'S{key_width}'),
+                     ('pos_score', '<f4'),
+                     ('neg_score', '<f4'),
+                     ('flags', 'u1')])
+
+
+def compile_entries(wordnet, sentiwordnet) -> dict:
+    """
+    Resolve the first-synset scores of every lemma and irregular form in
+    WordNet. Returns a dict mapping (form, pos) to (pos_score, neg_score,
+    is_lemma), where the scores are None for forms without a synset.
+    """
+    entries = {}
+
+    for pos in LEXICON_POS:
+        lemmas = set(lemma for lemma, pos_map in wordnet._lemma_pos_offset_map.items() if pos in pos_map)
+        forms = lemmas | set(wordnet._exception_map[pos])
+
+        for form in forms:
+            synsets = wordnet.synsets(form, pos=pos)
+            if synsets:
+                senti_synset = sentiwordnet.senti_synset(synsets[0].name())
+                scores = (senti_synset.pos_score(), senti_synset.neg_score())
+            else:
+                scores = (None, None)
+
+            entries[(form, pos)] = scores + (form in lemmas,)
+
+    return entries
+
+
+def write_lexicon(lexicon_file: str, entries: dict, substitutions: dict):
+    """
+    Write compiled entries to `lexicon_file`. `substitutions` holds WordNet's
+    suffix substitution rules for each part of speech.
+    """
+    keys = [f'{pos}:{form}'.encode('utf-8') for form, pos in entries]
+    key_width = max((len(key) for key in keys), default=1)
+
+    table = np.zeros(len(keys), dtype=entry_dtype(key_width))
+    table['key'] = keys
+    for index, (pos_score, neg_score, is_lemma) in enumerate(entries.values()):
+        table[index]['pos_score'] = math.nan if pos_score is None else pos_score
+        table[index]['neg_score'] = math.nan if neg_score is None else neg_score
+        table[index]['flags'] = FLAG_LEMMA if is_lemma else 0
+
+    table.sort(order='key')
+
+    header = json.dumps({'version': VERSION,
+                         'count': len(table),
+                         'key_width': key_width,
+                         'substitutions': {pos: substitutions.get(pos, []) for pos in LEXICON_POS}}).encode('utf-8')
+    header += b' ' * (-(len(MAGIC) + 4 + len(header)) % 8)
+
+    with open(lexicon_file, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        f.write(table.tobytes())
+
+
+def build_lexicon(lexicon_file: str) -> int:
+    """
+    Compile the lexicon from the installed WordNet and SentiWordNet corpora.
+    Returns the number of entries written.
+    """
+    from nltk.corpus import wordnet as wn
+    from nltk.corpus import sentiwordnet as swn
+
+    entries = compile_entries(wn, swn)
+    write_lexicon(lexicon_file, entries, wn.MORPHOLOGICAL_SUBSTITUTIONS)
+
+    return len(entries)
+
+
+class SentimentLexicon:
+    """
+    Read-only, memory mapped view of a compiled lexicon file.
+    """
+    count: int
+
+    def __init__(self, lexicon_file: str):
+        with open(lexicon_file, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'Not a sentiment lexicon file: {lexicon_file}')
+
+            header_len = struct.unpack('<I', f.read(4))[0]
+            header = json.loads(f.read(header_len))
+
+        if header['version'] != VERSION:
+            raise ValueError(f'Unsupported sentiment lexicon version: {header["version"]}')
+
+        self.lexicon_file = lexicon_file
+        self.count = header['count']
+        self.key_width = header['key_width']
+        self.substitutions = header['substitutions']
+
+        if self.count:
+            self.__table = np.memmap(lexicon_file, dtype=entry_dtype(self.key_width), mode='r',
+                                     offset=len(MAGIC) + 4 + header_len, shape=(self.count,))
+        else:
+            self.__table = np.zeros(0, dtype=entry_dtype(self.key_width))
+        self.__keys = self.__table['key']
+
+    def __len__(self):
+        return self.count
+
+    def __find(self, form: str, pos: str):
+        """
+        Return the table record for (form, pos), or None.
+        """
+        key = f'{pos}:{form}'.encode('utf-8')
+        if len(key) > self.key_width:
+            return None
+
+        index = np.searchsorted(self.__keys, key)
+        if index < self.count and self.__keys[index] == key:
+            return self.__table[index]
+
+        return None
+
+    def __scores(self, record):
+        if math.isnan(record['pos_score']):
+            return None
+
+        return (float(record['pos_score']), float(record['neg_score']))
+
+    def lookup(self, word: str, pos: str):
+        """
+        Return the (positive, negative) scores of the first synset WordNet
+        would return for `word`, or None if there is no such synset. `word` is
+        expected to be lowercase.
+        """
+        # lemmas and irregular forms are stored as they are
+        record = self.__find(word, pos)
+        if record is not None:
+            return self.__scores(record)
+
+        # otherwise, the first suffix substitution that yields a lemma wins.
+        # Like nltk's _morphy, the rules are applied once, never to their results.
+        for old, new in self.substitutions.get(pos, []):
+            if word.endswith(old):
+                record = self.__find(word[:len(word) - len(old)] + new, pos)
+                if record is not None and record['flags'] & FLAG_LEMMA:
+                    return self.__scores(record)
+
+        return None
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        sys.exit('Usage: python -m src.data_collection.lexicon <output file>')
+
+    print(f'Wrote {build_lexicon(sys.argv[1])} entries to {sys.argv[1]}')
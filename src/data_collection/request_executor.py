@@ -0,0 +1,265 @@
+"""
+Execution of YouTube Data API requests with retries, rate limiting and quota
+accounting.
+
+Transient failures (5xx responses, rate limiting and network errors) are
+retried with exponential backoff and full jitter, up to a maximum number of
+attempts. Running out of daily quota is never retried. Requests are paced by an
+optional token bucket, and the quota cost of every request is tracked against
+the daily quota, which earlier runs of the same day may have used part of.
+"""
+import datetime
+import json
+import random
+import threading
+import time
+import zoneinfo
+
+# quota units charged per API method; methods not listed cost 1 unit
+QUOTA_COSTS = {
+        'youtube.commentThreads.list': 1,
+        'youtube.comments.list': 1,
+        'youtube.videos.list': 1}
+
+DEFAULT_DAILY_QUOTA = 10000  # default quota of a YouTube Data API project
+
+# requests the 'auto' rate limit lets through at once, before pacing them to
+# spread the remaining daily quota over the rest of the day
+DEFAULT_BURST = 100
+
+RETRYABLE_STATUSES = [429, 500, 502, 503, 504]
+RATE_LIMIT_REASONS = ['rateLimitExceeded', 'userRateLimitExceeded']
+QUOTA_REASONS = ['quotaExceeded', 'dailyLimitExceeded']
+
+# the API quota resets at midnight Pacific time
+QUOTA_TIMEZONE = zoneinfo.ZoneInfo('America/Los_Angeles')
+
+
+class QuotaExceededError(Exception):
+    """
+    The daily API quota is used up.
+    """
+
+
+def quota_day(now=None) -> str:
+    """
+    The day (YYYY-MM-DD) quota is charged to, in Pacific time.
+    """
+    now = now if now else datetime.datetime.now(datetime.timezone.utc)
+    return now.astimezone(QUOTA_TIMEZONE).date().isoformat()
+
+
+def daily_rate(remaining_quota: int, now=None) -> float:
+    """
+    Requests per second which spread the remaining quota evenly over the rest
+    of the quota day.
+    """
+    now = now if now else datetime.datetime.now(datetime.timezone.utc)
+    local_now = now.astimezone(QUOTA_TIMEZONE)
+    midnight = datetime.datetime.combine(local_now.date() + datetime.timedelta(days=1), datetime.time(),
+                                         tzinfo=QUOTA_TIMEZONE)
+
+    # compared in UTC, as subtracting times of the same zone ignores DST changes
+    seconds_left = (midnight.astimezone(datetime.timezone.utc) - now.astimezone(datetime.timezone.utc)).total_seconds()
+    return max(remaining_quota, 1) / max(seconds_left, 1.0)
+
+
+def error_reasons(error) -> list:
+    """
+    Extract the `reason` fields of an API error response.
+    """
+    try:
+        content = json.loads(error.content)
+        return [detail.get('reason') for detail in content['error']['errors']]
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return []
+
+
+def is_http_error(error) -> bool:
+    return hasattr(error, 'resp') and hasattr(error, 'content')
+
+
+def is_network_error(error) -> bool:
+    import httplib2
+
+    return isinstance(error, (OSError, httplib2.HttpLib2Error))
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket, refilled at `rate` tokens per second up to
+    `capacity` tokens.
+    """
+    rate = 1.0
+    capacity = 1.0
+
+    def __init__(self, rate: float, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError(f'Invalid token bucket rate: {rate}')
+
+        self.rate = rate
+        self.capacity = capacity if capacity else max(rate, 1.0)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.__updated = clock()
+        self.__lock = threading.Lock()
+
+    def __refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.__updated) * self.rate)
+        self.__updated = now
+
+    def acquire(self, tokens=1.0) -> float:
+        """
+        Take `tokens` from the bucket, blocking until they are available.
+        Returns the number of seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self.__lock:
+                self.__refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+
+                delay = (tokens - self.tokens) / self.rate
+
+            self.sleep(delay)
+            waited += delay
+
+
+class RequestExecutor:
+    """
+    Executes googleapiclient requests. A single executor can be shared by the
+    clients of every thread, so that the rate limit and quota apply to the run
+    as a whole.
+    """
+    logger = None
+    max_attempts = 5
+    base_delay = 1.0
+    max_delay = 60.0
+    daily_quota = None
+    quota_spent = 0
+    quota_used = 0
+    retry_count = 0
+
+    def __init__(self, logger, max_attempts=5, base_delay=1.0, max_delay=60.0, rate_limiter=None,
+                 daily_quota=None, quota_spent=0, sleep=time.sleep, rand=random.random):
+        """
+        `daily_quota` is the number of quota units available per day, of which
+        `quota_spent` were already spent today by earlier runs. Requests which
+        would go over it raise QuotaExceededError instead of being sent.
+        `quota_used` counts the units spent by this executor.
+        """
+        if max_attempts < 1:
+            raise ValueError(f'Invalid maximum request attempts: {max_attempts}')
+
+        self.logger = logger
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.rate_limiter = rate_limiter
+        self.daily_quota = daily_quota
+        self.quota_spent = quota_spent
+        self.quota_used = 0
+        self.retry_count = 0
+        self.quota_exhausted = False
+        self.sleep = sleep
+        self.rand = rand
+        self.__lock = threading.Lock()
+
+    def __charge(self, cost: int):
+        """
+        Reserve `cost` quota units for a request, if the daily quota allows it.
+        """
+        with self.__lock:
+            if self.daily_quota is not None and self.quota_spent + self.quota_used + cost > self.daily_quota:
+                self.quota_exhausted = True
+                raise QuotaExceededError(f'Daily quota of {self.daily_quota} units used up')
+
+            self.quota_used += cost
+
+    def backoff_delay(self, attempt: int, error=None) -> float:
+        """
+        Delay before retrying after the given (1-based) failed attempt: a random
+        fraction of an exponentially growing delay, but never less than the
+        server's Retry-After.
+        """
+        delay = self.rand() * min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+
+        retry_after = error.resp.get('retry-after') if error is not None and is_http_error(error) else None
+        if retry_after and retry_after.isdigit():
+            delay = max(delay, min(float(retry_after), self.max_delay))
+
+        return delay
+
+    def __should_retry(self, error) -> bool:
+        if is_http_error(error):
+            reasons = error_reasons(error)
+            if any(reason in QUOTA_REASONS for reason in reasons):
+                with self.__lock:
+                    self.quota_exhausted = True
+                raise QuotaExceededError('Daily API quota exceeded') from error
+
+            return error.resp.status in RETRYABLE_STATUSES or any(reason in RATE_LIMIT_REASONS for reason in reasons)
+
+        return is_network_error(error)
+
+    def __retry_delay(self, attempt: int, error) -> float:
+        """
+        Handle the failure of the given (1-based) attempt: returns the delay
+        before the next attempt, or re-raises `error` if it shouldn't be retried.
+        """
+        if not self.__should_retry(error) or attempt == self.max_attempts:
+            raise error
+
+        delay = self.backoff_delay(attempt, error)
+        with self.__lock:
+            self.retry_count += 1
+
+        self.logger.warning(f'Request failed ({error}), retrying in {delay:.1f}s ' +
+                            f'[attempt {attempt}/{self.max_attempts}]')
+        return delay
+
+    def execute(self, request):
+        """
+        Execute `request`, retrying transient failures. Raises the last error
+        once `max_attempts` attempts have failed, or immediately for errors
+        which retrying can't fix.
+        """
+        cost = QUOTA_COSTS.get(getattr(request, 'methodId', None), 1)
+
+        for attempt in range(1, self.max_attempts + 1):
+            self.__charge(cost)  # failed requests are charged too
+
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+
+            try:
+                return request.execute()
+
+            except Exception as e:
+                self.sleep(self.__retry_delay(attempt, e))
+
+    async def execute_async(self, request):
+        """
+        Coroutine version of `execute`, for requests whose `execute` is a
+        coroutine. Waiting for the rate limiter or a retry doesn't block the
+        event loop.
+        """
+        import asyncio
+
+        cost = QUOTA_COSTS.get(getattr(request, 'methodId', None), 1)
+
+        for attempt in range(1, self.max_attempts + 1):
+            self.__charge(cost)
+
+            if self.rate_limiter:
+                await asyncio.get_running_loop().run_in_executor(None, self.rate_limiter.acquire)
+
+            try:
+                return await request.execute()
+
+            except Exception as e:
+                await asyncio.sleep(self.__retry_delay(attempt, e))
@@ -2,45 +2,303 @@
 Functionality for determining the sentiment of a given comment/string. This
 approach utilizes the Natural Language Toolkit in combination with SentiWordNet.
 """
+import multiprocessing
 import nltk
+import numpy as np
+
+from concurrent.futures import ProcessPoolExecutor
 from nltk.corpus import wordnet as wn
 from nltk.corpus import sentiwordnet as swn
+from nltk.corpus.reader.wordnet import ADJ, ADV, NOUN
+from src.data_collection.lexicon import SentimentLexicon
+from src.data_collection.sentiment_cache import SentimentCache
+
+# nltk packages used for scoring, and the resource each one installs
+NLTK_RESOURCES = {
+        'punkt_tab': 'tokenizers/punkt_tab',
+        'averaged_perceptron_tagger_eng': 'taggers/averaged_perceptron_tagger_eng',
+        'wordnet': 'corpora/wordnet',
+        'sentiwordnet': 'corpora/sentiwordnet'}
+
+# per-process analyzer used by the workers of the parallel scoring pool
+_worker_analyzer = None
+
+
+def find_missing_nltk_packages(packages: list) -> list:
+    """
+    Return the packages whose data is not installed in any of the nltk data
+    directories. This only checks the local filesystem.
+    """
+    missing = []
+    for pkg in packages:
+        try:
+            nltk.data.find(NLTK_RESOURCES[pkg])
+        except LookupError:
+            missing.append(pkg)
+
+    return missing
+
+
+def download_nltk_packages(packages: list, data_dir=None):
+    for pkg in packages:
+        nltk.download(pkg, download_dir=data_dir, quiet=True, raise_on_error=True)
+
+
+def use_nltk_data_dir(data_dir: str):
+    """
+    Search `data_dir` for nltk data before the default locations.
+    """
+    if data_dir and data_dir not in nltk.data.path:
+        nltk.data.path.insert(0, data_dir)
+
+
+def _init_worker(cache_size, cache_file, lexicon_file, nltk_data_dir):
+    """
+    Process pool initializer: load the nltk models once per worker process.
+    Workers start from the persisted sentiment cache, but never write it; the
+    entries they add are sent back to the parent with each chunk instead.
+    """
+    global _worker_analyzer
+    _worker_analyzer = SentimentAnalysis(None, init_nltk=False, cache_size=cache_size, lexicon_file=lexicon_file,
+                                         nltk_data_dir=nltk_data_dir)
+    _worker_analyzer.cache = SentimentCache(cache_size, cache_file, track_new=True)
+
+    _worker_analyzer.load_models()
+
+
+def _score_chunk(comments: list) -> tuple:
+    """
+    Score a chunk of comments in a worker process. Returns the scores along
+    with the cache entries added while scoring them and the chunk's cache hits
+    and misses, for the parent to merge into its own cache.
+    """
+    cache = _worker_analyzer.cache
+    hits, misses = cache.hits, cache.misses
+
+    scores = _worker_analyzer.score_comments(comments)
+
+    return scores, cache.take_new_entries(), cache.hits - hits, cache.misses - misses
 
 
 class SentimentAnalysis:
     logger = None
+    progress_step = 1000  # number of comments scored between progress bar updates
+    workers = 1
+    chunk_size = 1000
+
+    def __init__(self, logger, workers=1, chunk_size=1000, init_nltk=True, cache_size=100000, cache_file=None,
+                 lexicon_file=None, offline=False, nltk_data_dir=None):
+        """
+        With `workers` greater than 1, comments are scored on a pool of worker
+        processes in chunks of `chunk_size` comments. Inputs smaller than two
+        chunks are always scored serially, since the pool overhead would
+        outweigh the gain.
+
+        Word scores are memoized in an LRU cache of `cache_size` entries. If a
+        `cache_file` is given, the cache is loaded from it and written back to
+        it on `close()`.
+
+        If a precompiled `lexicon_file` is given (see lexicon.py), word scores
+        are read from it instead of the WordNet and SentiWordNet corpora, which
+        then never need to be loaded.
+
+        Missing nltk data is downloaded into `nltk_data_dir` (or nltk's default
+        location), unless `offline` is set, in which case it is an error.
+        """
+        if workers < 1 or chunk_size < 1:
+            raise ValueError(f'Invalid sentiment worker configuration: workers={workers}, chunk_size={chunk_size}')
 
-    def __init__(self, logger):
         self.logger = logger
-        self.nltk_init()
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.cache = SentimentCache(cache_size, cache_file)
+        self.lexicon = SentimentLexicon(lexicon_file) if lexicon_file else None
+        self.offline = offline
+        self.nltk_data_dir = nltk_data_dir
+        self.__pool = None
+
+        use_nltk_data_dir(nltk_data_dir)
+
+        if init_nltk:
+            self.nltk_init()
+
+    def required_nltk_packages(self) -> list:
+        packages = ['punkt_tab', 'averaged_perceptron_tagger_eng']
+        if not self.lexicon:
+            packages += ['wordnet', 'sentiwordnet']
+
+        return packages
 
     def nltk_init(self):
-        required_nltk_packages = [
-                'punkt_tab',
-                'averaged_perceptron_tagger_eng',
-                'wordnet',
-                'sentiwordnet']
+        """
+        Make sure the required nltk data is installed, downloading only the
+        packages which are missing.
+        """
+        missing = find_missing_nltk_packages(self.required_nltk_packages())
+        if not missing:
+            return
+
+        if self.offline:
+            raise RuntimeError(f"Missing nltk data: {', '.join(missing)}. Run 'astro setup' to install it.")
+
+        if self.logger:
+            self.logger.info(f"Downloading nltk data: {', '.join(missing)}")
+
+        download_nltk_packages(missing, self.nltk_data_dir)
 
-        for pkg in required_nltk_packages:
-            nltk.download(pkg, quiet=True, raise_on_error=True)
+    def load_models(self):
+        """
+        Load the nltk tokenizer, tagger and corpora up front rather than on
+        first use.
+        """
+        nltk.pos_tag(nltk.word_tokenize('load models'))
 
-    def add_sentiment_to_dataframe(self, df):
+        if not self.lexicon:
+            wn.ensure_loaded()
+            swn.ensure_loaded()
+
+    def __get_pool(self) -> ProcessPoolExecutor:
+        """
+        Lazily start the worker pool, which is kept around for later calls so
+        that the models are only loaded once per worker. Workers are spawned
+        rather than forked, since collection may be running other threads.
+        """
+        if self.__pool is None:
+            self.__pool = ProcessPoolExecutor(max_workers=self.workers,
+                                              mp_context=multiprocessing.get_context('spawn'),
+                                              initializer=_init_worker,
+                                              initargs=(self.cache.maxsize, self.cache.cache_file,
+                                                        self.lexicon.lexicon_file if self.lexicon else None,
+                                                        self.nltk_data_dir))
+        return self.__pool
+
+    def close(self):
+        """
+        Shut down the worker pool, if one was started, and persist the sentiment
+        cache.
+        """
+        if self.__pool is not None:
+            self.__pool.shutdown()
+            self.__pool = None
+
+        stats = self.cache.stats()
+        if self.logger:
+            self.logger.debug(f"Sentiment cache: {stats['hits']} hits, {stats['misses']} misses " +
+                              f"({stats['hit_rate']:.1%} hit rate), {stats['size']} entries")
+
+        if self.cache.cache_file:
+            self.cache.save()
+
+    def __score_parallel(self, comments: list, progress=None) -> np.ndarray:
+        """
+        Score comments on the worker pool. Chunks are returned in order, so the
+        result is identical to serial scoring. The word scores resolved by the
+        workers are merged into this process's cache, so that `close()` reports
+        and persists them.
+        """
+        chunks = [comments[i:i + self.chunk_size] for i in range(0, len(comments), self.chunk_size)]
+        scores = np.zeros((len(comments), 2), dtype=np.float64)
+
+        start = 0
+        for chunk_scores, entries, hits, misses in self.__get_pool().map(_score_chunk, chunks):
+            self.cache.merge(entries, hits, misses)
+            scores[start:start + len(chunk_scores)] = chunk_scores
+            start += len(chunk_scores)
+
+            if progress:
+                progress.advance(len(chunk_scores))
+
+        if progress:
+            progress.complete()
+
+        return scores
+
+    def score_comments(self, comments, progress=None) -> np.ndarray:
+        """
+        Score a sequence of comments (e.g. a Series), returning an (n, 2) float
+        array holding the positive and negative sentiment of each comment.
+        Scores are written into a preallocated array, so no pandas operations
+        happen per comment.
+        """
+        comments = list(comments)
+        if self.workers > 1 and len(comments) >= 2 * self.chunk_size:
+            return self.__score_parallel(comments, progress)
+
+        scores = np.zeros((len(comments), 2), dtype=np.float64)
+
+        for index, comment in enumerate(comments):
+            positive, negative, _ = self.get_sentiment(comment)
+            scores[index, 0] = positive
+            scores[index, 1] = negative
+
+            if progress and (index + 1) % self.progress_step == 0:
+                progress.advance(self.progress_step)
+
+        if progress:
+            progress.complete()
+
+        return scores
+
+    def add_sentiment_to_dataframe(self, df, show_progress=True, rows=None):
+        """
+        Score the comments of the dataframe into its 'PSentiment' and
+        'NSentiment' columns. Pass a boolean mask as `rows` to only score some
+        of them, e.g. those `AstroDB.copy_stored_sentiment` couldn't fill in.
+        """
         if df is None or df.empty:
             raise ValueError('received null dataframe')
 
-        # add new columns to dataframe
-        df['PSentiment'] = ''
-        df['NSentiment'] = ''
+        comments = df['comment'] if rows is None else df.loc[rows, 'comment']
+        comment_count = len(comments.index)
+        if not comment_count:
+            return
 
-        comment_count = len(df.index)
         with self.logger.progress_bar('Calculating comment sentiment',
-                                      comment_count) as progress:
-            for index, row in df.iterrows():
-                sentiment = self.get_sentiment(row['comment'])
-                df.loc[index, 'PSentiment'] = sentiment[0]
-                df.loc[index, 'NSentiment'] = sentiment[1]
+                                      comment_count, disable=not show_progress) as progress:
+            scores = self.score_comments(comments, progress)
+
+        # add new columns to dataframe
+        if rows is None:
+            df[['PSentiment', 'NSentiment']] = scores
+        else:
+            df.loc[rows, ['PSentiment', 'NSentiment']] = scores
+
+    def __lookup_word_scores(self, word: str, pos: str):
+        """
+        Resolve the SentiWordNet scores of a word, or None if WordNet has no
+        synset for it.
+        """
+        if self.lexicon:
+            return self.lexicon.lookup(word, pos)
+
+        # Get synonyms for current word, 'synset'.
+        word_synset = wn.synsets(word, pos=pos)
+        if not word_synset:
+            return None
 
-                progress.advance(1)
+        # Naive/inexpensive approach: use the first word in the set
+        chosen_synset = word_synset[0]
+
+        # Retrieve sentiment score for the given synonym from SentiWordNet
+        senti_word_net = swn.senti_synset(chosen_synset.name())
+
+        return (senti_word_net.pos_score(), senti_word_net.neg_score())
+
+    def get_word_scores(self, word: str, pos: str):
+        """
+        Return the (positive, negative) SentiWordNet scores of a word, or None
+        if WordNet has no synset for it. Results are memoized in the sentiment
+        cache. WordNet lookups are case insensitive, so the cache is keyed on
+        the lowercased word.
+        """
+        word = word.lower()
+
+        word_scores = self.cache.get(word, pos)
+        if word_scores is SentimentCache.MISSING:
+            word_scores = self.__lookup_word_scores(word, pos)
+            self.cache.put(word, pos, word_scores)
+
+        return word_scores
 
     def get_sentiment(self, comment: str) -> ():
         token_comment = nltk.word_tokenize(comment)
@@ -55,27 +313,20 @@ class SentimentAnalysis:
             tag = word_tag[1]
 
             if tag.startswith('J'):
-                tag = wn.ADJ
+                tag = ADJ
             elif tag.startswith('R'):
-                tag = wn.ADV
+                tag = ADV
             elif tag.startswith('N'):
-                tag = wn.NOUN
+                tag = NOUN
             else:
                 continue
 
-            # Get synonyms for current word, 'synset'.
-            word_synset = wn.synsets(word, pos=tag)
-            if not word_synset:
+            word_scores = self.get_word_scores(word, tag)
+            if word_scores is None:
                 continue
 
-            # Naive/inexpensive approach: use the first word in the set
-            chosen_synset = word_synset[0]
-
-            # Retrieve sentiment score for the given synonym from SentiWordNet
-            senti_word_net = swn.senti_synset(chosen_synset.name())
-
-            positive_sentiment += senti_word_net.pos_score()
-            negative_sentiment += senti_word_net.neg_score()
+            positive_sentiment += word_scores[0]
+            negative_sentiment += word_scores[1]
             objectivity = 1 - (positive_sentiment + negative_sentiment)
 
             return (positive_sentiment, negative_sentiment, objectivity)
@@ -0,0 +1,140 @@
+"""
+Bounded LRU cache of SentiWordNet scores, keyed by (word, part of speech).
+
+Comment vocabulary is heavily skewed towards a few thousand common words, so
+caching the resolved scores avoids repeating the same WordNet and SentiWordNet
+lookups millions of times. The cache can optionally be persisted to disk so
+that later runs start warm.
+"""
+import json
+import os
+
+from collections import OrderedDict
+
+
+class SentimentCache:
+    """
+    Maps (word, pos) to a (positive, negative) score tuple, or to None for
+    words which have no synset for that part of speech.
+    """
+    MISSING = object()  # returned by `get` for keys which are not cached
+    FILE_VERSION = 1
+
+    maxsize: int
+    hits: int
+    misses: int
+
+    def __init__(self, maxsize=100000, cache_file=None, track_new=False):
+        """
+        With `track_new` set, entries put into the cache are also recorded until
+        `take_new_entries` is called, so that they can be merged into another
+        cache (e.g. from a worker process into the parent's).
+        """
+        if maxsize < 1:
+            raise ValueError(f'Invalid sentiment cache size: {maxsize}')
+
+        self.maxsize = maxsize
+        self.cache_file = cache_file
+        self.hits = 0
+        self.misses = 0
+        self.__entries = OrderedDict()
+        self.__new_entries = {} if track_new else None
+
+        if cache_file and os.path.exists(cache_file):
+            self.load(cache_file)
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def get(self, word: str, pos: str):
+        """
+        Return the cached scores for (word, pos), or `MISSING`.
+        """
+        key = (word, pos)
+        try:
+            scores = self.__entries[key]
+        except KeyError:
+            self.misses += 1
+            return self.MISSING
+
+        self.__entries.move_to_end(key)
+        self.hits += 1
+        return scores
+
+    def put(self, word: str, pos: str, scores):
+        """
+        Cache the scores for (word, pos), evicting the least recently used
+        entry if the cache is full.
+        """
+        self.__entries[(word, pos)] = scores
+        self.__entries.move_to_end((word, pos))
+
+        if len(self.__entries) > self.maxsize:
+            self.__entries.popitem(last=False)
+
+        if self.__new_entries is not None:
+            self.__new_entries[(word, pos)] = scores
+
+    def take_new_entries(self) -> list:
+        """
+        Return the (word, pos, scores) entries put since the last call, and
+        stop tracking them. Only available with `track_new`.
+        """
+        if self.__new_entries is None:
+            raise ValueError('Sentiment cache is not tracking new entries')
+
+        entries = [(word, pos, scores) for (word, pos), scores in self.__new_entries.items()]
+        self.__new_entries.clear()
+        return entries
+
+    def merge(self, entries: list, hits=0, misses=0):
+        """
+        Add entries and lookup counts taken from another cache.
+        """
+        for word, pos, scores in entries:
+            self.put(word, pos, scores)
+
+        self.hits += hits
+        self.misses += misses
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> dict:
+        return {'size': len(self.__entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hit_rate()}
+
+    def load(self, cache_file: str):
+        """
+        Load entries from a cache file written by `save`. Files written by a
+        different version of the cache are ignored.
+        """
+        with open(cache_file) as f:
+            data = json.load(f)
+
+        if data.get('version') != self.FILE_VERSION:
+            return
+
+        for word, pos, scores in data['entries'][-self.maxsize:]:
+            self.__entries[(word, pos)] = tuple(scores) if scores is not None else None
+
+    def save(self, cache_file=None):
+        """
+        Write the cache to disk, least recently used entries first. The file is
+        replaced atomically so that an interrupted save never corrupts it.
+        """
+        cache_file = cache_file or self.cache_file
+        if not cache_file:
+            raise ValueError('No sentiment cache file specified')
+
+        entries = [[word, pos, scores] for (word, pos), scores in self.__entries.items()]
+
+        tmp_file = cache_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({'version': self.FILE_VERSION, 'entries': entries}, f)
+
+        os.replace(tmp_file, cache_file)
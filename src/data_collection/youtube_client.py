@@ -0,0 +1,148 @@
+"""
+Construction of googleapiclient YouTube clients.
+
+Building a client requires the YouTube discovery document, a ~400KB JSON
+description of the API which, depending on the googleapiclient version, is
+either bundled with the library or fetched over HTTP on every build. Here the
+document is loaded and parsed once per process, optionally through a disk cache
+with a TTL, and every thread gets its own client built from it (clients are
+not thread safe). Clients can share a pooled `http` transport (see
+http_transport.py).
+"""
+import json
+import os
+import threading
+import time
+import urllib.request
+
+DISCOVERY_URL = 'https://www.googleapis.com/discovery/v1/apis/youtube/v3/rest'
+DISCOVERY_TTL = 7 * 24 * 60 * 60  # seconds a cached discovery document stays fresh
+
+
+def cache_age(cache_file: str) -> float:
+    """
+    Seconds since `cache_file` was written, or None if it doesn't exist.
+    """
+    try:
+        return time.time() - os.path.getmtime(cache_file)
+    except OSError:
+        return None
+
+
+def download_discovery_document() -> str:
+    with urllib.request.urlopen(DISCOVERY_URL, timeout=30) as response:
+        return response.read().decode('utf-8')
+
+
+def bundled_discovery_document() -> str:
+    """
+    The discovery document shipped with googleapiclient, or None for versions
+    which don't bundle one.
+    """
+    try:
+        from googleapiclient.discovery_cache import get_static_doc
+    except ImportError:
+        return None
+
+    return get_static_doc('youtube', 'v3')
+
+
+def write_discovery_cache(cache_file: str, document: str):
+    tmp_file = cache_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        f.write(document)
+
+    os.replace(tmp_file, cache_file)
+
+
+def load_discovery_document(cache_file=None, ttl=DISCOVERY_TTL) -> dict:
+    """
+    Load the YouTube discovery document, preferring a fresh `cache_file`, then
+    the copy bundled with googleapiclient, then the network. A stale cache is
+    only used if the document can't be obtained otherwise. Whatever is loaded
+    is written back to `cache_file`.
+    """
+    age = cache_age(cache_file) if cache_file else None
+    if age is not None and age < ttl:
+        with open(cache_file) as f:
+            return json.load(f)
+
+    try:
+        document = bundled_discovery_document() or download_discovery_document()
+    except OSError:
+        if age is None:
+            raise
+
+        with open(cache_file) as f:
+            return json.load(f)
+
+    if cache_file:
+        write_discovery_cache(cache_file, document)
+
+    return json.loads(document)
+
+
+class YouTubeClientFactory:
+    """
+    Builds YouTube clients from a single, lazily loaded discovery document.
+    Each thread is handed its own client. Clients send their requests through
+    `http` if given, otherwise each one uses its own httplib2.Http. Requests go
+    to `api_endpoint` instead of the public API if set.
+    """
+    api_key = None
+    cache_file = None
+    ttl = DISCOVERY_TTL
+    http = None
+    api_endpoint = None
+    build_count = 0
+
+    def __init__(self, api_key, cache_file=None, ttl=DISCOVERY_TTL, http=None, api_endpoint=None):
+        self.api_key = api_key
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.http = http
+        self.api_endpoint = api_endpoint
+        self.build_count = 0
+        self.__document = None
+        self.__lock = threading.Lock()
+        self.__thread_data = threading.local()
+
+    def document(self) -> dict:
+        with self.__lock:
+            if self.__document is None:
+                self.__document = load_discovery_document(self.cache_file, self.ttl)
+
+            return self.__document
+
+    def client(self):
+        """
+        Return the client owned by the calling thread, building it on first use.
+        """
+        client = getattr(self.__thread_data, 'client', None)
+        if client is None:
+            from googleapiclient.discovery import build_from_document
+
+            client_options = {'api_endpoint': self.api_endpoint} if self.api_endpoint else None
+            client = build_from_document(self.document(), developerKey=self.api_key, http=self.http,
+                                         client_options=client_options)
+            self.__thread_data.client = client
+
+            with self.__lock:
+                self.build_count += 1
+
+        return client
+
+
+# one factory per configuration for the lifetime of the process
+_factories = {}
+_factories_lock = threading.Lock()
+
+
+def get_client_factory(api_key, cache_file=None, http=None) -> YouTubeClientFactory:
+    with _factories_lock:
+        factory = _factories.get((api_key, cache_file, http))
+        if factory is None:
+            factory = YouTubeClientFactory(api_key, cache_file, http=http)
+            _factories[(api_key, cache_file, http)] = factory
+
+        return factory
@@ -1,147 +1,327 @@
 """
 Functions for gathering data from YouTube.
 """
-import pandas as pd
 import traceback
 import string
 import json
 
-from src.data_collection.data_structures import VideoData
-from googleapiclient.discovery import build
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from typing import TYPE_CHECKING
+from src.data_collection.data_structures import VideoData, CommentAccumulator
+from src.data_collection.youtube_client import get_client_factory
+from src.data_collection.request_executor import RequestExecutor
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def extract_video_id(url: str) -> str:
+    """
+    Grab the video ID from the provided URL. The ID will come after
+    the substring 'v=' in the URL, so I just split the string on that
+    substring and return the latter half. A bare video ID is accepted
+    as well.
+    """
+    video_id = url.split('v=')[1] if 'v=' in url else url
+
+    # validate extracted video id
+    valid_tokens = (string.ascii_uppercase +
+                    string.ascii_lowercase +
+                    string.digits + '-' + '_')
+
+    for token in video_id:
+        if token not in valid_tokens:
+            raise ValueError('Invalid video URL provided')
+
+    return video_id
+
+
+def parse_replies(replies: list, comments: CommentAccumulator) -> int:
+    """
+    Append a list of reply comment resources to the comment accumulator.
+    Returns the number of replies added.
+    """
+    for reply in replies:
+        reply_data = reply['snippet']
+
+        comment_id = reply['id']
+        comment = reply_data['textDisplay']
+        user = reply_data['authorDisplayName']
+        date = reply_data['publishedAt']
+        visible = True  # this is used to track comment visibility changes
+
+        comments.append(comment_id, comment, user, date, visible)
+
+    return len(replies)
+
+
+def truncated_threads(response) -> list:
+    """
+    Return the IDs of the threads in a commentThreads page holding more replies
+    than the API returned inline (it returns at most a handful per thread).
+    """
+    return [item['id'] for item in response['items']
+            if item['snippet']['totalReplyCount'] > len(item.get('replies', {}).get('comments', []))]
+
+
+def parse_comment_thread_page(response, comments: CommentAccumulator, skip_replies=()) -> int:
+    """
+    Parse API response for comment query. This will grab all comments and their replies,
+    appending the resulting data to the provided comment accumulator. Returns
+    the number of comments added. The inline replies of the threads listed in
+    `skip_replies` are left out, for threads whose replies are fetched in full.
+    """
+    comment_count = 0
+
+    for item in response['items']:
+        has_replies = 0 != item['snippet']['totalReplyCount']
+
+        comment_id = item['id']
+        comment_info = item['snippet']['topLevelComment']['snippet']
+        comment = comment_info['textDisplay']
+        user = comment_info['authorDisplayName']
+        date = comment_info['publishedAt']
+        visible = True  # this is used to track comment visibility changes
+
+        comments.append(comment_id, comment, user, date, visible)
+        comment_count += 1
+
+        if has_replies and comment_id not in skip_replies:
+            comment_count += parse_replies(item['replies']['comments'], comments)
+
+    return comment_count
+
+
+def reached_high_water_mark(response, high_water_mark) -> bool:
+    """
+    Check whether a page of time-ordered comment threads reaches back to
+    comments which are already stored. `high_water_mark` is the
+    (publishedAt, comment ID) of the newest stored comment. Threads are ordered
+    by the time of their top level comment, so older threads which received
+    new replies are past this point, and are not collected.
+    """
+    if not high_water_mark:
+        return False
+
+    last_published_at, last_comment_id = high_water_mark
+    for item in response['items']:
+        comment_info = item['snippet']['topLevelComment']['snippet']
+        if item['id'] == last_comment_id or comment_info['publishedAt'] <= last_published_at:
+            return True
+
+    return False
+
+
+def parse_video_item(item) -> VideoData:
+    """
+    Convert a single item of a videos.list response into a VideoData object.
+    """
+    video_data = item['snippet']
+    video_stats = item['statistics']
+
+    return_data = VideoData()
+    return_data.video_id = item['id']
+    return_data.video_title = video_data['title']
+    return_data.channel_id = video_data['channelId']
+    return_data.channel_title = video_data['channelTitle']
+    return_data.like_count = int(video_stats.get('likeCount', 0))
+    return_data.view_count = int(video_stats.get('viewCount', 0))
+    if 'commentCount' in video_stats:
+        return_data.comment_count = int(video_stats['commentCount'])
+    else:
+        return_data.comments_disabled = True
+
+    return return_data
 
 
 class YouTubeDataAPI:
     logger = None
     api_key = None
-    youtube = None
     log_json = False
+    show_progress = True
+    max_ids_per_request = 50  # API limit for videos.list
+    expand_replies = True
+    reply_workers = 4
+
+    def __init__(self, logger, api_key, log_json=False, show_progress=True, client_factory=None, executor=None,
+                 expand_replies=True, reply_workers=4):
+        """
+        Clients come from `client_factory`, by default the per-process factory
+        shared by every instance with the same API key. Requests are sent by
+        `executor`, which handles retries, rate limiting and the quota budget.
 
-    def __init__(self, logger, api_key, log_json=False):
+        With `expand_replies`, the full reply list of threads with more replies
+        than the API returns inline is requested separately, for up to
+        `reply_workers` threads at once.
+        """
         self.logger = logger
         self.api_key = api_key
         self.log_json = log_json
-        self.youtube = build('youtube', 'v3', developerKey=self.api_key)
-
-    def __parse_comment_api_response(self, response, comment_dataframe) -> pd.DataFrame:
+        self.show_progress = show_progress
+        self.client_factory = client_factory if client_factory else get_client_factory(api_key)
+        self.executor = executor if executor else RequestExecutor(logger)
+        self.expand_replies = expand_replies
+        self.reply_workers = reply_workers
+
+    @property
+    def youtube(self):
         """
-        Parse API response for comment query. This will grab all comments and their replies,
-        storing the resulting data in a dataframe.
+        The API client of the calling thread, built on first use. Building it
+        imports googleapiclient and loads the discovery document, which paths
+        that never make a request shouldn't pay for.
         """
-        # if the dataframe is non-null and not empty, we're appending data to the dataframe
-        append_dataframe = comment_dataframe is not None and not comment_dataframe.empty
-
-        comment_count = 0
+        return self.client_factory.client()
 
-        if append_dataframe:
-            df_index = len(comment_dataframe.index)  # last index in dataframe
-            df = comment_dataframe
-        else:  # create new dataframe
-            df_index = 0
-            df = pd.DataFrame(columns=['comment_id', 'comment', 'user', 'date', 'visible'])
+    def __execute(self, request) -> dict:
+        response = self.executor.execute(request)
 
-        for item in response['items']:
-            has_replies = 0 != item['snippet']['totalReplyCount']
+        if self.log_json:
+            with self.logger.log_file_only():
+                self.logger.info(json.dumps(response, indent=4))
 
-            comment_id = item['id']
-            comment_info = item['snippet']['topLevelComment']['snippet']
-            comment = comment_info['textDisplay']
-            user = comment_info['authorDisplayName']
-            date = comment_info['publishedAt']
-            visible = True  # this is used to track comment visibility changes
+        return response
 
-            df.loc[df_index] = [comment_id, comment, user, date, visible]
-            df_index += 1
-            comment_count += 1
-
-            if has_replies:
-                for reply in item['replies']['comments']:
-                    reply_data = reply['snippet']
+    def get_replies(self, thread_id: str) -> list:
+        """
+        Request every reply of a comment thread, returning the list of reply
+        comment resources. Safe to call from several threads at once.
+        """
+        replies = []
+        page_token = ''
 
-                    comment_id = reply['id']
-                    comment = reply_data['textDisplay']
-                    user = reply_data['authorDisplayName']
-                    date = reply_data['publishedAt']
+        while page_token is not None:
+            request = self.youtube.comments().list(
+                part='snippet',
+                parentId=thread_id,
+                pageToken=page_token,
+                maxResults=100,  # API limit is 100
+                textFormat='plainText')
 
-                    df.loc[df_index] = [comment_id, comment, user, date, visible]
-                    df_index += 1
-                    comment_count += 1
+            response = self.__execute(request)
+            replies.extend(response['items'])
+            page_token = response.get('nextPageToken')
 
-        return df, comment_count
+        return replies
 
-    def __extract_video_id_from_url(self, url: str) -> str:
+    def __parse_page(self, response, comments: CommentAccumulator, reply_pool) -> int:
         """
-        Grab the video ID from the provided URL. The ID will come after
-        the substring 'v=' in the URL, so I just split the string on that
-        substring and return the latter half.
+        Parse a page of comment threads. The replies of threads which the API
+        truncated are requested on `reply_pool`, in parallel across threads.
         """
-        video_id = url.split('v=')[1]
+        thread_ids = truncated_threads(response) if reply_pool else []
+        comment_count = parse_comment_thread_page(response, comments, skip_replies=set(thread_ids))
 
-        # validate extracted video id
-        valid_tokens = (string.ascii_uppercase +
-                        string.ascii_lowercase +
-                        string.digits + '-' + '_')
+        for replies in reply_pool.map(self.get_replies, thread_ids) if thread_ids else []:
+            comment_count += parse_replies(replies, comments)
 
-        for token in video_id:
-            if token not in valid_tokens:
-                raise ValueError('Invalid video URL provided')
+        if thread_ids:
+            self.logger.debug(f'Expanded the replies of {len(thread_ids)} threads')
 
-        return video_id
+        return comment_count
 
-    def get_comments(self, video_data) -> pd.DataFrame:
+    def get_comment_batches(self, video_data, high_water_mark=None, page_token='', pages_per_batch=None):
         """
-        Collect and store comment information in a dataframe. Collected
-        info includes:
-
-        * Username
-        * Comment text
-        * Publish date
+        Generator over the comments of a video, yielding a (dataframe, next page
+        token, page count) tuple after every `pages_per_batch` pages, and after
+        the last page. The token is where a later collection can resume from, and
+        is None after the last page. The page count is the number of pages the
+        batch was fetched from, which is less than `pages_per_batch` for the last
+        one. Without `pages_per_batch`, everything is yielded as a single batch.
+
+        Comment threads are requested newest first, starting from `page_token`.
+        If a `high_water_mark` (publishedAt, comment ID) of the newest stored
+        comment is provided, paging stops at the first page reaching back to it,
+        so only new comments are downloaded.
         """
-
-        comment_dataframe = None
-        page_token = ''
-        unfetched_comments = True
-
-        self.logger.debug('Downloading comments...')
-
         if 0 >= video_data.comment_count:
             self.logger.error(f'Received bad comment count: {video_data.comment_count}')
-            return None
+            return
 
-        with self.logger.progress_bar('Downloading comments', video_data.comment_count) as progress:
-            while unfetched_comments:
+        comments = CommentAccumulator()
+        batch_pages = 0
+        reply_pool = ThreadPoolExecutor(max_workers=self.reply_workers) if self.expand_replies else None
+
+        with reply_pool or nullcontext(), self.logger.progress_bar('Downloading comments', video_data.comment_count,
+                                                                   disable=not self.show_progress) as progress:
+            while page_token is not None:
                 request = self.youtube.commentThreads().list(
                     part='snippet,replies',
                     videoId=video_data.video_id,
                     pageToken=page_token,
                     maxResults=100,  # API limit is 100
+                    order='time',
                     textFormat='plainText')
 
+                # transient errors are retried by the executor; anything it gives
+                # up on ends the collection, since a partial comment list would
+                # make the missing comments look deleted
                 try:
-                    response = request.execute()
-                    if self.log_json:
-                        with self.logger.log_file_only():
-                            self.logger.info(json.dumps(response, indent=4))
+                    response = self.__execute(request)
+                    comments_added = self.__parse_page(response, comments, reply_pool)
+                except Exception as e:
+                    self.logger.error(f'Failed to collect comments for {video_data.video_id}: {e}')
+                    self.logger.debug(traceback.format_exc())
+                    raise
 
-                    comment_dataframe, comments_added = self.__parse_comment_api_response(response, comment_dataframe)
-                    if 'nextPageToken' in response:  # there are more comments to fetch
-                        page_token = response['nextPageToken']
-                    else:
-                        self.logger.debug("Comment collection complete")
-                        unfetched_comments = False
+                batch_pages += 1
+                reached_stored_comments = reached_high_water_mark(response, high_water_mark)
+                if 'nextPageToken' in response and not reached_stored_comments:  # there are more comments to fetch
+                    page_token = response['nextPageToken']
+                else:
+                    self.logger.debug("Comment collection complete")
+                    page_token = None
 
-                    progress.advance(comments_added)
+                progress.advance(comments_added)
 
-                except Exception as e:
-                    self.logger.error(str(e))
-                    self.logger.error(traceback.format_exc())
+                if page_token is None or batch_pages == pages_per_batch:
+                    yield comments.to_dataframe(), page_token, batch_pages
+                    comments = CommentAccumulator()
+                    batch_pages = 0
 
-            # get filtered comment count by subtracting our collected count from our expected count
-            filtered_comments = video_data.comment_count - len(comment_dataframe.index)
-            if 0 < filtered_comments:
-                video_data.filtered_comment_count = filtered_comments
             progress.complete()
 
-        return comment_dataframe
+    def get_comments(self, video_data, high_water_mark=None) -> 'pd.DataFrame':
+        """
+        Collect and store comment information in a dataframe. Collected
+        info includes:
+
+        * Username
+        * Comment text
+        * Publish date
+
+        See `get_comment_batches` for the use of `high_water_mark`. Since an
+        incremental collection is partial, the filtered comment count is left
+        untouched.
+        """
+        self.logger.debug('Downloading comments...')
+
+        batches = [df for df, _, _ in self.get_comment_batches(video_data, high_water_mark)]
+        if not batches:
+            return None
+
+        comments_df = batches[0]
+
+        # get filtered comment count by subtracting our collected count from our expected count
+        filtered_comments = video_data.comment_count - len(comments_df.index)
+        if high_water_mark is None and 0 < filtered_comments:
+            video_data.filtered_comment_count = filtered_comments
+
+        return comments_df
+
+    def __request_video_metadata(self, video_ids: list) -> list:
+        """
+        Issue a single videos.list request for up to `max_ids_per_request` IDs,
+        returning the items of the response.
+        """
+        request = self.youtube.videos().list(
+            part="snippet,contentDetails,statistics",
+            id=','.join(video_ids))
+
+        response = self.__execute(request)  # videos.list costs 1 quota unit, regardless of the ID count
+
+        return response.get('items', [])
 
     def get_video_metadata(self, url: str) -> VideoData:
         """
@@ -150,35 +330,54 @@ class YouTubeDataAPI:
         """
         self.logger.debug('Collecting video metadata...')
 
-        video_id = self.__extract_video_id_from_url(url)
+        video_id = extract_video_id(url)
         return_data = VideoData()
 
-        request = self.youtube.videos().list(
-            part="snippet,contentDetails,statistics",
-            id=video_id)
-
         try:
-            response = request.execute()
-            if self.log_json:
-                with self.logger.log_file_only():
-                    self.logger.info(json.dumps(response, indent=4))
-
-            video_data = response['items'][0]['snippet']
-            video_stats = response['items'][0]['statistics']
-
+            items = self.__request_video_metadata([video_id])
+            return_data = parse_video_item(items[0])
             return_data.video_id = video_id
-            return_data.video_title = video_data['title']
-            return_data.channel_id = video_data['channelId']
-            return_data.channel_title = video_data['channelTitle']
-            return_data.like_count = int(video_stats['likeCount'])
-            return_data.view_count = int(video_stats['viewCount'])
-            if 'commentCount' in video_stats:
-                return_data.comment_count = int(video_stats['commentCount'])
-            else:
-                return_data.comments_disabled = True
 
         except Exception as e:
             self.logger.error(str(e))
             self.logger.error(traceback.format_exc())
 
         return return_data
+
+    def get_video_metadata_batch(self, urls: list, errors=None) -> dict:
+        """
+        Collect video information for any number of video URLs/IDs, requesting
+        metadata for up to `max_ids_per_request` videos per API call.
+
+        Returns a dict mapping each video ID to its VideoData. Videos which the
+        API did not return (deleted, private or otherwise unavailable) map to
+        None, and are reported in a warning. So do the videos of requests which
+        failed; if an `errors` dict is given, it maps their IDs to the error.
+        """
+        self.logger.debug('Collecting video metadata in batches...')
+
+        # de-duplicate while preserving the order of the input
+        video_ids = list(dict.fromkeys(extract_video_id(url) for url in urls))
+        metadata = dict.fromkeys(video_ids)
+        failed = {}
+
+        for i in range(0, len(video_ids), self.max_ids_per_request):
+            chunk = video_ids[i:i + self.max_ids_per_request]
+            try:
+                for item in self.__request_video_metadata(chunk):
+                    if item.get('id') in metadata:
+                        metadata[item['id']] = parse_video_item(item)
+
+            except Exception as e:
+                self.logger.error(f'Failed to collect metadata for {len(chunk)} videos: {e}')
+                self.logger.debug(traceback.format_exc())
+                failed.update(dict.fromkeys(chunk, f'video metadata request failed: {e}'))
+
+        missing = [video_id for video_id, video_data in metadata.items() if video_data is None and video_id not in failed]
+        if missing:
+            self.logger.warning(f'Metadata unavailable for {len(missing)} videos: {", ".join(missing)}')
+
+        if errors is not None:
+            errors.update(failed)
+
+        return metadata
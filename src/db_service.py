@@ -0,0 +1,145 @@
+"""
+Shared access to the comment/video database from several threads.
+
+An AstroDB connection may only be used by the thread which opened it, so
+`DatabaseService` owns a single writer thread, which applies queued writes one
+after another on its own connection, alongside a pool of read-only
+connections which any thread can borrow for queries. As only one connection
+ever writes, writes never fail with 'database is locked', and with a
+write-ahead log storage profile, readers never wait for the writer either.
+
+Writes and reads are functions taking an AstroDB as their first argument,
+typically its methods, e.g. `service.submit(AstroDB.update_video_data, video)`.
+"""
+import queue
+import threading
+import traceback
+
+from concurrent.futures import Future
+from contextlib import contextmanager
+from src.astro_db import AstroDB
+
+# tells the writer thread to close its connection and exit
+_CLOSE = object()
+
+
+class DatabaseService:
+    logger = None
+    db_file = None
+    readers = 2
+    queue_size = 16
+
+    def __init__(self, logger, db_file: str, normalized=False, profile='durable', pragmas=None, readers=2,
+                 queue_size=16):
+        """
+        Open the database on the writer thread, creating its tables if needed,
+        then open `readers` read-only connections. See AstroDB for `normalized`,
+        `profile` and `pragmas`. Once `queue_size` writes are waiting, `submit`
+        blocks until the writer catches up.
+        """
+        if readers < 1 or queue_size < 1:
+            raise ValueError(f'Invalid database service configuration: {readers} readers, queue of {queue_size}')
+
+        self.logger = logger
+        self.db_file = db_file
+        self.readers = readers
+        self.queue_size = queue_size
+        self.__writes = queue.Queue(maxsize=queue_size)
+        self.__pool = queue.Queue()
+        self.__closed = False
+
+        opened = Future()
+        self.__writer = threading.Thread(target=self.__write_loop, args=(opened, normalized, profile, pragmas),
+                                         name='astro-db-writer', daemon=True)
+        self.__writer.start()
+
+        # raises whatever prevented the writer from opening the database
+        opened.result()
+
+        for _ in range(readers):
+            self.__pool.put(AstroDB(logger, db_file, profile=profile, pragmas=pragmas, read_only=True))
+
+    def __write_loop(self, opened: Future, normalized: bool, profile: str, pragmas):
+        """
+        Writer thread: apply queued writes in submission order until closed.
+        """
+        try:
+            db = AstroDB(self.logger, self.db_file, normalized=normalized, profile=profile, pragmas=pragmas)
+        except Exception as e:
+            opened.set_exception(e)
+            return
+
+        opened.set_result(None)
+
+        while True:
+            item = self.__writes.get()
+            if item is _CLOSE:
+                break
+
+            future, write, args, kwargs = item
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            try:
+                future.set_result(write(db, *args, **kwargs))
+            except Exception as e:
+                self.logger.debug(traceback.format_exc())
+                future.set_exception(e)
+
+        db.get_db_conn().close()
+
+    def submit(self, write, *args, **kwargs) -> Future:
+        """
+        Queue `write(db, *args, **kwargs)` to run on the writer thread, returning
+        a future of its result. Writes run in the order they were submitted.
+        """
+        if self.__closed:
+            raise RuntimeError('Database service is closed')
+
+        future = Future()
+        self.__writes.put((future, write, args, kwargs))
+        return future
+
+    def write(self, write, *args, **kwargs):
+        """
+        Run `write(db, *args, **kwargs)` on the writer thread and wait for its
+        result.
+        """
+        return self.submit(write, *args, **kwargs).result()
+
+    @contextmanager
+    def reader(self):
+        """
+        Borrow a read-only AstroDB, waiting for one to be returned if every
+        reader is in use. Only committed writes are visible to readers.
+        """
+        if self.__closed:
+            raise RuntimeError('Database service is closed')
+
+        db = self.__pool.get()
+        try:
+            yield db
+        finally:
+            self.__pool.put(db)
+
+    def read(self, query, *args, **kwargs):
+        """
+        Run `query(db, *args, **kwargs)` on a read-only connection, returning
+        its result.
+        """
+        with self.reader() as db:
+            return query(db, *args, **kwargs)
+
+    def close(self):
+        """
+        Wait for the queued writes to be applied, then close every connection.
+        """
+        if self.__closed:
+            return
+
+        self.__closed = True
+        self.__writes.put(_CLOSE)
+        self.__writer.join()
+
+        for _ in range(self.readers):
+            self.__pool.get().get_db_conn().close()
@@ -0,0 +1,327 @@
+"""
+Columnar export of the comment data.
+
+Scanning millions of comments out of SQLite, e.g. with `pd.read_sql`, decodes
+every row in Python. `CommentExporter` copies the comments into a directory of
+Parquet or Arrow IPC files instead, partitioned by channel and by the month the
+comments were published in (`channel_id=<id>/month=<YYYY-MM>/<file>`).
+`read_export` loads selected columns of an export through pyarrow, only reading
+the partitions a query selects. Files are memory-mapped, so the columns of an
+uncompressed Arrow export are used without being copied, while Parquet exports
+are smaller on disk but decoded on load.
+
+Exports are incremental: the manifest of an export directory records the last
+row exported for every video, along with the comment table holding it, and
+later exports only append the rows stored since. Rowids only have a meaning
+within their table, so once a video's comments move to another table (see
+`AstroDB.migrate_to_normalized`), its exported rows are replaced by a fresh
+export of the video. Otherwise exported rows are never rewritten, so comments
+found hidden or edited after they were exported keep their `visible` flag and
+text until the next full export.
+
+pyarrow is an optional dependency, installed with `pip install .[export]`.
+"""
+import json
+import os
+import shutil
+import time
+import uuid
+
+from typing import TYPE_CHECKING
+from src.astro_db import COMMENT_COLUMNS
+
+if TYPE_CHECKING:
+    import pyarrow as pa
+
+# records the export format and the (comment table, last exported rowid) of
+# every video. Dataset discovery skips files starting with '_'.
+MANIFEST_FILE = '_astro_export.json'
+
+# export format: (pyarrow dataset format, file extension)
+EXPORT_FORMATS = {'parquet': ('parquet', 'parquet'), 'arrow': ('ipc', 'arrow')}
+
+# directory levels of an export, outermost first
+PARTITION_COLUMNS = ['channel_id', 'month']
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.dataset
+        import pyarrow.fs
+    except ImportError:
+        raise ImportError("Exporting requires pyarrow, install it with 'pip install .[export]'") from None
+
+    return pyarrow
+
+
+def export_schema() -> 'pa.Schema':
+    pa = import_pyarrow()
+
+    return pa.schema([('channel_id', pa.string()),
+                      ('channel_title', pa.string()),
+                      ('video_id', pa.string()),
+                      ('comment_id', pa.string()),
+                      ('comment', pa.string()),
+                      ('user', pa.string()),
+                      ('date', pa.string()),
+                      ('visible', pa.int64()),
+                      ('PSentiment', pa.float64()),
+                      ('NSentiment', pa.float64()),
+                      ('month', pa.string())])
+
+
+def partition_dir(channel_id: str) -> str:
+    return f'{PARTITION_COLUMNS[0]}={channel_id or "unknown"}'
+
+
+def read_manifest(export_dir: str) -> dict:
+    with open(os.path.join(export_dir, MANIFEST_FILE)) as manifest_file:
+        return json.load(manifest_file)
+
+
+def read_export(export_dir: str, columns=None, channel_ids=None, months=None, video_ids=None) -> 'pa.Table':
+    """
+    Load the exported comments as an Arrow table, optionally restricted to
+    some `columns`, and to the given channels, months ('YYYY-MM') and videos.
+    Call `to_pandas()` on the result for a dataframe.
+    """
+    pa = import_pyarrow()
+
+    if not os.path.exists(os.path.join(export_dir, MANIFEST_FILE)):
+        raise ValueError(f'Not an Astro export: {export_dir}')
+
+    dataset_format, _ = EXPORT_FORMATS[read_manifest(export_dir)['format']]
+    schema = export_schema()
+    partitioning = pa.dataset.partitioning(pa.schema([schema.field(col) for col in PARTITION_COLUMNS]),
+                                           flavor='hive')
+    dataset = pa.dataset.dataset(os.path.abspath(export_dir), schema=schema, format=dataset_format,
+                                 partitioning=partitioning, filesystem=pa.fs.LocalFileSystem(use_mmap=True))
+
+    selection = None
+    for column, values in [('channel_id', channel_ids), ('month', months), ('video_id', video_ids)]:
+        if values is not None:
+            condition = pa.dataset.field(column).isin(list(values))
+            selection = condition if selection is None else selection & condition
+
+    return dataset.to_table(columns=columns, filter=selection)
+
+
+class ExportStats:
+    video_count: int
+    row_count: int
+    elapsed: float
+
+    def __init__(self):
+        self.video_count = 0
+        self.row_count = 0
+        self.elapsed = 0.0
+
+
+class CommentExporter:
+    logger = None
+    export_dir = None
+    export_format = 'parquet'
+    batch_size = 100000
+
+    def __init__(self, logger, db, export_dir: str, export_format='parquet', batch_size=100000):
+        """
+        Export the comments of the AstroDB `db` into `export_dir`, writing files
+        of up to `batch_size` rows. An existing export directory must hold an
+        export of the same format.
+        """
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f'Unknown export format: {export_format}')
+
+        if batch_size < 1:
+            raise ValueError(f'Invalid export batch size: {batch_size}')
+
+        import_pyarrow()
+
+        self.logger = logger
+        self.db = db
+        self.export_dir = export_dir
+        self.export_format = export_format
+        self.batch_size = batch_size
+        self.__manifest = {'format': export_format, 'watermarks': {}}
+        self.__pending = []
+        self.__pending_rows = 0
+        self.__pending_watermarks = {}
+
+        if os.path.exists(os.path.join(export_dir, MANIFEST_FILE)):
+            self.__manifest = read_manifest(export_dir)
+            if self.__manifest['format'] != export_format:
+                raise ValueError(f"{export_dir} holds an export in {self.__manifest['format']} format")
+
+    def __save_manifest(self):
+        """
+        Replace the manifest atomically, so an interrupted export never leaves
+        a partial one behind.
+        """
+        path = os.path.join(self.export_dir, MANIFEST_FILE)
+        with open(path + '.tmp', 'w') as manifest_file:
+            json.dump(self.__manifest, manifest_file)
+
+        os.replace(path + '.tmp', path)
+
+    def __clear(self):
+        """
+        Delete every exported file and forget what was exported.
+        """
+        if os.path.isdir(self.export_dir):
+            for entry in os.listdir(self.export_dir):
+                if entry.startswith(f'{PARTITION_COLUMNS[0]}='):
+                    shutil.rmtree(os.path.join(self.export_dir, entry))
+
+        self.__manifest['watermarks'] = {}
+
+    def __drop_video(self, video_id: str, channel_id: str):
+        """
+        Remove the exported rows of a video from the files of its channel,
+        deleting files which are left empty.
+        """
+        pa = import_pyarrow()
+        dataset_format, _ = EXPORT_FORMATS[self.export_format]
+
+        channel_dir = os.path.join(self.export_dir, partition_dir(channel_id))
+        if not os.path.isdir(channel_dir):
+            return
+
+        for month_dir, _, files in os.walk(channel_dir):
+            for file_name in files:
+                path = os.path.join(month_dir, file_name)
+                table = pa.dataset.dataset(path, format=dataset_format).to_table()
+                kept = table.filter(pa.compute.not_equal(table['video_id'], video_id))
+                if kept.num_rows == table.num_rows:
+                    continue
+
+                if kept.num_rows:
+                    self.__write_file(kept, path)
+                else:
+                    os.remove(path)
+
+        self.__manifest['watermarks'].pop(video_id, None)
+
+    def __write_file(self, table: 'pa.Table', path: str):
+        """
+        Replace a single export file with `table`.
+        """
+        pa = import_pyarrow()
+
+        if self.export_format == 'parquet':
+            import pyarrow.parquet
+
+            pyarrow.parquet.write_table(table, path + '.tmp')
+        else:
+            with pa.ipc.new_file(path + '.tmp', table.schema,
+                                 options=pa.ipc.IpcWriteOptions(compression=None)) as writer:
+                writer.write_table(table)
+
+        os.replace(path + '.tmp', path)
+
+    def __to_table(self, channel_id: str, channel_title: str, video_id: str, rows: list) -> 'pa.Table':
+        """
+        Convert (rowid, *COMMENT_COLUMNS) rows of a video to an Arrow table of
+        the export schema.
+        """
+        pa = import_pyarrow()
+        schema = export_schema()
+
+        columns = dict(zip(['rowid'] + COMMENT_COLUMNS, zip(*rows)))
+        arrays = {'channel_id': pa.array([channel_id or 'unknown'] * len(rows), pa.string()),
+                  'channel_title': pa.array([channel_title] * len(rows), pa.string()),
+                  'video_id': pa.array([video_id] * len(rows), pa.string())}
+        for column in COMMENT_COLUMNS:
+            arrays[column] = pa.array(columns[column], schema.field(column).type)
+
+        month = pa.compute.utf8_slice_codeunits(arrays['date'], 0, 7)
+        arrays['month'] = pa.compute.fill_null(month, 'unknown')
+
+        return pa.table(arrays, schema=schema)
+
+    def __flush(self):
+        """
+        Write the pending rows out, then record them as exported.
+        """
+        if not self.__pending:
+            return
+
+        pa = import_pyarrow()
+        dataset_format, extension = EXPORT_FORMATS[self.export_format]
+
+        # uncompressed Arrow files can be memory-mapped and used in place
+        file_options = None
+        if dataset_format == 'ipc':
+            file_options = pa.dataset.IpcFileFormat().make_write_options(compression=None)
+
+        pa.dataset.write_dataset(pa.concat_tables(self.__pending), self.export_dir, format=dataset_format,
+                                 partitioning=PARTITION_COLUMNS, partitioning_flavor='hive',
+                                 basename_template=f'part-{uuid.uuid4().hex}-{{i}}.{extension}',
+                                 existing_data_behavior='overwrite_or_ignore', file_options=file_options)
+
+        self.__manifest['watermarks'].update(self.__pending_watermarks)
+        self.__save_manifest()
+
+        self.__pending = []
+        self.__pending_rows = 0
+        self.__pending_watermarks = {}
+
+    def __export_video(self, video_id: str, channel_id: str, channel_title: str, comment_table: str) -> int:
+        """
+        Queue the rows of a video stored since its last export, writing them
+        out whenever a full batch is pending. Returns the number of rows. If
+        the rows were exported from another comment table, the video is
+        exported again from scratch.
+        """
+        row_count = 0
+        exported_table, watermark = self.__manifest['watermarks'].get(video_id, [comment_table, 0])
+
+        if exported_table != comment_table:
+            self.logger.debug(f'Comments of {video_id} moved to {comment_table}, exporting them again')
+            self.__drop_video(video_id, channel_id)
+            watermark = 0
+
+        for rows in self.db.get_comment_rows(video_id, watermark, self.batch_size):
+            self.__pending.append(self.__to_table(channel_id, channel_title, video_id, rows))
+            self.__pending_rows += len(rows)
+            self.__pending_watermarks[video_id] = [comment_table, rows[-1][0]]
+            row_count += len(rows)
+
+            if self.__pending_rows >= self.batch_size:
+                self.__flush()
+
+        return row_count
+
+    def export(self, video_ids=None, full=False) -> ExportStats:
+        """
+        Export the comments of the given videos (by default, every video)
+        stored since their last export. A `full` export empties the export
+        directory first and exports every comment again, and can't be limited
+        to some videos.
+        """
+        if full and video_ids is not None:
+            raise ValueError('A full export covers every video')
+
+        stats = ExportStats()
+        start = time.perf_counter()
+
+        if full:
+            self.__clear()
+
+        os.makedirs(self.export_dir, exist_ok=True)
+
+        for video_id, channel_id, channel_title, comment_table in self.db.get_videos():
+            if video_ids is None or video_id in video_ids:
+                row_count = self.__export_video(video_id, channel_id, channel_title, comment_table)
+                stats.row_count += row_count
+                stats.video_count += 1 if row_count else 0
+
+        self.__flush()
+        self.__save_manifest()
+
+        stats.elapsed = time.perf_counter() - start
+        self.logger.info(f'Exported {stats.row_count} comments of {stats.video_count} videos to {self.export_dir} ' +
+                         f'in {stats.elapsed:.1f}s')
+
+        return stats
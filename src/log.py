@@ -5,12 +5,16 @@ import logging
 
 from rich.logging import RichHandler
 from rich.console import Console
+from rich.markup import escape
 from rich.table import Table
 from rich.theme import Theme
 from contextlib import contextmanager
 
 from src.progress import AstroProgress
 
+# marks the matched words of comment search snippets, see print_comment_matches
+SNIPPET_HIGHLIGHT = ('\x02', '\x03')
+
 
 class AstroLogger(logging.Logger):
     log_level_str: str
@@ -68,11 +72,13 @@ class AstroLogger(logging.Logger):
             if logger_name.startswith(name):
                 logging.getLogger(logger_name).setLevel(level)
 
-    def progress_bar(self, task_str: str, steps: int):
+    def progress_bar(self, task_str: str, steps: int, disable=False):
         """
-        Display a progress bar on the console.
+        Display a progress bar on the console. A disabled progress bar tracks
+        progress without rendering anything, which is needed when several
+        collections run concurrently.
         """
-        self.progress = AstroProgress(task_str, steps, console=self.console)
+        self.progress = AstroProgress(task_str, steps, console=self.console, disable=disable)
         return self.progress
 
     def get_log_level(self, log_level: str) -> int:
@@ -154,6 +160,23 @@ class AstroLogger(logging.Logger):
 
         self.console.print(table)
 
+    def print_comment_matches(self, matches: list, title=''):
+        """
+        Print comment search results in rich.Table format, best match first.
+        Matched words, marked with the SNIPPET_HIGHLIGHT pair, are shown in bold.
+        """
+        start, end = SNIPPET_HIGHLIGHT
+        table = self.__rich_table(title)
+
+        for col in ['video_id', 'user', 'date', 'visible', 'comment']:
+            table.add_column(col)
+
+        for match in matches:
+            snippet = escape(match.snippet).replace(start, '[bold]').replace(end, '[/bold]')
+            table.add_row(escape(match.video_id), escape(match.user), match.date, str(match.visible), snippet)
+
+        self.console.print(table)
+
     @contextmanager
     def log_file_only(self):
         """
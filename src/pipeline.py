@@ -0,0 +1,165 @@
+"""
+Streaming collection of the comments of a single video.
+
+Comment batches are fetched, scored and stored by three concurrent stages: a
+fetch thread pages through the API, a scoring thread runs the sentiment
+analysis, and the calling thread, which owns the database connection, stores
+the scored batches. While one batch is being scored and stored, the next page
+is already in flight.
+
+The stages are connected by bounded queues, so a slow stage holds back the
+ones before it, and no more than a few batches are held in memory at once,
+however many comments the video has.
+"""
+import queue
+import threading
+import time
+import traceback
+
+# marks the end of the stream of batches
+_DONE = object()
+
+
+class StageError:
+    """
+    Exception raised by a stage, passed down the pipeline to the calling thread.
+    """
+    def __init__(self, stage: str, error: BaseException):
+        self.stage = stage
+        self.error = error
+
+
+class PipelineStats:
+    batch_count: int
+    comment_count: int
+    store_wait: float
+    elapsed: float
+
+    def __init__(self):
+        self.batch_count = 0
+        self.comment_count = 0
+        self.store_wait = 0.0
+        self.elapsed = 0.0
+
+
+class CommentPipeline:
+    logger = None
+    queue_size = 2
+
+    def __init__(self, logger, score, store, queue_size=2):
+        """
+        `score(df)` adds the sentiment columns to a batch of comments, and is
+        only called from the scoring thread. `store(df, next_page_token,
+        page_count)` persists a scored batch fetched from `page_count` pages,
+        and is only called from the thread running the pipeline. `queue_size` is the number of batches each queue holds.
+        """
+        if queue_size < 1:
+            raise ValueError(f'Invalid pipeline queue size: {queue_size}')
+
+        self.logger = logger
+        self.score = score
+        self.store = store
+        self.queue_size = queue_size
+        self.__stopped = threading.Event()
+
+    def __put(self, out_queue: queue.Queue, item) -> bool:
+        """
+        Put `item` on a queue, waiting for room unless the pipeline is stopped.
+        """
+        while not self.__stopped.is_set():
+            try:
+                out_queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+
+        return False
+
+    def __fetch(self, batches, out_queue: queue.Queue):
+        """
+        Fetch stage: feed the (dataframe, next page token, page count) batches
+        downstream.
+        """
+        try:
+            for batch in batches:
+                if not self.__put(out_queue, batch):
+                    return
+
+        except BaseException as e:
+            self.logger.debug(traceback.format_exc())
+            self.__put(out_queue, StageError('fetch', e))
+            return
+
+        finally:
+            # runs the generator's cleanup when the pipeline stops early
+            if hasattr(batches, 'close'):
+                batches.close()
+
+        self.__put(out_queue, _DONE)
+
+    def __score(self, in_queue: queue.Queue, out_queue: queue.Queue):
+        """
+        Scoring stage: add sentiment to every batch and pass it on.
+        """
+        while not self.__stopped.is_set():
+            try:
+                item = in_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            if item is not _DONE and not isinstance(item, StageError):
+                try:
+                    if not item[0].empty:
+                        self.score(item[0])
+                except BaseException as e:
+                    self.logger.debug(traceback.format_exc())
+                    item = StageError('sentiment', e)
+
+            if not self.__put(out_queue, item) or item is _DONE or isinstance(item, StageError):
+                return
+
+    def run(self, batches) -> PipelineStats:
+        """
+        Fetch, score and store every batch yielded by `batches`. An exception
+        raised by any stage stops the pipeline and is re-raised here; batches
+        stored before it stay stored.
+        """
+        stats = PipelineStats()
+        start = time.perf_counter()
+
+        self.__stopped.clear()
+        fetched = queue.Queue(maxsize=self.queue_size)
+        scored = queue.Queue(maxsize=self.queue_size)
+
+        # daemon threads, so that a request in flight can't hold up an interrupted run
+        threads = [threading.Thread(target=self.__fetch, args=(batches, fetched), name='astro-fetch', daemon=True),
+                   threading.Thread(target=self.__score, args=(fetched, scored), name='astro-score', daemon=True)]
+        for thread in threads:
+            thread.start()
+
+        try:
+            while True:
+                wait_start = time.perf_counter()
+                item = scored.get()
+                stats.store_wait += time.perf_counter() - wait_start
+
+                if item is _DONE:
+                    break
+
+                if isinstance(item, StageError):
+                    self.logger.debug(f'Comment pipeline stopped by the {item.stage} stage')
+                    raise item.error
+
+                comments_df, next_page_token, page_count = item
+                self.store(comments_df, next_page_token, page_count)
+                stats.batch_count += 1
+                stats.comment_count += len(comments_df.index)
+
+        finally:
+            self.__stopped.set()
+
+        for thread in threads:
+            thread.join()
+
+        stats.elapsed = time.perf_counter() - start
+        return stats
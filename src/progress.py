@@ -15,7 +15,7 @@ class AstroProgress(Progress):
     total_steps: int
     task: int
 
-    def __init__(self, task_str: str, steps: int, console=None):
+    def __init__(self, task_str: str, steps: int, console=None, disable=False):
         self.task_str = task_str
         self.total_steps = steps
 
@@ -27,7 +27,8 @@ class AstroProgress(Progress):
             TimeElapsedColumn(),
             TextColumn("•", style=console.get_style('log.message')),
             TimeRemainingColumn(),
-            console=console)
+            console=console,
+            disable=disable)
 
         self.task = super().add_task(f"[{console.get_style('log.message')}]" + task_str, total=self.total_steps)
 
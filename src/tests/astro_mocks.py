@@ -1,6 +1,14 @@
 """
 This file will contain all mock classes used for testing.
 """
+import json
+import time
+import threading
+import http.server
+import urllib.parse
+import httplib2
+
+from googleapiclient.errors import HttpError
 
 
 class MockSqlite3Cursor:
@@ -28,5 +36,137 @@ class MockSqlite3Connection:
     def cursor(self):
         return MockSqlite3Cursor(self.return_value)
 
+    def create_function(self, *args, **kwargs):
+        return
+
     def commit(self):
         return
+
+
+class MockAPIRequestHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep connections alive
+    disable_nagle_algorithm = True
+    wbufsize = 1 << 16  # send headers and body together
+
+    def setup(self):
+        super().setup()
+        self.server.count_connection()
+
+    def do_GET(self):
+        url = urllib.parse.urlparse(self.path)
+        resource = url.path.rstrip('/').split('/')[-1]
+        query = urllib.parse.parse_qs(url.query)
+        page_token = query.get('pageToken', [''])[0]
+        if 'parentId' in query:
+            resource += '/' + query['parentId'][0]
+
+        self.server.begin_request()
+        try:
+            status, body = self.server.get_response(resource, page_token)
+        finally:
+            self.server.end_request()
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        return
+
+
+class MockAPIServer(http.server.ThreadingHTTPServer):
+    """
+    Local stand-in for the YouTube Data API, serving canned JSON responses keyed
+    by resource name (e.g. 'commentThreads'). A resource mapped to a list of
+    pages chained by `nextPageToken` is served page by page, following the
+    `pageToken` query parameter. The replies of a thread are served from the
+    'comments/<thread id>' resource. `handshake_delay` seconds are spent on every
+    new connection to emulate the cost of a TLS handshake, and `latency`
+    seconds on every request.
+    """
+    daemon_threads = True
+
+    def __init__(self, responses: dict, handshake_delay=0.0, latency=0.0):
+        super().__init__(('127.0.0.1', 0), MockAPIRequestHandler)
+        self.responses = {}
+        for resource, response in responses.items():
+            pages = response if isinstance(response, list) else [response]
+            tokens = [''] + [page.get('nextPageToken') for page in pages[:-1]]
+            self.responses[resource] = {token: json.dumps(page).encode('utf-8') for token, page in zip(tokens, pages)}
+
+        self.handshake_delay = handshake_delay
+        self.latency = latency
+        self.connection_count = 0
+        self.request_count = 0
+        self.active_requests = 0
+        self.max_active_requests = 0
+        self.fail_requests = 0  # number of upcoming requests to answer with a 503
+        self.__lock = threading.Lock()
+        self.__thread = None
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}/'
+
+    def count_connection(self):
+        with self.__lock:
+            self.connection_count += 1
+
+        time.sleep(self.handshake_delay)
+
+    def begin_request(self):
+        with self.__lock:
+            self.request_count += 1
+            self.active_requests += 1
+            self.max_active_requests = max(self.max_active_requests, self.active_requests)
+
+        time.sleep(self.latency)
+
+    def end_request(self):
+        with self.__lock:
+            self.active_requests -= 1
+
+    def get_response(self, resource: str, page_token: str) -> tuple:
+        with self.__lock:
+            if self.fail_requests:
+                self.fail_requests -= 1
+                return 503, b'{"error": {"code": 503, "errors": [{"reason": "backendError"}]}}'
+
+        body = self.responses.get(resource, {}).get(page_token)
+        if body is None:
+            return 404, b'{"error": "not found"}'
+
+        return 200, body
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        self.__thread.join()
+
+
+def make_http_error(status, reason=None, retry_after=None) -> HttpError:
+    """
+    Build the HttpError googleapiclient raises for an API error response.
+    """
+    info = {'status': str(status)}
+    if retry_after:
+        info['retry-after'] = retry_after
+
+    errors = [{'reason': reason}] if reason else []
+    content = json.dumps({'error': {'code': status, 'errors': errors}}).encode('utf-8')
+
+    return HttpError(httplib2.Response(info), content)
+
+
+def add_fake_sentiment(df, show_progress=True, rows=None):
+    if rows is None:
+        rows = slice(None)
+
+    df.loc[rows, 'PSentiment'] = 0.0
+    df.loc[rows, 'NSentiment'] = 0.0
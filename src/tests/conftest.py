@@ -1,13 +1,20 @@
+import copy
 import pytest
 import json
-import googleapiclient
+import googleapiclient.http
 import logging
 
 import pandas as pd
 import src.tests.test_api_responses as api_responses
+from urllib.parse import unquote
 from unittest.mock import MagicMock
+from src.db_service import DatabaseService
 from src.log import AstroLogger
 from src.theme import AstroTheme
+from src.tests.astro_mocks import MockAPIServer, make_http_error
+
+# the mock_*_google_http_request fixtures replace this for the rest of the session
+real_http_request_execute = googleapiclient.http.HttpRequest.execute
 
 
 @pytest.fixture(scope='function')
@@ -68,3 +75,51 @@ def mock_comment_google_http_request(api_comment_response):
 def mock_video_google_http_request(api_video_response):
     mock = googleapiclient.http.HttpRequest
     mock.execute = MagicMock(return_value=api_video_response)
+
+
+@pytest.fixture(scope='function')
+def mock_api_server(monkeypatch, api_comment_response, api_video_response):
+    """
+    Local HTTP server serving the canned API responses, for tests which need
+    requests to go over a real connection.
+    """
+    monkeypatch.setattr(googleapiclient.http.HttpRequest, 'execute', real_http_request_execute)
+
+    server = MockAPIServer({'commentThreads': api_comment_response, 'videos': api_video_response})
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(scope='function')
+def batch_db(logger, tmp_path):
+    service = DatabaseService(logger, str(tmp_path / 'batch.db'))
+    yield service
+    service.close()
+
+
+@pytest.fixture(scope='function')
+def mock_batch_http_request(monkeypatch, api_video_response, api_comment_response):
+    """
+    Serve the canned video/comment responses, keyed on the requested video id.
+    Video ids starting with 'missing' are not returned by the API, and the
+    comments of those starting with 'quota' exceed the API quota.
+    """
+    def execute(request, *args, **kwargs):
+        if 'commentThreads' in request.uri:
+            if 'videoId=quota' in request.uri:
+                raise make_http_error(403, 'quotaExceeded')
+
+            return copy.deepcopy(api_comment_response)
+
+        video_ids = unquote(request.uri.split('id=')[1].split('&')[0]).split(',')
+        response = copy.deepcopy(api_video_response)
+        item = response['items'][0]
+        response['items'] = []
+        for video_id in video_ids:
+            if not video_id.startswith('missing'):
+                response['items'].append(dict(item, id=video_id))
+
+        return response
+
+    monkeypatch.setattr(googleapiclient.http.HttpRequest, 'execute', execute)
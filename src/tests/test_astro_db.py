@@ -2,10 +2,14 @@ import pytest
 import sqlite3
 import os
 
+import pandas as pd
+
 from unittest.mock import MagicMock
 
 # Astro modules
-from src.astro_db import AstroDB
+from src import astro_db as astro_db_module
+from src.astro_db import AstroDB, comment_hash
+from src.data_collection.data_structures import VideoData
 from src.tests.test_objects import test_video_data
 from src.tests.astro_mocks import MockSqlite3Connection
 
@@ -274,3 +278,508 @@ class TestAstroDB:
             assert db_entry[5] == video_data.like_count
             assert db_entry[6] == video_data.comment_count
             assert db_entry[7] == video_data.filtered_comment_count
+
+    def test_high_water_mark(self, astro_db, comment_dataframe):
+        video_id = 'hwm_video_id'
+        assert astro_db.get_high_water_mark(video_id) is None
+
+        astro_db.update_high_water_mark(video_id, comment_dataframe)
+        assert astro_db.get_high_water_mark(video_id) == ('2023-10-23T20:05:89Z', 'UgwJuUmFZtOgkjrCrlp4AaABAg')
+
+        # an older set of comments must not move the mark backwards
+        astro_db.update_high_water_mark(video_id, comment_dataframe.drop(1))
+        assert astro_db.get_high_water_mark(video_id) == ('2023-10-23T20:05:89Z', 'UgwJuUmFZtOgkjrCrlp4AaABAg')
+
+        comment_dataframe.loc[3] = ['new_comment_id', 'new comment', '@user4', '2024-01-01T00:00:00Z', 1]
+        astro_db.update_high_water_mark(video_id, comment_dataframe)
+        assert astro_db.get_high_water_mark(video_id) == ('2024-01-01T00:00:00Z', 'new_comment_id')
+
+        # replies never set the mark, even when newer than every thread
+        comment_dataframe.loc[4] = ['new_comment_id.reply_id', 'new reply', '@user5', '2024-02-01T00:00:00Z', 1]
+        astro_db.update_high_water_mark(video_id, comment_dataframe)
+        assert astro_db.get_high_water_mark(video_id) == ('2024-01-01T00:00:00Z', 'new_comment_id')
+
+    def test_quota_used(self, astro_db):
+        assert astro_db.get_quota_used('2024-05-01') == 0
+
+        astro_db.add_quota_used('2024-05-01', 120)
+        astro_db.add_quota_used('2024-05-01', 30)
+        astro_db.add_quota_used('2024-05-02', 5)
+
+        assert astro_db.get_quota_used('2024-05-01') == 150
+        assert astro_db.get_quota_used('2024-05-02') == 5
+
+    @pytest.mark.parametrize('video_data', [test_video_data[1]])
+    def test_incremental_insert(self, astro_db, comment_dataframe, video_data):
+        conn = astro_db.get_db_conn()
+        cursor = conn.cursor()
+
+        astro_db.insert_comment_dataframe(video_data, comment_dataframe)
+        comment_table = self.__get_comment_table_for_video_data(conn, video_data)
+        orig_comment_count = self.__get_table_row_count(conn, comment_table)
+
+        # an incremental update only holds the newest comments
+        new_comments = comment_dataframe.iloc[0:0].copy()
+        new_comments.loc[0] = ['incremental_id', 'new comment', '@user4', '2024-01-01T00:00:00Z', 1]
+        astro_db.insert_comment_dataframe(video_data, new_comments, incremental=True)
+
+        cursor.execute(f"SELECT COUNT(*) FROM {comment_table} WHERE visible=FALSE")
+        assert cursor.fetchone()[0] == 0
+        assert self.__get_table_row_count(conn, comment_table) == orig_comment_count + 1
+
+    @pytest.mark.parametrize('normalized', [False, True])
+    def test_quoted_values(self, logger, tmp_path, comment_dataframe, normalized):
+        db = AstroDB(logger, str(tmp_path / 'quotes.db'), normalized=normalized)
+        video_data = VideoData(video_id='quoted_id', channel_id='channel_id', channel_title="Rock 'n' Roll \"Radio\"",
+                               view_count=10, like_count=2, comment_count=3)
+
+        db.insert_comment_dataframe(video_data, comment_dataframe)
+        db.update_video_data(video_data)
+
+        stored = db.get_video_data("quoted_id")
+        assert stored.channel_title == video_data.channel_title
+        assert stored.view_count == 10
+        assert db.get_video_data("' OR '1'='1") is None
+
+    @pytest.mark.parametrize('normalized', [False, True])
+    def test_merge_duplicate_comments(self, logger, tmp_path, comment_dataframe, normalized):
+        db = AstroDB(logger, str(tmp_path / 'merge.db'), normalized=normalized)
+        video_data = test_video_data[2]
+
+        db.insert_comment_dataframe(video_data, comment_dataframe.drop(2))
+
+        # the API may return a comment twice when comments shift between pages
+        duplicated = pd.concat([comment_dataframe, comment_dataframe.loc[[2]]], ignore_index=True)
+        db.insert_comment_dataframe(video_data, duplicated)
+
+        cursor = db.get_db_conn().cursor()
+        table = 'Comments' if normalized else self.__get_comment_table_for_video_data(db.get_db_conn(), video_data)
+        cursor.execute(f"SELECT comment_id, COUNT(*) FROM {table} GROUP BY comment_id")
+        counts = dict(cursor.fetchall())
+
+        assert counts == {comment_id: 1 for comment_id in comment_dataframe['comment_id']}
+
+    @pytest.mark.parametrize('normalized', [False, True])
+    def test_get_comment_rows(self, logger, tmp_path, comment_dataframe, normalized):
+        db = AstroDB(logger, str(tmp_path / 'rows.db'), normalized=normalized)
+        video1, video2 = test_video_data[1], test_video_data[2]
+
+        db.insert_comment_dataframe(video1, comment_dataframe)
+        db.insert_comment_dataframe(video2, comment_dataframe.drop(0))
+
+        assert [video[0] for video in db.get_videos()] == [video1.video_id, video2.video_id]
+
+        batches = list(db.get_comment_rows(video1.video_id, batch_size=2))
+        assert [len(rows) for rows in batches] == [2, 1]
+        assert [row[1] for row in batches[0] + batches[1]] == list(comment_dataframe['comment_id'])
+
+        # only the rows stored after the given one
+        after = batches[0][-1][0]
+        assert [row[1] for rows in db.get_comment_rows(video1.video_id, after) for row in rows] == \
+            [comment_dataframe.loc[2, 'comment_id']]
+
+        assert not list(db.get_comment_rows('unknown_id'))
+
+
+class TestAstroDBNormalized:
+    def __get_comments(self, db, video_id):
+        cursor = db.get_db_conn().cursor()
+        cursor.execute("SELECT comment_id, visible FROM Comments WHERE video_id=? ORDER BY comment_id", (video_id,))
+        return cursor.fetchall()
+
+    def test_create_comments_table(self, logger, tmp_path):
+        db = AstroDB(logger, str(tmp_path / 'normalized.db'), normalized=True)
+        cursor = db.get_db_conn().cursor()
+
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='index' AND tbl_name='Comments'")
+        indexes = [row[0] for row in cursor.fetchall()]
+
+        assert 'idx_comments_video_date' in indexes
+        assert 'idx_comments_date' in indexes
+        assert 'idx_comments_user' in indexes
+
+        # databases containing the Comments table are always opened as normalized
+        assert AstroDB(logger, str(tmp_path / 'normalized.db')).normalized
+
+    def test_insert_comment_dataframe(self, logger, tmp_path, comment_dataframe):
+        db = AstroDB(logger, str(tmp_path / 'normalized.db'), normalized=True)
+        video1, video2 = test_video_data[1], test_video_data[2]
+
+        db.insert_comment_dataframe(video1, comment_dataframe)
+        db.insert_comment_dataframe(video2, comment_dataframe.drop(0))
+
+        assert len(self.__get_comments(db, video1.video_id)) == 3
+        assert len(self.__get_comments(db, video2.video_id)) == 2
+        assert db.get_video_data(video1.video_id)
+
+        # hiding a comment on one video must not affect the other
+        hidden_id = comment_dataframe.loc[1, 'comment_id']
+        db.insert_comment_dataframe(video1, comment_dataframe.drop(1))
+
+        assert (hidden_id, 0) in self.__get_comments(db, video1.video_id)
+        assert (hidden_id, 1) in self.__get_comments(db, video2.video_id)
+
+        # no new table is created per video
+        cursor = db.get_db_conn().cursor()
+        cursor.execute("SELECT DISTINCT comment_table FROM Videos")
+        assert cursor.fetchall() == [('Comments',)]
+
+    def test_migrate_to_normalized(self, logger, tmp_path, comment_dataframe):
+        db_file = str(tmp_path / 'legacy.db')
+        db = AstroDB(logger, db_file)
+        video1, video2 = test_video_data[1], test_video_data[2]
+
+        db.insert_comment_dataframe(video1, comment_dataframe)
+        db.insert_comment_dataframe(video2, comment_dataframe.drop(0))
+        db.insert_comment_dataframe(video2, comment_dataframe.drop([0, 1]))  # hide a comment
+
+        assert not db.normalized
+        assert db.migrate_to_normalized() == 2
+        assert db.normalized
+
+        assert len(self.__get_comments(db, video1.video_id)) == 3
+        assert (comment_dataframe.loc[1, 'comment_id'], 0) in self.__get_comments(db, video2.video_id)
+
+        # per-video tables are gone, and all videos point at the shared table
+        cursor = db.get_db_conn().cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name IN ('AAA', 'BAA')")
+        assert not cursor.fetchall()
+
+        cursor.execute("SELECT DISTINCT comment_table FROM Videos")
+        assert cursor.fetchall() == [('Comments',)]
+
+        # migrating again is a no-op, and merges keep working afterwards
+        assert db.migrate_to_normalized() == 0
+
+        db = AstroDB(logger, db_file)
+        comment_dataframe.loc[3] = ['new_id', 'new comment', '@user4', '2024-01-01T00:00:00Z', 1]
+        db.insert_comment_dataframe(video1, comment_dataframe)
+        assert len(self.__get_comments(db, video1.video_id)) == 4
+
+
+@pytest.mark.parametrize('normalized', [False, True])
+class TestAstroDBCheckpoints:
+    def __get_comments(self, db, video_data):
+        cursor = db.get_db_conn().cursor()
+        cursor.execute("SELECT comment_table FROM Videos WHERE video_id=?", (video_data.video_id,))
+        cursor.execute(f"SELECT comment_id, visible FROM {cursor.fetchone()[0]}")
+        return dict(cursor.fetchall())
+
+    def test_store_comment_batch(self, logger, tmp_path, comment_dataframe, normalized):
+        db = AstroDB(logger, str(tmp_path / 'checkpoint.db'), normalized=normalized)
+        video_data = test_video_data[1]
+
+        assert db.get_checkpoint(video_data.video_id) is None
+
+        db.store_comment_batch(video_data, comment_dataframe.loc[0:1], 'page_3', 2)
+        assert db.get_checkpoint(video_data.video_id) == ('page_3', 2, 2)
+
+        # storing a batch again must not duplicate its comments
+        db.store_comment_batch(video_data, comment_dataframe.loc[1:2], None, 3)
+        assert db.get_checkpoint(video_data.video_id) == (None, 3, 4)
+        assert len(self.__get_comments(db, video_data)) == 3
+
+        assert db.finish_comment_collection(video_data) == 4
+        assert db.get_checkpoint(video_data.video_id) is None
+        assert db.get_high_water_mark(video_data.video_id) == ('2023-10-23T20:05:89Z', 'UgwJuUmFZtOgkjrCrlp4AaABAg')
+
+        # a reply newer than the newest thread doesn't move the mark past it
+        reply = comment_dataframe.loc[[0]].assign(comment_id='UgyMLcxXS1Id2SaBuJd4AaABAg.reply', date='2024-01-01T00:00:00Z')
+        db.store_comment_batch(video_data, reply, None, 1)
+        db.finish_comment_collection(video_data)
+        assert db.get_high_water_mark(video_data.video_id) == ('2023-10-23T20:05:89Z', 'UgwJuUmFZtOgkjrCrlp4AaABAg')
+
+    def test_finish_detects_hidden_comments(self, logger, tmp_path, comment_dataframe, normalized):
+        db = AstroDB(logger, str(tmp_path / 'checkpoint.db'), normalized=normalized)
+        video_data = test_video_data[1]
+
+        db.insert_comment_dataframe(video_data, comment_dataframe)
+
+        hidden_id = comment_dataframe.loc[1, 'comment_id']
+        db.store_comment_batch(video_data, comment_dataframe.loc[[0]], 'page_2', 1)
+        db.store_comment_batch(video_data, comment_dataframe.loc[[2]], None, 2)
+        db.finish_comment_collection(video_data, detect_hidden=True)
+
+        comments = self.__get_comments(db, video_data)
+        assert comments[hidden_id] == 0
+        assert sum(comments.values()) == 2
+
+    def test_resume_from_checkpoint(self, logger, tmp_path, comment_dataframe, normalized):
+        db_file = str(tmp_path / 'checkpoint.db')
+        video_data = test_video_data[1]
+
+        db = AstroDB(logger, db_file, normalized=normalized)
+        db.store_comment_batch(video_data, comment_dataframe.loc[[0]], 'page_2', 1)
+        db.get_db_conn().close()  # interrupted
+
+        db = AstroDB(logger, db_file)
+        assert db.get_checkpoint(video_data.video_id) == ('page_2', 1, 1)
+
+        db.store_comment_batch(video_data, comment_dataframe.loc[1:2], None, 2)
+        assert db.finish_comment_collection(video_data) == 3
+
+        # the comments stored before the interruption weren't seen by this
+        # connection, but a resumed collection doesn't flag them as hidden
+        assert self.__get_comments(db, video_data) == {comment_id: 1 for comment_id in comment_dataframe['comment_id']}
+
+
+class TestAstroDBStorage:
+    def __pragma(self, db, name):
+        cursor = db.get_db_conn().cursor()
+        cursor.execute(f"PRAGMA {name}")
+        return cursor.fetchone()[0]
+
+    def test_default_profile(self, logger, tmp_path):
+        db = AstroDB(logger, str(tmp_path / 'default.db'))
+
+        assert self.__pragma(db, 'journal_mode') == 'delete'
+        assert self.__pragma(db, 'synchronous') == 2  # FULL
+
+    def test_fast_profile(self, logger, tmp_path):
+        db = AstroDB(logger, str(tmp_path / 'fast.db'), profile='fast', pragmas={'cache_size': -1024})
+
+        assert self.__pragma(db, 'journal_mode') == 'wal'
+        assert self.__pragma(db, 'synchronous') == 1  # NORMAL
+        assert self.__pragma(db, 'temp_store') == 2  # MEMORY
+        assert self.__pragma(db, 'busy_timeout') == 5000
+        assert self.__pragma(db, 'cache_size') == -1024
+
+    @pytest.mark.parametrize('profile, pragmas', [('unknown', None),
+                                                  ('fast', {'page_size': 1024}),
+                                                  ('fast', {'cache_size': '1; DROP TABLE Videos'})])
+    def test_invalid_settings(self, logger, tmp_path, profile, pragmas):
+        with pytest.raises(ValueError):
+            AstroDB(logger, str(tmp_path / 'invalid.db'), profile=profile, pragmas=pragmas)
+
+    @pytest.mark.parametrize('profile', ['durable', 'fast'])
+    def test_reader_does_not_block_writer(self, logger, tmp_path, comment_dataframe, profile):
+        db_file = str(tmp_path / 'wal.db')
+        db = AstroDB(logger, db_file, profile=profile)
+        db.insert_comment_dataframe(test_video_data[1], comment_dataframe.drop(2))
+
+        # a reader holding a read transaction open, e.g. a dashboard
+        reader = sqlite3.connect(db_file, timeout=0.1)
+        reader.execute("BEGIN")
+        assert reader.execute("SELECT COUNT(*) FROM Videos").fetchone()[0] == 1
+
+        db.insert_comment_dataframe(test_video_data[1], comment_dataframe)
+        db.update_video_data(test_video_data[1])
+
+        # the reader keeps its snapshot until its transaction ends
+        assert reader.execute("SELECT COUNT(*) FROM AAA").fetchone()[0] == 2
+        reader.rollback()
+        assert reader.execute("SELECT COUNT(*) FROM AAA").fetchone()[0] == 3
+        reader.close()
+
+
+@pytest.mark.parametrize('normalized', [False, True])
+class TestAstroDBSearch:
+    def __comment_ids(self, matches) -> list:
+        return [match.comment_id for match in matches]
+
+    def test_create_search_index(self, logger, tmp_path, comment_dataframe, normalized):
+        db_file = str(tmp_path / 'search.db')
+        db = AstroDB(logger, db_file, normalized=normalized)
+        db.insert_comment_dataframe(test_video_data[1], comment_dataframe)
+        db.insert_comment_dataframe(test_video_data[2], comment_dataframe.drop(0))
+
+        with pytest.raises(ValueError):
+            db.search_comments('terrible')
+
+        assert db.create_search_index() == 5
+        assert db.create_search_index() == 0
+
+        matches = db.search_comments('terrible')
+        assert len(matches) == 2
+        assert {match.video_id for match in matches} == {test_video_data[1].video_id, test_video_data[2].video_id}
+        assert matches[0].snippet == 'this is [terrible]'
+        assert matches[0].comment == 'this is terrible'
+        assert matches[0].channel_id in {test_video_data[1].channel_id, test_video_data[2].channel_id}
+
+        # users are indexed too, and the index is found again on reopening
+        db = AstroDB(logger, db_file)
+        assert db.searchable
+        assert self.__comment_ids(db.search_comments('user1')) == [comment_dataframe.loc[0, 'comment_id']]
+
+    def test_incremental_indexing(self, logger, tmp_path, comment_dataframe, normalized):
+        db = AstroDB(logger, str(tmp_path / 'search.db'), normalized=normalized)
+        video_data = test_video_data[1]
+
+        db.insert_comment_dataframe(video_data, comment_dataframe.drop(2))
+        db.create_search_index()
+
+        # new comments are indexed as they are stored, and merges don't index
+        # stored comments again
+        db.insert_comment_dataframe(video_data, comment_dataframe)
+        db.store_comment_batch(test_video_data[2], comment_dataframe.loc[[2]], None, 1)
+
+        matches = db.search_comments('awesome')
+        assert sorted(match.video_id for match in matches) == sorted([video_data.video_id, test_video_data[2].video_id])
+        assert len(db.search_comments('this')) == 3
+
+    def test_hidden_comments(self, logger, tmp_path, comment_dataframe, normalized):
+        db = AstroDB(logger, str(tmp_path / 'search.db'), normalized=normalized)
+        video_data = test_video_data[1]
+
+        db.insert_comment_dataframe(video_data, comment_dataframe)
+        db.create_search_index()
+        db.insert_comment_dataframe(video_data, comment_dataframe.drop(1))  # hides 'this is terrible'
+
+        hidden_id = comment_dataframe.loc[1, 'comment_id']
+        assert self.__comment_ids(db.search_comments('this', visible=False)) == [hidden_id]
+        assert hidden_id not in self.__comment_ids(db.search_comments('this', visible=True))
+        assert not db.search_comments('this', visible=False)[0].visible
+        assert len(db.search_comments('this')) == 2
+
+    def test_search_filters(self, logger, tmp_path, comment_dataframe, normalized):
+        db = AstroDB(logger, str(tmp_path / 'search.db'), normalized=normalized)
+        db.create_search_index()
+        db.insert_comment_dataframe(test_video_data[1], comment_dataframe)
+        db.insert_comment_dataframe(test_video_data[2], comment_dataframe)
+
+        assert len(db.search_comments('this', channel_ids=[test_video_data[2].channel_id])) == 2
+        assert len(db.search_comments('this', channel_ids=[test_video_data[1].channel_id, 'unknown'])) == 2
+        assert len(db.search_comments('this', since='2023-01-01')) == 2
+        assert len(db.search_comments('this', before='2023-01-01')) == 2
+        assert len(db.search_comments('this', limit=3)) == 3
+        assert not db.search_comments('hello', since='2023-01-01')
+
+        # FTS5 query syntax
+        assert len(db.search_comments('awesome OR hello')) == 4
+        assert len(db.search_comments('th*')) == 6
+        assert db.search_comments('hello', highlight=('<b>', '</b>'))[0].snippet == '<b>hello</b> there'
+
+    def test_search_after_migration(self, logger, tmp_path, comment_dataframe, normalized):
+        db = AstroDB(logger, str(tmp_path / 'search.db'), normalized=normalized)
+        db.insert_comment_dataframe(test_video_data[1], comment_dataframe.drop(2))
+        db.create_search_index()
+
+        db.migrate_to_normalized()
+        db.insert_comment_dataframe(test_video_data[1], comment_dataframe)
+
+        assert len(db.search_comments('this')) == 2
+
+
+@pytest.mark.parametrize('normalized', [False, True])
+class TestAstroDBEdits:
+    def __get_comments(self, db, video_data) -> dict:
+        cursor = db.get_db_conn().cursor()
+        cursor.execute("SELECT comment_table FROM Videos WHERE video_id=?", (video_data.video_id,))
+        cursor.execute(f"SELECT comment_id, comment, content_hash, PSentiment FROM {cursor.fetchone()[0]}")
+        return {row[0]: row[1:] for row in cursor.fetchall()}
+
+    def __edited(self, comment_dataframe, sentiment=None) -> pd.DataFrame:
+        df = comment_dataframe.copy()
+        df.loc[1, 'comment'] = 'this is not that terrible'
+        if sentiment is not None:
+            df['PSentiment'] = sentiment
+            df['NSentiment'] = sentiment
+
+        return df
+
+    def test_edited_comments(self, logger, tmp_path, comment_dataframe, normalized):
+        db = AstroDB(logger, str(tmp_path / 'edits.db'), normalized=normalized)
+        video_data = test_video_data[1]
+        edited_id = comment_dataframe.loc[1, 'comment_id']
+
+        comment_dataframe['PSentiment'] = 0.5
+        comment_dataframe['NSentiment'] = 0.5
+        db.insert_comment_dataframe(video_data, comment_dataframe)
+        stored = self.__get_comments(db, video_data)
+        assert len({content_hash for _, content_hash, _ in stored.values()}) == 3
+
+        # only the edited comment is rewritten, its previous text is kept
+        db.insert_comment_dataframe(video_data, self.__edited(comment_dataframe, sentiment=0.25))
+        comments = self.__get_comments(db, video_data)
+        assert len(comments) == 3
+        assert comments[edited_id][0] == 'this is not that terrible'
+        assert comments[edited_id][1] != stored[edited_id][1]
+        assert comments[edited_id][2] == 0.25
+        assert {k: v for k, v in comments.items() if k != edited_id} == \
+            {k: v for k, v in stored.items() if k != edited_id}
+
+        edits = db.get_comment_edits(video_data.video_id)
+        assert [edit[:2] for edit in edits] == [(edited_id, 'this is terrible')]
+        assert edits[0][2]
+        assert db.get_comment_edits(video_data.video_id, comment_dataframe.loc[0, 'comment_id']) == []
+
+        # merging the same text again finds nothing to rewrite
+        db.insert_comment_dataframe(video_data, self.__edited(comment_dataframe, sentiment=0.25))
+        db.store_comment_batch(video_data, self.__edited(comment_dataframe), None, 1)
+        assert len(db.get_comment_edits(video_data.video_id)) == 1
+
+        # unscored edits don't keep the sentiment of the previous text
+        db.store_comment_batch(video_data, comment_dataframe.drop(columns=['PSentiment', 'NSentiment']), None, 2)
+        assert self.__get_comments(db, video_data)[edited_id][:2] == stored[edited_id][:2]
+        assert self.__get_comments(db, video_data)[edited_id][2] is None
+        assert len(db.get_comment_edits(video_data.video_id, edited_id)) == 2
+
+    def test_copy_stored_sentiment(self, logger, tmp_path, monkeypatch, comment_dataframe, normalized):
+        db_file = str(tmp_path / 'edits.db')
+        db = AstroDB(logger, db_file, normalized=normalized)
+        video_data = test_video_data[1]
+
+        # nothing is stored for the video yet
+        assert db.copy_stored_sentiment(video_data.video_id, comment_dataframe.copy()).all()
+
+        stored = comment_dataframe.drop(2)
+        stored['PSentiment'] = [0.5, 0.25]
+        stored['NSentiment'] = [0.125, 0.0625]
+        db.insert_comment_dataframe(video_data, stored)
+
+        fresh = self.__edited(comment_dataframe)
+        reader = AstroDB(logger, db_file, read_only=True)
+        unscored = reader.copy_stored_sentiment(video_data.video_id, fresh)
+
+        # the edited and the new comment need scoring
+        assert unscored.tolist() == [False, True, True]
+        assert fresh.loc[0, ['PSentiment', 'NSentiment']].tolist() == [0.5, 0.125]
+        assert fresh.loc[1:, 'PSentiment'].isna().all()
+
+        # the hashes are kept, so storing the comments doesn't hash them again
+        assert fresh['content_hash'].tolist() == [comment_hash(text) for text in fresh['comment']]
+        monkeypatch.setattr(astro_db_module, 'comment_hashes', MagicMock(side_effect=AssertionError))
+        db.insert_comment_dataframe(video_data, fresh)
+        assert len(db.get_comment_edits(video_data.video_id)) == 1
+
+    def test_legacy_comment_table(self, logger, tmp_path, comment_dataframe, normalized):
+        db_file = str(tmp_path / 'edits.db')
+        db = AstroDB(logger, db_file, normalized=normalized)
+        video_data = test_video_data[1]
+        db.insert_comment_dataframe(video_data, comment_dataframe)
+
+        # tables created before edits were tracked lack the hash column
+        table = 'Comments' if normalized else 'AAA'
+        db.get_db_conn().execute(f"ALTER TABLE {table} DROP COLUMN content_hash")
+        db = AstroDB(logger, db_file)
+        assert db.copy_stored_sentiment(video_data.video_id, comment_dataframe.copy()).all()
+
+        db.insert_comment_dataframe(video_data, self.__edited(comment_dataframe))
+        assert [edit[:2] for edit in db.get_comment_edits(video_data.video_id)] == \
+            [(comment_dataframe.loc[1, 'comment_id'], 'this is terrible')]
+        assert all(content_hash for _, content_hash, _ in self.__get_comments(db, video_data).values())
+
+    def test_edits_after_migration(self, logger, tmp_path, comment_dataframe, normalized):
+        db = AstroDB(logger, str(tmp_path / 'edits.db'), normalized=normalized)
+        video_data = test_video_data[1]
+        db.insert_comment_dataframe(video_data, comment_dataframe)
+
+        db.migrate_to_normalized()
+        db.insert_comment_dataframe(video_data, comment_dataframe)
+        assert db.get_comment_edits(video_data.video_id) == []
+
+        db.insert_comment_dataframe(video_data, self.__edited(comment_dataframe))
+        assert len(db.get_comment_edits(video_data.video_id)) == 1
+
+    def test_edited_comment_search(self, logger, tmp_path, comment_dataframe, normalized):
+        db = AstroDB(logger, str(tmp_path / 'edits.db'), normalized=normalized)
+        video_data = test_video_data[1]
+        db.insert_comment_dataframe(video_data, comment_dataframe)
+        db.create_search_index()
+
+        db.insert_comment_dataframe(video_data, self.__edited(comment_dataframe))
+
+        matches = db.search_comments('terrible')
+        assert [match.comment for match in matches] == ['this is not that terrible']
+        assert db.search_comments('not')[0].comment_id == comment_dataframe.loc[1, 'comment_id']
+        assert len(db.search_comments('this')) == 2
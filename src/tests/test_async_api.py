@@ -0,0 +1,159 @@
+"""
+Tests for the asynchronous comment fetcher.
+"""
+import asyncio
+import pytest
+
+from unittest.mock import MagicMock
+from googleapiclient.errors import HttpError
+
+# Astro modules
+from src.astro_db import AstroDB
+from src.batch import BatchCollector
+from src.benchmarks.common import synthetic_comment_pages, synthetic_reply_pages
+from src.data_collection.data_structures import VideoData
+from src.data_collection.request_executor import RequestExecutor
+from src.tests.astro_mocks import MockAPIServer, add_fake_sentiment
+
+aiohttp = pytest.importorskip('aiohttp')
+
+from src.data_collection.async_api import AsyncYouTubeDataAPI, AsyncRunner  # noqa: E402
+
+
+@pytest.fixture(scope='function')
+def comment_server():
+    server = MockAPIServer({'commentThreads': synthetic_comment_pages(4, threads_per_page=5, reply_count=1)},
+                           latency=0.02)
+    server.start()
+    yield server
+    server.stop()
+
+
+def create_api(logger, server, **kwargs):
+    executor = RequestExecutor(logger, base_delay=0.01)
+    return AsyncYouTubeDataAPI(logger, 'test_apikey', executor=executor, api_endpoint=server.url, **kwargs)
+
+
+async def collect(api, videos: list) -> list:
+    try:
+        return await asyncio.gather(*[api.get_comments(video_data) for video_data in videos])
+    finally:
+        await api.close()
+
+
+class TestAsyncYouTubeDataAPI:
+    def test_invalid_concurrency(self, logger):
+        with pytest.raises(ValueError):
+            AsyncYouTubeDataAPI(logger, 'test_apikey', max_concurrency=0)
+
+        with pytest.raises(ValueError):
+            AsyncYouTubeDataAPI(logger, 'test_apikey', video_concurrency=0)
+
+    def test_get_comments(self, logger, comment_server):
+        api = create_api(logger, comment_server)
+        video_data = VideoData(video_id='video_id', comment_count=45)
+
+        df, = asyncio.run(collect(api, [video_data]))
+
+        # every thread contributes one top level comment and a reply
+        assert len(df.index) == 40
+        assert df['comment_id'].is_unique
+        assert df.loc[1, 'comment_id'].startswith(df.loc[0, 'comment_id'])
+        assert video_data.filtered_comment_count == 5
+        assert api.executor.quota_used == 4
+
+    def test_global_concurrency_limit(self, logger, comment_server):
+        api = create_api(logger, comment_server, max_concurrency=3)
+        videos = [VideoData(video_id=f'video{i}', comment_count=40) for i in range(6)]
+
+        results = asyncio.run(collect(api, videos))
+
+        assert [len(df.index) for df in results] == [40] * 6
+        assert comment_server.request_count == 24
+        assert comment_server.max_active_requests == 3
+
+    def test_video_concurrency_limit(self, logger, comment_server):
+        api = create_api(logger, comment_server, video_concurrency=2)
+
+        async def request_pages():
+            try:
+                return await asyncio.gather(*[api.request('commentThreads', 'youtube.commentThreads.list', 'video_id')
+                                              for _ in range(5)])
+            finally:
+                await api.close()
+
+        assert len(asyncio.run(request_pages())) == 5
+        assert comment_server.max_active_requests == 2
+
+    def test_expand_replies(self, logger):
+        # the API returns 5 of the 12 replies of every thread inline
+        pages = synthetic_comment_pages(2, threads_per_page=5, reply_count=12, inline_reply_limit=5)
+        responses = {'commentThreads': pages}
+        for page in pages:
+            for item in page['items']:
+                responses[f'comments/{item["id"]}'] = synthetic_reply_pages(item['id'], 12, replies_per_page=5)
+
+        server = MockAPIServer(responses, latency=0.02)
+        server.start()
+
+        api = create_api(logger, server, video_concurrency=3)
+        df, = asyncio.run(collect(api, [VideoData(video_id='video_id', comment_count=130)]))
+        server.stop()
+
+        assert len(df.index) == 130
+        assert df['comment_id'].is_unique
+        assert api.executor.quota_used == 2 + 10 * 3  # three pages of replies per thread
+        assert server.max_active_requests == 3
+
+    def test_retry(self, logger, comment_server):
+        api = create_api(logger, comment_server)
+        comment_server.fail_requests = 2
+
+        df, = asyncio.run(collect(api, [VideoData(video_id='video_id', comment_count=40)]))
+
+        assert len(df.index) == 40
+        assert api.executor.retry_count == 2
+
+    def test_error_response(self, logger, comment_server):
+        api = create_api(logger, comment_server)
+
+        async def request_unknown():
+            try:
+                await api.request('unknown', 'youtube.unknown.list', 'video_id')
+            finally:
+                await api.close()
+
+        with pytest.raises(HttpError) as error:
+            asyncio.run(request_unknown())
+
+        assert error.value.resp.status == 404
+        assert api.executor.retry_count == 0
+
+    def test_batch_collect(self, logger, batch_db, mock_batch_http_request, comment_server):
+        sentiment = MagicMock()
+        sentiment.add_sentiment_to_dataframe.side_effect = add_fake_sentiment
+
+        executor = RequestExecutor(logger)
+        api = AsyncYouTubeDataAPI(logger, 'test_apikey', max_concurrency=4, executor=executor,
+                                  api_endpoint=comment_server.url)
+        collector = BatchCollector(logger, 'test_apikey', batch_db, sentiment, executor=executor, async_api=api)
+
+        summary = collector.collect([f'video{i}' for i in range(5)] + ['missing1'])
+
+        assert summary.video_count == 5
+        assert summary.failed_count == 1
+        assert summary.comment_count == 200
+        assert summary.quota_used == 21  # one videos.list, four commentThreads.list pages per video
+        assert batch_db.read(AstroDB.get_video_data, 'video4')
+
+
+class TestAsyncRunner:
+    def test_submit(self):
+        async def add(a, b):
+            await asyncio.sleep(0)
+            return a + b
+
+        runner = AsyncRunner()
+        assert runner.submit(add(1, 2)).result() == 3
+        runner.close()
+        assert runner.loop.is_closed()
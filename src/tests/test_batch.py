@@ -0,0 +1,106 @@
+"""
+Tests for batch collection.
+"""
+import io
+import sqlite3
+import pytest
+
+from unittest.mock import MagicMock
+
+# Astro modules
+from src.astro_db import AstroDB
+from src.batch import BatchCollector, read_video_list
+from src.data_collection.request_executor import RequestExecutor
+from src.data_collection.yt_data_api import YouTubeDataAPI
+from src.tests.astro_mocks import add_fake_sentiment
+
+
+class TestBatch:
+    def test_read_video_list(self):
+        lines = io.StringIO('https://www.youtube.com/watch?v=abc\n\n# comment\n  def  \n')
+        assert read_video_list(lines) == ['https://www.youtube.com/watch?v=abc', 'def']
+
+    def test_invalid_worker_count(self, logger, batch_db):
+        with pytest.raises(ValueError):
+            BatchCollector(logger, 'test_apikey', batch_db, MagicMock(), workers=0)
+
+    @pytest.mark.parametrize('workers', [1, 3])
+    def test_collect(self, logger, batch_db, mock_batch_http_request, workers):
+        sentiment = MagicMock()
+        sentiment.add_sentiment_to_dataframe.side_effect = add_fake_sentiment
+
+        urls = ['youtube.com/watch?v=video1', 'video2', 'youtube.com/watch?v=video3', 'missing1', 'bad id']
+        collector = BatchCollector(logger, 'test_apikey', batch_db, sentiment, workers=workers)
+        summary = collector.collect(urls)
+
+        assert summary.video_count == 3
+        assert summary.failed_count == 2
+        assert summary.comment_count == 6  # 2 comments per video in the canned response
+        assert summary.quota_used == 4  # one videos.list for all ids + one commentThreads.list per video
+        assert sentiment.add_sentiment_to_dataframe.call_count == 3
+
+        for video_id in ['video1', 'video2', 'video3']:
+            assert batch_db.read(AstroDB.get_video_data, video_id)
+
+        collector.log_summary(summary)
+
+    def test_collect_quota_exceeded(self, logger, batch_db, mock_batch_http_request):
+        sentiment = MagicMock()
+        sentiment.add_sentiment_to_dataframe.side_effect = add_fake_sentiment
+
+        urls = ['quota1'] + [f'video{i}' for i in range(5)]
+        collector = BatchCollector(logger, 'test_apikey', batch_db, sentiment, workers=1)
+        summary = collector.collect(urls)
+
+        # nothing is requested once the quota is gone
+        assert summary.video_count == 0
+        assert summary.failed_count == 6
+        assert summary.quota_used == 2
+
+    def test_metadata_request_error(self, logger, batch_db, mock_batch_http_request, monkeypatch):
+        monkeypatch.setattr(YouTubeDataAPI, 'max_ids_per_request', 2)
+
+        # the second videos.list request is over the quota
+        collector = BatchCollector(logger, 'test_apikey', batch_db, MagicMock(),
+                                   executor=RequestExecutor(logger, daily_quota=1))
+        failed, pending = collector._BatchCollector__get_metadata(['video1', 'missing1', 'video2', 'video3'])
+
+        assert [video_data.video_id for video_data in pending] == ['video1']
+        assert [result.url for result in failed] == ['missing1', 'video2', 'video3']
+        assert failed[0].error == 'video metadata unavailable'
+        assert failed[1].error.startswith('video metadata request failed: Daily quota')
+
+    def test_collect_store_failure(self, logger, batch_db, mock_batch_http_request, monkeypatch):
+        sentiment = MagicMock()
+        sentiment.add_sentiment_to_dataframe.side_effect = add_fake_sentiment
+
+        insert_comment_dataframe = AstroDB.insert_comment_dataframe
+
+        def failing_insert(db, video_data, *args, **kwargs):
+            if video_data.video_id == 'video2':
+                raise sqlite3.OperationalError('disk I/O error')
+            return insert_comment_dataframe(db, video_data, *args, **kwargs)
+
+        monkeypatch.setattr(AstroDB, 'insert_comment_dataframe', failing_insert)
+
+        collector = BatchCollector(logger, 'test_apikey', batch_db, sentiment, workers=2)
+        summary = collector.collect(['video1', 'video2', 'video3'])
+
+        # a failed write doesn't stop the writer from storing later videos
+        assert summary.video_count == 2
+        assert summary.failed_count == 1
+        assert batch_db.read(AstroDB.get_high_water_mark, 'video3')
+        assert not batch_db.read(AstroDB.get_high_water_mark, 'video2')
+
+    def test_recollect_scores_changed_comments(self, logger, batch_db, mock_batch_http_request):
+        sentiment = MagicMock()
+        sentiment.add_sentiment_to_dataframe.side_effect = add_fake_sentiment
+
+        collector = BatchCollector(logger, 'test_apikey', batch_db, sentiment, workers=1)
+        collector.collect(['video1'])
+        assert sentiment.add_sentiment_to_dataframe.call_args.kwargs['rows'].all()
+
+        # the comments are unchanged, their stored sentiment is reused
+        summary = collector.collect(['video1'])
+        assert summary.video_count == 1
+        assert not sentiment.add_sentiment_to_dataframe.call_args.kwargs['rows'].any()
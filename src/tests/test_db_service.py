@@ -0,0 +1,117 @@
+"""
+Tests for the multi-threaded database service.
+"""
+import sqlite3
+import threading
+import pytest
+
+import pandas as pd
+
+# Astro modules
+from src.astro_db import AstroDB
+from src.data_collection.data_structures import VideoData
+from src.db_service import DatabaseService
+
+
+def video(i: int) -> VideoData:
+    return VideoData(video_id=f'video{i}', channel_id='channel_id', channel_title='channel', comment_count=10)
+
+
+def comments(video_id: str, count: int) -> pd.DataFrame:
+    return pd.DataFrame({'comment_id': [f'{video_id}.{i}' for i in range(count)],
+                         'comment': 'comment',
+                         'user': '@user',
+                         'date': [f'2024-01-01T00:00:{i:02d}Z' for i in range(count)],
+                         'visible': 1})
+
+
+def count_comments(db: AstroDB, video_id: str) -> int:
+    db.cursor.execute("SELECT COUNT(*) FROM Comments WHERE video_id=?", (video_id,))
+    return db.cursor.fetchone()[0]
+
+
+@pytest.fixture(scope='function')
+def service(logger, tmp_path):
+    service = DatabaseService(logger, str(tmp_path / 'service.db'), normalized=True, readers=2)
+    yield service
+    service.close()
+
+
+class TestDatabaseService:
+    def test_write_and_read(self, service, comment_dataframe):
+        video_data = video(0)
+        service.write(AstroDB.insert_comment_dataframe, video_data, comment_dataframe)
+
+        assert service.read(AstroDB.get_video_data, 'video0').channel_title == 'channel'
+        assert service.read(count_comments, 'video0') == 3
+
+    def test_writes_apply_in_order(self, service):
+        video_data = video(0)
+        futures = [service.submit(AstroDB.insert_comment_dataframe, video_data, comments('video0', count))
+                   for count in range(1, 6)]
+        futures.append(service.submit(count_comments, 'video0'))
+
+        assert futures[-1].result() == 5
+
+    def test_failed_write(self, service):
+        future = service.submit(AstroDB.insert_comment_dataframe, VideoData(), comments('video0', 1))
+
+        with pytest.raises(ValueError):
+            future.result()
+
+        # the writer carries on with the next write
+        service.write(AstroDB.insert_comment_dataframe, video(0), comments('video0', 1))
+        assert service.read(count_comments, 'video0') == 1
+
+    def test_read_only_connections(self, service):
+        with service.reader() as db:
+            assert db.read_only
+            with pytest.raises(sqlite3.OperationalError):
+                db.update_video_data(video(0))
+
+    def test_parallel_collectors(self, service):
+        errors = []
+
+        def collector(i: int):
+            try:
+                video_data = video(i)
+                for page in range(5):
+                    service.submit(AstroDB.insert_comment_dataframe, video_data, comments(video_data.video_id, page * 10))
+                    service.read(AstroDB.get_video_data, video_data.video_id)
+
+                service.write(AstroDB.update_video_data, video_data)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=collector, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert not errors
+        for i in range(8):
+            assert service.read(count_comments, f'video{i}') == 40
+
+    def test_closed_service(self, logger, tmp_path):
+        service = DatabaseService(logger, str(tmp_path / 'closed.db'))
+        future = service.submit(AstroDB.update_video_data, video(0))
+        service.close()
+
+        # queued writes are applied before closing
+        assert future.done()
+        with pytest.raises(RuntimeError):
+            service.submit(AstroDB.update_video_data, video(0))
+        with pytest.raises(RuntimeError):
+            service.read(AstroDB.get_video_data, 'video0')
+
+        service.close()
+
+    @pytest.mark.parametrize('readers, queue_size', [(0, 16), (2, 0)])
+    def test_invalid_configuration(self, logger, tmp_path, readers, queue_size):
+        with pytest.raises(ValueError):
+            DatabaseService(logger, str(tmp_path / 'invalid.db'), readers=readers, queue_size=queue_size)
+
+    def test_open_failure(self, logger, tmp_path):
+        with pytest.raises(ValueError):
+            DatabaseService(logger, str(tmp_path / 'invalid.db'), profile='unknown')
@@ -0,0 +1,170 @@
+"""
+Tests for the columnar comment export.
+"""
+import os
+import pytest
+
+import pandas as pd
+
+# Astro modules
+from src.astro_db import AstroDB
+from src.data_collection.data_structures import VideoData
+from src.tests.astro_mocks import add_fake_sentiment
+
+pytest.importorskip('pyarrow')
+
+from src.export import CommentExporter, read_export, MANIFEST_FILE  # noqa: E402
+
+
+def video(i: int, channel: str) -> VideoData:
+    return VideoData(video_id=f'video{i}', channel_id=channel, channel_title=f'{channel} title')
+
+
+def comments(video_id: str, first: int, last: int, month='2024-01') -> pd.DataFrame:
+    df = pd.DataFrame({'comment_id': [f'{video_id}.{i}' for i in range(first, last)],
+                       'comment': [f'comment {i}' for i in range(first, last)],
+                       'user': [f'@user{i % 3}' for i in range(first, last)],
+                       'date': [f'{month}-01T00:00:{i % 60:02d}Z' for i in range(first, last)],
+                       'visible': True})
+    add_fake_sentiment(df)
+    return df
+
+
+@pytest.fixture(scope='function', params=[False, True], ids=['per-video', 'normalized'])
+def export_db(request, logger, tmp_path):
+    db = AstroDB(logger, str(tmp_path / 'export.db'), normalized=request.param)
+    db.insert_comment_dataframe(video(1, 'channelA'), comments('video1', 0, 10))
+    db.insert_comment_dataframe(video(2, 'channelA'), comments('video2', 0, 5, month='2024-02'))
+    db.insert_comment_dataframe(video(3, 'channelB'), comments('video3', 0, 5))
+    return db
+
+
+@pytest.mark.parametrize('export_format', ['parquet', 'arrow'])
+class TestCommentExport:
+    def test_export(self, logger, tmp_path, export_db, export_format):
+        export_dir = str(tmp_path / 'export')
+        stats = CommentExporter(logger, export_db, export_dir, export_format, batch_size=4).export()
+
+        assert stats.row_count == 20
+        assert stats.video_count == 3
+
+        # partitioned by channel, then month
+        assert sorted(os.listdir(export_dir)) == [MANIFEST_FILE, 'channel_id=channelA', 'channel_id=channelB']
+        assert sorted(os.listdir(os.path.join(export_dir, 'channel_id=channelA'))) == ['month=2024-01', 'month=2024-02']
+
+        df = read_export(export_dir).to_pandas().sort_values(['video_id', 'comment'])
+        assert len(df.index) == 20
+        video1 = df[df['video_id'] == 'video1']
+        assert list(video1['comment_id']) == sorted(f'video1.{i}' for i in range(10))
+        assert set(video1['channel_title']) == {'channelA title'}
+        assert set(df['visible']) == {1}
+        assert df['PSentiment'].notna().all()
+
+    def test_incremental_export(self, logger, tmp_path, export_db, export_format):
+        export_dir = str(tmp_path / 'export')
+        CommentExporter(logger, export_db, export_dir, export_format).export()
+
+        # nothing new to export
+        exporter = CommentExporter(logger, export_db, export_dir, export_format)
+        assert exporter.export().row_count == 0
+
+        # only the comments stored since the last export are appended
+        export_db.insert_comment_dataframe(video(1, 'channelA'), comments('video1', 5, 15))
+        stats = exporter.export()
+        assert stats.row_count == 5
+        assert stats.video_count == 1
+
+        table = read_export(export_dir, columns=['comment_id'], video_ids=['video1'])
+        assert sorted(table.column('comment_id').to_pylist()) == sorted(f'video1.{i}' for i in range(15))
+
+    def test_video_export(self, logger, tmp_path, export_db, export_format):
+        export_dir = str(tmp_path / 'export')
+        exporter = CommentExporter(logger, export_db, export_dir, export_format)
+
+        assert exporter.export(video_ids=['video2']).row_count == 5
+        assert exporter.export().row_count == 15
+        assert read_export(export_dir).num_rows == 20
+
+    def test_full_export(self, logger, tmp_path, export_db, export_format):
+        export_dir = str(tmp_path / 'export')
+        exporter = CommentExporter(logger, export_db, export_dir, export_format)
+        exporter.export()
+
+        assert exporter.export(full=True).row_count == 20
+        assert read_export(export_dir).num_rows == 20
+
+        with pytest.raises(ValueError):
+            exporter.export(video_ids=['video1'], full=True)
+
+    def test_export_after_migration(self, logger, tmp_path, export_format):
+        db = AstroDB(logger, str(tmp_path / 'migrate.db'))
+        db.insert_comment_dataframe(video(1, 'channelA'), comments('video1', 0, 3))
+        db.insert_comment_dataframe(video(2, 'channelA'), comments('video2', 0, 3))
+        db.insert_comment_dataframe(video(3, 'channelB'), comments('video3', 0, 3))
+
+        export_dir = str(tmp_path / 'export')
+        CommentExporter(logger, db, export_dir, export_format).export(video_ids=['video1', 'video2'])
+
+        # the migrated rows get new rowids, so the videos are exported again
+        # rather than appended from their old watermarks
+        db.migrate_to_normalized()
+        db.insert_comment_dataframe(video(2, 'channelA'), comments('video2', 3, 4))
+        assert CommentExporter(logger, db, export_dir, export_format).export().row_count == 10
+
+        df = read_export(export_dir).to_pandas()
+        assert len(df.index) == 10
+        assert df['comment_id'].is_unique
+
+        assert CommentExporter(logger, db, export_dir, export_format).export().row_count == 0
+
+    def test_read_selection(self, logger, tmp_path, export_db, export_format):
+        export_dir = str(tmp_path / 'export')
+        CommentExporter(logger, export_db, export_dir, export_format).export()
+
+        table = read_export(export_dir, columns=['user', 'PSentiment'], channel_ids=['channelA'], months=['2024-01'])
+        assert table.column_names == ['user', 'PSentiment']
+        assert table.num_rows == 10
+
+        assert read_export(export_dir, channel_ids=['channelB'], video_ids=['video1']).num_rows == 0
+
+    def test_empty_export(self, logger, tmp_path, export_format):
+        db = AstroDB(logger, str(tmp_path / 'empty.db'))
+        export_dir = str(tmp_path / 'export')
+
+        assert CommentExporter(logger, db, export_dir, export_format).export().row_count == 0
+        assert read_export(export_dir, columns=['comment_id']).num_rows == 0
+
+
+class TestCommentExportErrors:
+    def test_invalid_configuration(self, logger, tmp_path, export_db):
+        with pytest.raises(ValueError):
+            CommentExporter(logger, export_db, str(tmp_path / 'export'), 'csv')
+
+        with pytest.raises(ValueError):
+            CommentExporter(logger, export_db, str(tmp_path / 'export'), batch_size=0)
+
+    def test_format_mismatch(self, logger, tmp_path, export_db):
+        export_dir = str(tmp_path / 'export')
+        CommentExporter(logger, export_db, export_dir, 'arrow').export()
+
+        with pytest.raises(ValueError):
+            CommentExporter(logger, export_db, export_dir, 'parquet')
+
+    def test_not_an_export(self, tmp_path):
+        with pytest.raises(ValueError):
+            read_export(str(tmp_path))
+
+    def test_legacy_comment_table(self, logger, tmp_path):
+        db = AstroDB(logger, str(tmp_path / 'legacy.db'))
+        db.insert_comment_dataframe(video(1, 'channelA'), comments('video1', 0, 3))
+
+        # tables created before sentiment analysis lack its columns
+        cursor = db.get_db_conn().cursor()
+        cursor.execute("ALTER TABLE AAA DROP COLUMN PSentiment")
+
+        export_dir = str(tmp_path / 'export')
+        CommentExporter(logger, db, export_dir).export()
+
+        df = read_export(export_dir).to_pandas()
+        assert len(df.index) == 3
+        assert df['PSentiment'].isna().all()
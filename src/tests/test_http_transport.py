@@ -0,0 +1,81 @@
+"""
+Tests for the pooled HTTP transport.
+"""
+import json
+import threading
+import pytest
+
+# Astro modules
+from src.data_collection.http_transport import PooledHttp
+from src.data_collection.youtube_client import YouTubeClientFactory
+from src.data_collection.yt_data_api import YouTubeDataAPI
+
+
+class TestHttpTransport:
+    def test_invalid_pool_size(self):
+        with pytest.raises(ValueError):
+            PooledHttp(pool_size=0)
+
+    def test_request(self, mock_api_server, api_video_response):
+        http = PooledHttp()
+
+        response, content = http.request(mock_api_server.url + 'youtube/v3/videos')
+        assert response.status == 200
+        assert response['content-type'] == 'application/json'
+        assert json.loads(content) == api_video_response
+
+        response, content = http.request(mock_api_server.url + 'youtube/v3/unknown')
+        assert response.status == 404
+
+        http.close()
+
+    def test_connection_reuse(self, mock_api_server):
+        http = PooledHttp()
+
+        for _ in range(5):
+            http.request(mock_api_server.url + 'youtube/v3/videos')
+
+        stats = http.stats()
+        assert stats['requests'] == 5
+        assert stats['connections'] == 1
+        assert stats['reused'] == 4
+        assert stats['max_latency'] >= stats['mean_latency'] > 0.0
+        assert mock_api_server.connection_count == 1
+
+        http.close()
+
+    def test_shared_across_threads(self, logger, mock_api_server):
+        http = PooledHttp(pool_size=4)
+        factory = YouTubeClientFactory('test_apikey', http=http, api_endpoint=mock_api_server.url)
+
+        def fetch():
+            youtube = YouTubeDataAPI(logger, 'test_apikey', show_progress=False, client_factory=factory)
+            for _ in range(3):
+                youtube.get_video_metadata('youtube.com/watch?v=video')
+
+        threads = [threading.Thread(target=fetch) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        stats = http.stats()
+        assert factory.build_count == 4
+        assert stats['requests'] == mock_api_server.request_count == 12
+        assert stats['connections'] == mock_api_server.connection_count <= 4
+
+        http.close()
+
+    def test_youtube_data_api(self, logger, mock_api_server):
+        http = PooledHttp()
+        factory = YouTubeClientFactory('test_apikey', http=http, api_endpoint=mock_api_server.url)
+        youtube = YouTubeDataAPI(logger, 'test_apikey', client_factory=factory)
+
+        video_data = youtube.get_video_metadata('youtube.com/watch?v=video')
+        df = youtube.get_comments(video_data)
+
+        assert len(df.index) == 2
+        assert http.stats()['requests'] == 2
+        assert http.stats()['connections'] == 1
+
+        http.close()
@@ -0,0 +1,76 @@
+"""
+Tests for the precompiled sentiment lexicon.
+"""
+import pytest
+
+from nltk.corpus.reader.wordnet import WordNetCorpusReader
+
+# Astro modules
+from src.data_collection.lexicon import SentimentLexicon, write_lexicon
+from src.data_collection.sentiment import SentimentAnalysis
+
+
+@pytest.fixture(scope='function')
+def lexicon_file(tmp_path):
+    entries = {
+        ('giant', 'n'): (0.0, 0.125, True),
+        ('goose', 'n'): (0.0, 0.0, True),
+        ('geese', 'n'): (0.0, 0.25, False),  # irregular form, resolved at build time
+        ('mice', 'n'): (0.0, 0.0, False),
+        ('great', 'a'): (0.75, 0.0, True),
+        ('wet', 'a'): (0.0, 0.5, True),
+        ('wetter', 'a'): (None, None, False),  # irregular form without a synset
+        ('well', 'r'): (0.375, 0.0, True)
+    }
+
+    path = str(tmp_path / 'sentiment.lex')
+    write_lexicon(path, entries, WordNetCorpusReader.MORPHOLOGICAL_SUBSTITUTIONS)
+
+    return path
+
+
+class TestLexicon:
+    def test_lookup(self, lexicon_file):
+        lexicon = SentimentLexicon(lexicon_file)
+
+        assert len(lexicon) == 8
+        assert lexicon.lookup('giant', 'n') == (0.0, 0.125)
+        assert lexicon.lookup('geese', 'n') == (0.0, 0.25)
+        assert lexicon.lookup('well', 'r') == (0.375, 0.0)
+        assert lexicon.lookup('giant', 'a') is None
+        assert lexicon.lookup('asdf', 'n') is None
+        assert lexicon.lookup('x' * 100, 'n') is None
+
+    def test_morphology(self, lexicon_file):
+        lexicon = SentimentLexicon(lexicon_file)
+
+        assert lexicon.lookup('giants', 'n') == (0.0, 0.125)
+        assert lexicon.lookup('greatest', 'a') == (0.75, 0.0)
+        assert lexicon.lookup('wells', 'r') is None  # no substitution rules for adverbs
+        assert lexicon.lookup('giantss', 'n') is None  # rules are applied once, as by nltk's WordNet reader
+
+        # irregular forms are used as they are, and never as a substitution result
+        assert lexicon.lookup('wetter', 'a') is None
+        assert lexicon.lookup('mices', 'n') is None
+
+    def test_invalid_file(self, tmp_path):
+        path = tmp_path / 'invalid.lex'
+        path.write_bytes(b'not a lexicon')
+
+        with pytest.raises(ValueError):
+            SentimentLexicon(str(path))
+
+    def test_empty_lexicon(self, tmp_path):
+        path = str(tmp_path / 'empty.lex')
+        write_lexicon(path, {}, {})
+
+        lexicon = SentimentLexicon(path)
+        assert len(lexicon) == 0
+        assert lexicon.lookup('giant', 'n') is None
+
+    def test_sentiment_analysis_lexicon(self, logger, lexicon_file):
+        sa = SentimentAnalysis(logger, init_nltk=False, lexicon_file=lexicon_file)
+
+        assert sa.get_word_scores('Giants', 'n') == (0.0, 0.125)
+        assert sa.get_word_scores('asdf', 'n') is None
+        assert sa.cache.misses == 2
@@ -0,0 +1,101 @@
+"""
+Tests for the streaming comment pipeline.
+"""
+import threading
+import pytest
+
+import pandas as pd
+
+# Astro modules
+from src.pipeline import CommentPipeline
+
+
+def comment_batches(count: int, produced=None, fail_at=None):
+    for i in range(count):
+        if i == fail_at:
+            raise ConnectionError('fetch failed')
+
+        if produced is not None:
+            produced.append(i)
+
+        yield pd.DataFrame({'comment_id': [f'comment{i}a', f'comment{i}b']}), f'page{i + 1}' if i < count - 1 else None, 1
+
+
+def score(df):
+    df['psentiment'] = 0.5
+    df['nsentiment'] = 0.25
+
+
+class TestCommentPipeline:
+    def test_invalid_queue_size(self, logger):
+        with pytest.raises(ValueError):
+            CommentPipeline(logger, score, lambda df, token, pages: None, queue_size=0)
+
+    def test_run(self, logger):
+        stored = []
+        store_threads = set()
+
+        def store(df, token, pages):
+            store_threads.add(threading.current_thread())
+            stored.append((list(df['comment_id']), token, 'psentiment' in df.columns))
+            assert pages == 1
+
+        stats = CommentPipeline(logger, score, store).run(comment_batches(5))
+
+        # batches are stored in order, scored, and on the calling thread
+        assert [token for _, token, _ in stored] == ['page1', 'page2', 'page3', 'page4', None]
+        assert stored[0][0] == ['comment0a', 'comment0b']
+        assert all(scored for _, _, scored in stored)
+        assert store_threads == {threading.current_thread()}
+
+        assert stats.batch_count == 5
+        assert stats.comment_count == 10
+
+    def test_empty_batches_not_scored(self, logger):
+        scored = []
+        batches = iter([(pd.DataFrame({'comment_id': []}), None, 1)])
+
+        stats = CommentPipeline(logger, scored.append, lambda df, token, pages: None).run(batches)
+
+        assert stats.batch_count == 1
+        assert not scored
+
+    def test_backpressure(self, logger):
+        produced = []
+        produced_at_store = []
+
+        def store(df, token, pages):
+            produced_at_store.append(len(produced))
+
+        CommentPipeline(logger, score, store, queue_size=1).run(comment_batches(20, produced))
+
+        # the fetcher can only run a few batches ahead of the writer: one in each
+        # queue, one being scored and one waiting to be queued
+        assert max(count - stored for stored, count in enumerate(produced_at_store, 1)) <= 4
+
+    def test_fetch_error(self, logger):
+        stored = []
+
+        with pytest.raises(ConnectionError):
+            CommentPipeline(logger, score, lambda df, token, pages: stored.append(token)).run(comment_batches(5, fail_at=3))
+
+        # batches fetched before the error are still stored
+        assert stored == ['page1', 'page2', 'page3']
+
+    def test_score_error(self, logger):
+        def failing_score(df):
+            raise RuntimeError('scoring failed')
+
+        with pytest.raises(RuntimeError):
+            CommentPipeline(logger, failing_score, lambda df, token, pages: None).run(comment_batches(5))
+
+    def test_store_error_stops_fetch(self, logger):
+        produced = []
+
+        def store(df, token, pages):
+            raise OSError('disk full')
+
+        with pytest.raises(OSError):
+            CommentPipeline(logger, score, store, queue_size=1).run(comment_batches(100, produced))
+
+        assert len(produced) < 100
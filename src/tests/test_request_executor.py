@@ -0,0 +1,172 @@
+"""
+Tests for API request execution: retries, rate limiting and quota accounting.
+"""
+import datetime
+import pytest
+
+from googleapiclient.errors import HttpError
+
+# Astro modules
+from src.data_collection.request_executor import RequestExecutor, TokenBucket, QuotaExceededError, daily_rate, quota_day
+from src.tests.astro_mocks import make_http_error
+
+
+class FakeRequest:
+    """
+    Request whose successive executions raise or return the given outcomes.
+    """
+    methodId = 'youtube.commentThreads.list'
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.execute_count = 0
+
+    def execute(self):
+        self.execute_count += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+
+        return outcome
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture(scope='function')
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture(scope='function')
+def executor(logger, clock):
+    return RequestExecutor(logger, max_attempts=4, base_delay=1.0, max_delay=5.0, sleep=clock.sleep, rand=lambda: 1.0)
+
+
+class TestRequestExecutor:
+    def test_success(self, executor, clock):
+        assert executor.execute(FakeRequest({'items': []})) == {'items': []}
+        assert executor.quota_used == 1
+        assert executor.retry_count == 0
+        assert not clock.sleeps
+
+    def test_retry_transient_errors(self, executor, clock):
+        request = FakeRequest(make_http_error(500), make_http_error(403, 'rateLimitExceeded'),
+                              ConnectionResetError('reset'), {'items': []})
+
+        assert executor.execute(request) == {'items': []}
+        assert request.execute_count == 4
+        assert executor.retry_count == 3
+        assert executor.quota_used == 4  # failed requests are charged too
+        assert clock.sleeps == [1.0, 2.0, 4.0]
+
+    def test_backoff_delay(self, logger):
+        executor = RequestExecutor(logger, base_delay=1.0, max_delay=5.0, rand=lambda: 0.5)
+
+        assert [executor.backoff_delay(attempt) for attempt in range(1, 6)] == [0.5, 1.0, 2.0, 2.5, 2.5]
+        assert executor.backoff_delay(1, make_http_error(429, retry_after='3')) == 3.0
+        assert executor.backoff_delay(1, make_http_error(429, retry_after='30')) == 5.0
+
+    def test_give_up(self, executor, clock):
+        request = FakeRequest(*[make_http_error(503)] * 5)
+
+        with pytest.raises(HttpError):
+            executor.execute(request)
+
+        assert request.execute_count == 4
+        assert len(clock.sleeps) == 3
+
+    def test_no_retry_on_client_error(self, executor, clock):
+        request = FakeRequest(make_http_error(404, 'videoNotFound'), {'items': []})
+
+        with pytest.raises(HttpError):
+            executor.execute(request)
+
+        assert request.execute_count == 1
+        assert not clock.sleeps
+
+    def test_quota_exceeded(self, executor, clock):
+        request = FakeRequest(make_http_error(403, 'quotaExceeded'), {'items': []})
+
+        with pytest.raises(QuotaExceededError):
+            executor.execute(request)
+
+        assert request.execute_count == 1
+        assert executor.quota_exhausted
+        assert not clock.sleeps
+
+    def test_quota_budget(self, logger):
+        executor = RequestExecutor(logger, daily_quota=2)
+        request = FakeRequest({}, {}, {})
+
+        executor.execute(request)
+        executor.execute(request)
+        with pytest.raises(QuotaExceededError):
+            executor.execute(request)
+
+        assert request.execute_count == 2
+        assert executor.quota_used == 2
+        assert executor.quota_exhausted
+
+    def test_quota_spent_earlier(self, logger):
+        executor = RequestExecutor(logger, daily_quota=10, quota_spent=9)
+        request = FakeRequest({}, {})
+
+        executor.execute(request)
+        with pytest.raises(QuotaExceededError):
+            executor.execute(request)
+
+        assert executor.quota_used == 1
+
+    def test_daily_rate(self):
+        # 20:00 on May 1st in Pacific (daylight) time, when the quota resets
+        now = datetime.datetime(2024, 5, 2, 3, 0, tzinfo=datetime.timezone.utc)
+
+        assert quota_day(now) == '2024-05-01'
+        assert daily_rate(7200, now) == pytest.approx(7200 / (4 * 3600))
+        assert daily_rate(0, now) > 0  # a used up quota still gives a valid rate
+
+        # the day clocks are turned back has 25 hours
+        now = datetime.datetime(2024, 11, 3, 7, 0, tzinfo=datetime.timezone.utc)
+        assert quota_day(now) == '2024-11-03'
+        assert daily_rate(2500, now) == pytest.approx(2500 / (25 * 3600))
+
+    def test_rate_limiter(self, logger, clock):
+        bucket = TokenBucket(2.0, capacity=2, clock=clock, sleep=clock.sleep)
+        executor = RequestExecutor(logger, rate_limiter=bucket)
+
+        for _ in range(4):
+            executor.execute(FakeRequest({}))
+
+        # the first two requests use up the burst capacity, the rest are paced
+        assert clock.sleeps == [0.5, 0.5]
+
+    def test_token_bucket_refill(self, clock):
+        bucket = TokenBucket(1.0, capacity=3, clock=clock, sleep=clock.sleep)
+
+        for _ in range(3):
+            assert bucket.acquire() == 0.0
+
+        clock.now += 2.0
+        assert bucket.acquire() == 0.0
+        assert bucket.acquire() == 0.0
+        assert bucket.acquire() == 1.0
+
+    @pytest.mark.parametrize('rate', [0, -1])
+    def test_invalid_rate(self, rate):
+        with pytest.raises(ValueError):
+            TokenBucket(rate)
+
+    def test_invalid_max_attempts(self, logger):
+        with pytest.raises(ValueError):
+            RequestExecutor(logger, max_attempts=0)
@@ -1,7 +1,9 @@
 """
 Tests for the SentimentAnalysis class.
 """
+import nltk
 import pytest
+import numpy as np
 
 # Astro modules
 from src.data_collection.sentiment import SentimentAnalysis
@@ -17,6 +19,25 @@ def verify_sentiment(sentiment):
     assert sentiment <= 1.0 and sentiment >= 0.0
 
 
+@pytest.fixture(scope='function')
+def nltk_downloads(monkeypatch):
+    """
+    Pretend only wordnet and sentiwordnet are installed, and record every
+    package nltk is asked to download.
+    """
+    downloads = []
+
+    def find(resource, *args, **kwargs):
+        if resource not in ['corpora/wordnet', 'corpora/sentiwordnet']:
+            raise LookupError(resource)
+
+    monkeypatch.setattr(nltk.data, 'find', find)
+    monkeypatch.setattr(nltk.data, 'path', list(nltk.data.path))
+    monkeypatch.setattr(nltk, 'download', lambda pkg, **kwargs: downloads.append((pkg, kwargs['download_dir'])))
+
+    return downloads
+
+
 class TestSentimentAnalysis:
 
     def test_add_sentiment_to_dataframe(self, logger, comment_dataframe):
@@ -28,6 +49,120 @@ class TestSentimentAnalysis:
             verify_sentiment(row['PSentiment'])
             verify_sentiment(row['NSentiment'])
 
+    def test_score_comments(self, logger, comment_dataframe):
+        sa = SentimentAnalysis(logger)
+
+        scores = sa.score_comments(comment_dataframe['comment'])
+
+        assert scores.shape == (len(comment_dataframe.index), 2)
+        for index, comment in enumerate(comment_dataframe['comment']):
+            assert tuple(scores[index]) == sa.get_sentiment(comment)[:2]
+
+    def test_add_sentiment_columns(self, logger, comment_dataframe, monkeypatch):
+        # score each comment by its length so that row order can be verified without nltk data
+        monkeypatch.setattr(SentimentAnalysis, 'nltk_init', lambda self: None)
+        monkeypatch.setattr(SentimentAnalysis, 'get_sentiment', lambda self, comment: (len(comment), 0.5, 0.0))
+
+        sa = SentimentAnalysis(logger)
+        sa.progress_step = 2
+        sa.add_sentiment_to_dataframe(comment_dataframe)
+
+        assert comment_dataframe['PSentiment'].dtype == np.float64
+        assert comment_dataframe['NSentiment'].dtype == np.float64
+        assert comment_dataframe['PSentiment'].tolist() == [float(len(c)) for c in comment_dataframe['comment']]
+        assert comment_dataframe['NSentiment'].tolist() == [0.5] * len(comment_dataframe.index)
+
+    def test_add_sentiment_to_rows(self, logger, comment_dataframe, monkeypatch):
+        monkeypatch.setattr(SentimentAnalysis, 'nltk_init', lambda self: None)
+        monkeypatch.setattr(SentimentAnalysis, 'get_sentiment', lambda self, comment: (len(comment), 0.5, 0.0))
+
+        # only the masked rows are scored, the others keep their sentiment
+        comment_dataframe['PSentiment'] = [1.0, None, None]
+        comment_dataframe['NSentiment'] = [1.0, None, None]
+        sa = SentimentAnalysis(logger)
+        sa.add_sentiment_to_dataframe(comment_dataframe, rows=comment_dataframe['PSentiment'].isna())
+
+        assert comment_dataframe['PSentiment'].tolist() == [1.0] + [float(len(c)) for c in comment_dataframe['comment'][1:]]
+        assert comment_dataframe['NSentiment'].tolist() == [1.0, 0.5, 0.5]
+
+        # nothing to score
+        sa.add_sentiment_to_dataframe(comment_dataframe, rows=comment_dataframe['PSentiment'].isna())
+        assert comment_dataframe['NSentiment'].tolist() == [1.0, 0.5, 0.5]
+
+    @pytest.mark.parametrize('workers', [2, 4])
+    def test_score_comments_parallel(self, logger, workers):
+        comments = [positive_string, negative_string, neutral_string, nonsense_string, empty_string] * 200
+
+        serial_scores = SentimentAnalysis(logger).score_comments(comments)
+
+        sa = SentimentAnalysis(logger, workers=workers, chunk_size=100)
+        try:
+            parallel_scores = sa.score_comments(comments)
+        finally:
+            sa.close()
+
+        assert (parallel_scores == serial_scores).all()
+
+        # the workers' word scores and lookups are merged into the parent cache
+        assert len(sa.cache) > 0
+        assert sa.cache.hits + sa.cache.misses > 0
+
+    def test_score_comments_serial_fallback(self, logger, monkeypatch):
+        monkeypatch.setattr(SentimentAnalysis, 'nltk_init', lambda self: None)
+        monkeypatch.setattr(SentimentAnalysis, 'get_sentiment', lambda self, comment: (0.5, 0.25, 0.25))
+
+        # inputs smaller than two chunks never start the worker pool
+        sa = SentimentAnalysis(logger, workers=4, chunk_size=10)
+        scores = sa.score_comments([positive_string] * 19)
+
+        assert scores.shape == (19, 2)
+        assert sa._SentimentAnalysis__pool is None
+
+    def test_word_score_cache(self, logger, monkeypatch, tmp_path):
+        lookups = []
+
+        def lookup(self, word, pos):
+            lookups.append((word, pos))
+            return (0.5, 0.25) if word == 'amazing' else None
+
+        monkeypatch.setattr(SentimentAnalysis, 'nltk_init', lambda self: None)
+        monkeypatch.setattr(SentimentAnalysis, '_SentimentAnalysis__lookup_word_scores', lookup)
+
+        cache_file = str(tmp_path / 'sentiment_cache.json')
+        sa = SentimentAnalysis(logger, cache_file=cache_file)
+
+        for word in ['amazing', 'Amazing', 'asdf', 'amazing', 'asdf']:
+            sa.get_word_scores(word, 'a')
+
+        assert lookups == [('amazing', 'a'), ('asdf', 'a')]
+        assert sa.cache.hits == 3
+        assert sa.cache.misses == 2
+
+        # a warm run skips the lookups entirely
+        sa.close()
+        sa = SentimentAnalysis(logger, cache_file=cache_file)
+        assert sa.get_word_scores('AMAZING', 'a') == (0.5, 0.25)
+        assert sa.get_word_scores('asdf', 'a') is None
+        assert len(lookups) == 2
+
+    @pytest.mark.parametrize('workers, chunk_size', [(0, 100), (2, 0)])
+    def test_invalid_worker_configuration(self, logger, workers, chunk_size):
+        with pytest.raises(ValueError):
+            SentimentAnalysis(logger, workers=workers, chunk_size=chunk_size, init_nltk=False)
+
+    def test_nltk_init_downloads_missing(self, logger, nltk_downloads):
+        SentimentAnalysis(logger, nltk_data_dir='/tmp/astro_nltk_data')
+
+        assert nltk_downloads == [('punkt_tab', '/tmp/astro_nltk_data'),
+                                  ('averaged_perceptron_tagger_eng', '/tmp/astro_nltk_data')]
+        assert nltk.data.path[0] == '/tmp/astro_nltk_data'
+
+    def test_nltk_init_offline(self, logger, nltk_downloads):
+        with pytest.raises(RuntimeError, match='punkt_tab, averaged_perceptron_tagger_eng'):
+            SentimentAnalysis(logger, offline=True)
+
+        assert not nltk_downloads
+
     @pytest.mark.parametrize('text',
                              [positive_string,
                               negative_string,
@@ -0,0 +1,91 @@
+"""
+Tests for the SentimentCache class.
+"""
+import json
+import pytest
+
+# Astro modules
+from src.data_collection.sentiment_cache import SentimentCache
+
+
+class TestSentimentCache:
+    def test_get_put(self):
+        cache = SentimentCache(maxsize=10)
+
+        assert cache.get('good', 'a') is SentimentCache.MISSING
+        cache.put('good', 'a', (0.75, 0.0))
+        cache.put('asdf', 'n', None)
+
+        assert cache.get('good', 'a') == (0.75, 0.0)
+        assert cache.get('good', 'n') is SentimentCache.MISSING
+        assert cache.get('asdf', 'n') is None  # words without synsets are cached too
+
+        assert cache.hits == 2
+        assert cache.misses == 2
+        assert cache.hit_rate() == 0.5
+        assert cache.stats() == {'size': 2, 'maxsize': 10, 'hits': 2, 'misses': 2, 'hit_rate': 0.5}
+
+    def test_lru_eviction(self):
+        cache = SentimentCache(maxsize=2)
+
+        cache.put('one', 'n', (0.0, 0.0))
+        cache.put('two', 'n', (0.0, 0.0))
+        cache.get('one', 'n')  # 'two' is now the least recently used entry
+        cache.put('three', 'n', (0.0, 0.0))
+
+        assert len(cache) == 2
+        assert cache.get('two', 'n') is SentimentCache.MISSING
+        assert cache.get('one', 'n') == (0.0, 0.0)
+        assert cache.get('three', 'n') == (0.0, 0.0)
+
+    def test_invalid_size(self):
+        with pytest.raises(ValueError):
+            SentimentCache(maxsize=0)
+
+    def test_persistence(self, tmp_path):
+        cache_file = str(tmp_path / 'sentiment_cache.json')
+
+        cache = SentimentCache(maxsize=10, cache_file=cache_file)
+        cache.put('good', 'a', (0.75, 0.0))
+        cache.put('asdf', 'n', None)
+        cache.save()
+
+        warm_cache = SentimentCache(maxsize=10, cache_file=cache_file)
+        assert len(warm_cache) == 2
+        assert warm_cache.get('good', 'a') == (0.75, 0.0)
+        assert warm_cache.get('asdf', 'n') is None
+
+        # a smaller cache keeps the most recently used entries
+        small_cache = SentimentCache(maxsize=1, cache_file=cache_file)
+        assert small_cache.get('asdf', 'n') is None
+        assert small_cache.get('good', 'a') is SentimentCache.MISSING
+
+    def test_merge_new_entries(self, tmp_path):
+        cache_file = str(tmp_path / 'sentiment_cache.json')
+        SentimentCache(cache_file=cache_file).save()
+
+        worker_cache = SentimentCache(maxsize=10, cache_file=cache_file, track_new=True)
+        worker_cache.get('good', 'a')
+        worker_cache.put('good', 'a', (0.75, 0.0))
+        worker_cache.get('good', 'a')
+
+        parent_cache = SentimentCache(maxsize=10)
+        parent_cache.merge(worker_cache.take_new_entries(), worker_cache.hits, worker_cache.misses)
+
+        assert parent_cache.get('good', 'a') == (0.75, 0.0)
+        assert parent_cache.stats()['hits'] == 2
+        assert parent_cache.stats()['misses'] == 1
+        assert worker_cache.take_new_entries() == []
+
+        with pytest.raises(ValueError):
+            parent_cache.take_new_entries()
+
+    def test_ignore_other_versions(self, tmp_path):
+        cache_file = tmp_path / 'sentiment_cache.json'
+        cache_file.write_text(json.dumps({'version': 0, 'entries': [['good', 'a', [0.75, 0.0]]]}))
+
+        assert len(SentimentCache(cache_file=str(cache_file))) == 0
+
+    def test_save_without_file(self):
+        with pytest.raises(ValueError):
+            SentimentCache().save()
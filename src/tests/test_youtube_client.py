@@ -0,0 +1,97 @@
+"""
+Tests for YouTube client construction and discovery document caching.
+"""
+import os
+import json
+import time
+import threading
+import pytest
+
+# Astro modules
+from src.data_collection import youtube_client
+from src.data_collection.youtube_client import YouTubeClientFactory, get_client_factory, load_discovery_document
+
+
+@pytest.fixture(scope='function')
+def discovery_sources(monkeypatch):
+    """
+    Replace the bundled and downloaded discovery documents with small fakes,
+    recording which sources were used.
+    """
+    sources = []
+
+    def bundled():
+        sources.append('bundled')
+        return None
+
+    def download():
+        sources.append('download')
+        return json.dumps({'source': 'download'})
+
+    monkeypatch.setattr(youtube_client, 'bundled_discovery_document', bundled)
+    monkeypatch.setattr(youtube_client, 'download_discovery_document', download)
+
+    return sources
+
+
+def make_stale(cache_file):
+    stale = time.time() - youtube_client.DISCOVERY_TTL - 60
+    os.utime(cache_file, (stale, stale))
+
+
+class TestYouTubeClient:
+    def test_bundled_document(self):
+        document = load_discovery_document()
+
+        assert document['name'] == 'youtube'
+        assert 'commentThreads' in document['resources']
+
+    def test_discovery_cache(self, discovery_sources, tmp_path):
+        cache_file = str(tmp_path / 'discovery.json')
+
+        assert load_discovery_document(cache_file) == {'source': 'download'}
+        assert discovery_sources == ['bundled', 'download']
+
+        # a fresh cache is used as is
+        assert load_discovery_document(cache_file) == {'source': 'download'}
+        assert discovery_sources == ['bundled', 'download']
+
+        # a stale cache is refreshed
+        make_stale(cache_file)
+        load_discovery_document(cache_file)
+        assert discovery_sources == ['bundled', 'download'] * 2
+
+    def test_stale_cache_fallback(self, discovery_sources, monkeypatch, tmp_path):
+        cache_file = str(tmp_path / 'discovery.json')
+        load_discovery_document(cache_file)
+        make_stale(cache_file)
+
+        def download():
+            raise OSError('network unavailable')
+
+        monkeypatch.setattr(youtube_client, 'download_discovery_document', download)
+
+        assert load_discovery_document(cache_file) == {'source': 'download'}
+
+        os.remove(cache_file)
+        with pytest.raises(OSError):
+            load_discovery_document(cache_file)
+
+    def test_client_per_thread(self):
+        factory = YouTubeClientFactory('test_apikey')
+
+        clients = []
+        thread = threading.Thread(target=lambda: clients.append(factory.client()))
+        thread.start()
+        thread.join()
+
+        assert factory.client() is factory.client()
+        assert factory.client() is not clients[0]
+        assert factory.build_count == 2
+
+    def test_factory_memoized(self, tmp_path):
+        cache_file = str(tmp_path / 'discovery.json')
+
+        assert get_client_factory('test_apikey') is get_client_factory('test_apikey')
+        assert get_client_factory('test_apikey') is not get_client_factory('other_apikey')
+        assert get_client_factory('test_apikey', cache_file) is not get_client_factory('test_apikey')
@@ -2,10 +2,18 @@
 Tests for the YouTubeDataAPI class.
 """
 import pytest
+import googleapiclient.http
+
+from urllib.parse import unquote, urlparse, parse_qs
+from unittest.mock import MagicMock
+from googleapiclient.errors import HttpError
 
 # Astro modules
-from src.data_collection.data_structures import VideoData
+from src.benchmarks.common import synthetic_comment_pages, synthetic_reply_pages
+from src.data_collection.data_structures import VideoData, CommentAccumulator
 from src.data_collection.yt_data_api import YouTubeDataAPI
+from src.data_collection.request_executor import RequestExecutor
+from src.tests.astro_mocks import make_http_error
 
 
 def parametrize_api_comment_response(
@@ -128,6 +136,150 @@ class TestYouTubeDataAPI:
                 assert replyTextDisplay == row['comment']
                 assert replyAuthorDisplayName == row['user']
 
+    @pytest.mark.parametrize('page_count', [1, 3, 10])
+    def test_get_comments_multiple_pages(self, logger, page_count):
+        youtube = YouTubeDataAPI(logger, 'test_apikey')
+
+        pages = synthetic_comment_pages(page_count, threads_per_page=5, reply_count=2)
+        googleapiclient.http.HttpRequest.execute = MagicMock(side_effect=pages)
+
+        video_data = VideoData(video_id='video_id', comment_count=page_count * 15)
+        df = youtube.get_comments(video_data)
+
+        # every thread contributes one top level comment and two replies
+        assert len(df.index) == page_count * 15
+        assert df['comment_id'].is_unique
+        assert list(df.index) == list(range(page_count * 15))
+        assert df.loc[0, 'comment_id'] == pages[0]['items'][0]['id']
+        assert df.loc[1, 'comment_id'] == pages[0]['items'][0]['replies']['comments'][0]['id']
+        assert video_data.filtered_comment_count == 0
+
+    @pytest.mark.parametrize('stop_page', [0, 2, 4])
+    def test_get_comments_incremental(self, logger, stop_page):
+        youtube = YouTubeDataAPI(logger, 'test_apikey')
+
+        pages = synthetic_comment_pages(5, threads_per_page=5, reply_count=0)
+        googleapiclient.http.HttpRequest.execute = MagicMock(side_effect=pages)
+
+        # synthetic pages are oldest first, reverse the dates so that they are newest first
+        dates = [item['snippet']['topLevelComment']['snippet']['publishedAt'] for page in pages for item in page['items']]
+        for page in pages:
+            for item in page['items']:
+                item['snippet']['topLevelComment']['snippet']['publishedAt'] = dates.pop()
+
+        # pretend the newest stored comment is the third thread of `stop_page`
+        stored_thread = pages[stop_page]['items'][2]
+        stored_date = stored_thread['snippet']['topLevelComment']['snippet']['publishedAt']
+        high_water_mark = (stored_date, stored_thread['id'])
+
+        video_data = VideoData(video_id='video_id', comment_count=25, filtered_comment_count=7)
+        df = youtube.get_comments(video_data, high_water_mark=high_water_mark)
+
+        # paging stops with the page containing the stored comment
+        assert youtube.executor.quota_used == stop_page + 1
+        assert len(df.index) == (stop_page + 1) * 5
+        assert video_data.filtered_comment_count == 7
+
+    def test_get_comment_batches(self, logger):
+        youtube = YouTubeDataAPI(logger, 'test_apikey')
+
+        pages = synthetic_comment_pages(5, threads_per_page=5, reply_count=0)
+        googleapiclient.http.HttpRequest.execute = MagicMock(side_effect=pages)
+
+        video_data = VideoData(video_id='video_id', comment_count=25)
+        batches = list(youtube.get_comment_batches(video_data, pages_per_batch=2))
+
+        # every batch ends with the token of the page following it
+        assert [len(df.index) for df, _, _ in batches] == [10, 10, 5]
+        assert [token for _, token, _ in batches] == [pages[1]['nextPageToken'], pages[3]['nextPageToken'], None]
+        assert [page_count for _, _, page_count in batches] == [2, 2, 1]
+        assert batches[1][0].loc[0, 'comment_id'] == pages[2]['items'][0]['id']
+
+    def test_get_comment_batches_resume(self, logger):
+        youtube = YouTubeDataAPI(logger, 'test_apikey')
+
+        pages = synthetic_comment_pages(3, threads_per_page=5, reply_count=0)
+        execute = MagicMock(side_effect=pages[1:])
+        googleapiclient.http.HttpRequest.execute = execute
+
+        video_data = VideoData(video_id='video_id', comment_count=15)
+        batches = list(youtube.get_comment_batches(video_data, page_token=pages[0]['nextPageToken']))
+
+        assert execute.call_count == 2
+        assert len(batches) == 1
+        assert len(batches[0][0].index) == 10
+
+    @pytest.mark.parametrize('expand_replies', [True, False])
+    def test_get_comments_expand_replies(self, logger, monkeypatch, expand_replies):
+        youtube = YouTubeDataAPI(logger, 'test_apikey', expand_replies=expand_replies, reply_workers=3)
+
+        # the API returns 5 of the 12 replies of every thread inline
+        pages = synthetic_comment_pages(2, threads_per_page=5, reply_count=12, inline_reply_limit=5)
+        reply_pages = {item['id']: synthetic_reply_pages(item['id'], 12, replies_per_page=5)
+                       for page in pages for item in page['items']}
+
+        def execute(request, *args, **kwargs):
+            query = parse_qs(urlparse(request.uri).query)
+            page_index = int(query.get('pageToken', ['page0'])[0].split('page')[-1])
+            if 'parentId' in query:
+                return reply_pages[query['parentId'][0]][page_index]
+
+            return pages[page_index]
+
+        monkeypatch.setattr(googleapiclient.http.HttpRequest, 'execute', execute)
+
+        df = youtube.get_comments(VideoData(video_id='video_id', comment_count=130))
+
+        if expand_replies:
+            assert len(df.index) == 130
+            assert youtube.executor.quota_used == 2 + 10 * 3  # three pages of replies per thread
+        else:
+            assert len(df.index) == 60
+            assert youtube.executor.quota_used == 2
+
+        assert df['comment_id'].is_unique
+
+    def test_get_comments_retry(self, logger):
+        sleeps = []
+        youtube = YouTubeDataAPI(logger, 'test_apikey', executor=RequestExecutor(logger, sleep=sleeps.append))
+
+        pages = synthetic_comment_pages(2, threads_per_page=5, reply_count=0)
+        googleapiclient.http.HttpRequest.execute = MagicMock(side_effect=[pages[0], make_http_error(503), pages[1]])
+
+        df = youtube.get_comments(VideoData(video_id='video_id', comment_count=10))
+
+        assert len(df.index) == 10
+        assert len(sleeps) == 1
+
+    def test_get_comments_persistent_error(self, logger):
+        sleeps = []
+        youtube = YouTubeDataAPI(logger, 'test_apikey',
+                                 executor=RequestExecutor(logger, max_attempts=3, sleep=sleeps.append))
+
+        execute = MagicMock(side_effect=make_http_error(500))
+        googleapiclient.http.HttpRequest.execute = execute
+
+        # a persistent error is given up on, rather than retried forever
+        with pytest.raises(HttpError):
+            youtube.get_comments(VideoData(video_id='video_id', comment_count=10))
+
+        assert execute.call_count == 3
+        assert len(sleeps) == 2
+
+    def test_comment_accumulator_dataframe(self):
+        comments = CommentAccumulator()
+        assert len(comments) == 0
+
+        comments.append('id1', 'comment1', '@user1', '2024-09-23T19:06:29Z')
+        comments.append('id2', 'comment2', '@user2', '2024-09-24T19:06:29Z', False)
+        assert len(comments) == 2
+
+        df = comments.to_dataframe()
+
+        assert list(df.columns) == ['comment_id', 'comment', 'user', 'date', 'visible']
+        assert [str(dtype) for dtype in df.dtypes] == ['object', 'object', 'object', 'object', 'bool']
+        assert df.loc[1].tolist() == ['id2', 'comment2', '@user2', '2024-09-24T19:06:29Z', False]
+
     @pytest.mark.parametrize('channelId',
                              ['itXtJBHdZchKKjlnVrjXeCln',
                               'FvlvKP-khoFMOeyBzmXuaazd',
@@ -164,3 +316,58 @@ class TestYouTubeDataAPI:
         assert video_data.like_count == int(likeCount)
         assert video_data.view_count == int(viewCount)
         assert video_data.comment_count == int(commentCount)
+
+    @pytest.mark.parametrize('video_count', [1, 50, 51, 120])
+    def test_get_video_metadata_batch(self, logger, monkeypatch, api_video_response, video_count):
+        youtube = YouTubeDataAPI(logger, 'test_apikey')
+        requested_ids = []
+
+        def execute(request, *args, **kwargs):
+            video_ids = unquote(request.uri.split('id=')[1].split('&')[0]).split(',')
+            requested_ids.append(video_ids)
+
+            item = api_video_response['items'][0]
+            items = [dict(item, id=video_id) for video_id in video_ids if not video_id.startswith('private')]
+            return dict(api_video_response, items=items)
+
+        monkeypatch.setattr(googleapiclient.http.HttpRequest, 'execute', execute)
+
+        video_ids = [f'video{i}' for i in range(video_count)] + ['private1']
+        urls = [f'youtube.com/watch?v={video_id}' for video_id in video_ids[::2]] + video_ids[1::2]
+        metadata = youtube.get_video_metadata_batch(urls + ['video0'])  # duplicates are only requested once
+
+        # chunked into requests of at most 50 IDs
+        assert [len(ids) for ids in requested_ids] == \
+            [min(50, len(video_ids) - i) for i in range(0, len(video_ids), 50)]
+        assert youtube.executor.quota_used == len(requested_ids)
+
+        assert set(metadata.keys()) == set(video_ids)
+        assert metadata['private1'] is None
+        for video_id in video_ids[:-1]:
+            assert metadata[video_id].video_id == video_id
+            assert metadata[video_id].comment_count == 8
+
+    def test_get_video_metadata_batch_request_error(self, logger, monkeypatch, api_video_response):
+        youtube = YouTubeDataAPI(logger, 'test_apikey', executor=RequestExecutor(logger, max_attempts=1))
+        youtube.max_ids_per_request = 2
+
+        def execute(request, *args, **kwargs):
+            if 'video3' in request.uri:
+                raise ConnectionError('network unreachable')
+
+            return dict(api_video_response, items=[dict(api_video_response['items'][0], id='video1')])
+
+        monkeypatch.setattr(googleapiclient.http.HttpRequest, 'execute', execute)
+
+        errors = {}
+        metadata = youtube.get_video_metadata_batch(['video1', 'video2', 'video3', 'video4'], errors=errors)
+
+        # only the videos of the failed request are reported with its error
+        assert metadata['video1'] and metadata['video2'] is None
+        assert errors == dict.fromkeys(['video3', 'video4'], 'video metadata request failed: network unreachable')
+
+    def test_get_video_metadata_batch_invalid_url(self, logger):
+        youtube = YouTubeDataAPI(logger, 'test_apikey')
+
+        with pytest.raises(ValueError):
+            youtube.get_video_metadata_batch(['bad id'])